@@ -48,6 +48,127 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
+# Tables at or above this row count are treated as large when checking
+# generated SQL for filters and joins that cannot use an index
+LARGE_TABLE_ROW_THRESHOLD = int(os.getenv('LARGE_TABLE_ROW_THRESHOLD', 100000))
+
+# Catalog rows streamed per chunk (and committed per transaction) during
+# metadata extraction; bounds worker memory on very large schemas
+METADATA_EXTRACTION_CHUNK_SIZE = int(os.getenv('METADATA_EXTRACTION_CHUNK_SIZE', 500))
+# Detailed entries kept per change list in an extraction report (totals stay exact)
+METADATA_CHANGE_LOG_LIMIT = int(os.getenv('METADATA_CHANGE_LOG_LIMIT', 1000))
+
+# Scheduled metadata refresh (python manage.py refresh_metadata)
+METADATA_REFRESH_INTERVAL = int(os.getenv('METADATA_REFRESH_INTERVAL', 86400))  # seconds
+METADATA_REFRESH_JITTER = float(os.getenv('METADATA_REFRESH_JITTER', 0.1))  # fraction of interval
+METADATA_REFRESH_MAX_CONCURRENCY = int(os.getenv('METADATA_REFRESH_MAX_CONCURRENCY', 4))
+METADATA_REFRESH_PER_HOST_CONCURRENCY = int(os.getenv('METADATA_REFRESH_PER_HOST_CONCURRENCY', 1))
+METADATA_REFRESH_RETRY_DELAY = int(os.getenv('METADATA_REFRESH_RETRY_DELAY', 3600))
+METADATA_REFRESH_LEASE_TIMEOUT = int(os.getenv('METADATA_REFRESH_LEASE_TIMEOUT', 3600))
+METADATA_REFRESH_TICK = int(os.getenv('METADATA_REFRESH_TICK', 300))
+
+# Pooled HTTP clients for LLM providers (HTTP/2 needs the optional h2 package)
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', 20))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', 10))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY', 120))  # seconds
+LLM_HTTP_TIMEOUT = float(os.getenv('LLM_HTTP_TIMEOUT', 60))  # seconds
+LLM_HTTP2 = os.getenv('LLM_HTTP2', 'True') == 'True'
+
+# LLM provider rate limits (per worker), retries and circuit breaker
+LLM_REQUESTS_PER_MINUTE = {
+    'openai': int(os.getenv('OPENAI_REQUESTS_PER_MINUTE', 500)),
+    'groq': int(os.getenv('GROQ_REQUESTS_PER_MINUTE', 30)),
+}
+LLM_RATE_LIMIT_BURST = int(os.getenv('LLM_RATE_LIMIT_BURST', 5))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', 30))  # seconds a request may wait for a slot
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 3))
+LLM_RETRY_BASE_DELAY = float(os.getenv('LLM_RETRY_BASE_DELAY', 0.5))  # seconds
+LLM_RETRY_MAX_DELAY = float(os.getenv('LLM_RETRY_MAX_DELAY', 20))  # seconds
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('LLM_CIRCUIT_FAILURE_THRESHOLD', 5))
+LLM_CIRCUIT_RESET_TIMEOUT = float(os.getenv('LLM_CIRCUIT_RESET_TIMEOUT', 30))  # seconds
+
+# Latency-aware routing between providers; each provider's fallback model can stand in for another's
+LLM_ROUTING_ENABLED = os.getenv('LLM_ROUTING_ENABLED', 'True') == 'True'
+LLM_FALLBACK_MODELS = {
+    'openai': os.getenv('OPENAI_FALLBACK_MODEL', 'gpt-4o-mini'),
+    'groq': os.getenv('GROQ_FALLBACK_MODEL', 'llama-3.1-8b-instant'),
+}
+LLM_ROUTER_WINDOW = int(os.getenv('LLM_ROUTER_WINDOW', 100))  # recent calls per route
+LLM_ROUTER_MIN_SAMPLES = int(os.getenv('LLM_ROUTER_MIN_SAMPLES', 5))
+LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv('LLM_ROUTER_MAX_ERROR_RATE', 0.5))
+# A duplicate request goes to the same model once the first outlasts this latency percentile
+# (to the next route instead with LLM_HEDGE_TO_FALLBACK; answers name the model that gave them)
+LLM_HEDGING_ENABLED = os.getenv('LLM_HEDGING_ENABLED', 'True') == 'True'
+LLM_HEDGE_TO_FALLBACK = os.getenv('LLM_HEDGE_TO_FALLBACK', 'False') == 'True'
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', 0.95))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv('LLM_HEDGE_DEFAULT_DELAY', 10))  # seconds, until a route is measured
+# Identical concurrent requests share one call; a waiter makes its own after this many seconds
+LLM_COALESCE_WAIT_TIMEOUT = float(os.getenv('LLM_COALESCE_WAIT_TIMEOUT', 120))
+
+# Offline stand-in provider for load and regression tests: every LLM request is answered locally
+# from recordings (see LLM_RECORD_RESPONSES_TO) or with canned schema-aware SQL
+LLM_OFFLINE = os.getenv('LLM_OFFLINE', 'False') == 'True'
+LLM_OFFLINE_RECORDINGS = os.getenv('LLM_OFFLINE_RECORDINGS', '')  # JSON lines file to replay
+LLM_RECORD_RESPONSES_TO = os.getenv('LLM_RECORD_RESPONSES_TO', '')  # append real responses here
+LLM_OFFLINE_LATENCY_MEDIAN_MS = float(os.getenv('LLM_OFFLINE_LATENCY_MEDIAN_MS', 800))
+LLM_OFFLINE_LATENCY_SIGMA = float(os.getenv('LLM_OFFLINE_LATENCY_SIGMA', 0.5))  # log-normal spread
+LLM_OFFLINE_TTFT_FRACTION = float(os.getenv('LLM_OFFLINE_TTFT_FRACTION', 0.3))  # of latency before the first token
+LLM_OFFLINE_ERROR_RATE = float(os.getenv('LLM_OFFLINE_ERROR_RATE', 0.0))
+LLM_OFFLINE_RATE_LIMIT_RATE = float(os.getenv('LLM_OFFLINE_RATE_LIMIT_RATE', 0.0))
+LLM_OFFLINE_CHARS_PER_TOKEN = int(os.getenv('LLM_OFFLINE_CHARS_PER_TOKEN', 4))
+LLM_OFFLINE_SEED = int(os.getenv('LLM_OFFLINE_SEED', 0))
+
+# Embedding backend for schema metadata; the default runs offline on CPU.
+# Use databases.embeddings.SentenceTransformerEmbeddingBackend for a local model.
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'databases.embeddings.HashingEmbeddingBackend')
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', 384))
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 256))
+# Indexes with at least this many entries are searched through HNSW when hnswlib is installed
+VECTOR_INDEX_HNSW_THRESHOLD = int(os.getenv('VECTOR_INDEX_HNSW_THRESHOLD', 20000))
+# Immutable per-version embedding snapshots, memory-mapped by every worker; empty disables
+EMBEDDING_STORE_DIR = os.getenv('EMBEDDING_STORE_DIR', str(BASE_DIR / 'embedding_store'))
+# Memory budget of the per-process cache of embeddings, search indexes and search results
+METADATA_CACHE_MAX_BYTES = int(os.getenv('METADATA_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Schema linking for NL-to-SQL prompts
+SCHEMA_LINKING_TOP_K = int(os.getenv('SCHEMA_LINKING_TOP_K', 10))
+SCHEMA_PROMPT_TOKEN_BUDGET = int(os.getenv('SCHEMA_PROMPT_TOKEN_BUDGET', 3000))
+# Schema text format in prompts ('compact' DDL-like lines or 'json'), description length, and the
+# tiktoken encoding budgets are counted in (token counts are estimated without the tiktoken package)
+SCHEMA_PROMPT_FORMAT = os.getenv('SCHEMA_PROMPT_FORMAT', 'compact')
+SCHEMA_DESCRIPTION_MAX_CHARS = int(os.getenv('SCHEMA_DESCRIPTION_MAX_CHARS', 80))
+SCHEMA_TOKENIZER_ENCODING = os.getenv('SCHEMA_TOKENIZER_ENCODING', 'o200k_base')
+# Schemas of at most this many tokens are sent whole, as a prefix shared by every prompt for the
+# database (rebuilt once per metadata version) that providers can serve from their prompt cache;
+# capped at SCHEMA_PROMPT_TOKEN_BUDGET so a whole schema is never larger than a pruned one may be
+SCHEMA_PREFIX_MAX_TOKENS = int(os.getenv('SCHEMA_PREFIX_MAX_TOKENS', SCHEMA_PROMPT_TOKEN_BUDGET))
+# Hybrid metadata search: results taken from the keyword, vector and trigram indexes, and the rank fusion constant
+HYBRID_LEXICAL_K = int(os.getenv('HYBRID_LEXICAL_K', 20))
+HYBRID_SEMANTIC_K = int(os.getenv('HYBRID_SEMANTIC_K', 20))
+HYBRID_FUZZY_K = int(os.getenv('HYBRID_FUZZY_K', 10))
+HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', 60))
+# Text columns with at most this many distinct values have them stored to ground question literals;
+# tables without planner statistics are judged from this many sampled rows, which must number at
+# least CATEGORICAL_MIN_SAMPLE_ROWS with at most CATEGORICAL_MAX_DISTINCT_RATIO distinct values per row
+CATEGORICAL_MAX_DISTINCT = int(os.getenv('CATEGORICAL_MAX_DISTINCT', 50))
+CATEGORICAL_SAMPLE_ROWS = int(os.getenv('CATEGORICAL_SAMPLE_ROWS', 10000))
+CATEGORICAL_MIN_SAMPLE_ROWS = int(os.getenv('CATEGORICAL_MIN_SAMPLE_ROWS', 100))
+CATEGORICAL_MAX_DISTINCT_RATIO = float(os.getenv('CATEGORICAL_MAX_DISTINCT_RATIO', 0.2))
+# Join paths between all pairs of tables are precomputed up to this many tables, memoized on demand beyond
+JOIN_GRAPH_PRECOMPUTE_MAX_TABLES = int(os.getenv('JOIN_GRAPH_PRECOMPUTE_MAX_TABLES', 500))
+
+# nl_to_sql answer cache (per worker): exact, normalized-text and embedding-similarity lookups;
+# databases can opt out with ClientDatabase.answer_cache_enabled
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'True') == 'True'
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 5000))
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', 86400))  # seconds
+ANSWER_CACHE_MIN_SIMILARITY = float(os.getenv('ANSWER_CACHE_MIN_SIMILARITY', 0.95))
+
+# Few-shot NL-to-SQL examples (python manage.py import_sql_examples)
+SQL_EXAMPLES_TOP_K = int(os.getenv('SQL_EXAMPLES_TOP_K', 3))
+SQL_EXAMPLES_MIN_SCORE = float(os.getenv('SQL_EXAMPLES_MIN_SCORE', 0.3))
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
@@ -85,6 +206,7 @@ INSTALLED_APPS = [
     "session",  # Added session app
     "user",     # Added user app
     "databases", # Added databases app
+    "llm_agent",
     "rest_framework",
     "corsheaders",
 ]
@@ -0,0 +1,146 @@
+import itertools
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+
+
+def estimate_size(value):
+    """
+    Approximate memory held by a cached value, in bytes.
+
+    Values may define memory_usage() for an exact figure; numpy arrays count
+    their buffers and containers are walked one level deep.
+    """
+    if hasattr(value, 'memory_usage'):
+        return value.memory_usage()
+    if isinstance(value, np.ndarray):
+        # Memory maps live in the shared page cache, not in this process
+        return 0 if isinstance(value, np.memmap) else value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(
+            sys.getsizeof(item) + (sum(sys.getsizeof(v) for v in item.values()) if isinstance(item, dict) else 0)
+            for item in value
+        )
+    return size
+
+
+class MetadataCache:
+    """
+    Process-wide LRU cache for metadata embeddings, search indexes and search results.
+
+    Entries are scoped by database; callers put the schema version in their keys
+    so a bumped metadata_version simply stops matching old entries, which then
+    age out. invalidate() drops a whole database in O(1) by moving it to a new
+    generation instead of scanning entries. The total estimated size of entries
+    is kept under max_bytes by evicting the least recently used ones.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or getattr(settings, 'METADATA_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._generation_counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _key(self, database_id, key):
+        return (database_id, self._generations.get(database_id, 0), key)
+
+    def get(self, database_id, key, default=None):
+        """Return a cached value, marking it most recently used"""
+        with self._lock:
+            full_key = self._key(database_id, key)
+            entry = self._entries.get(full_key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(full_key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, database_id, key, value, size=None):
+        """
+        Cache a value, evicting least recently used entries to stay within budget.
+
+        Args:
+            database_id (int): Database the value derives from, or None for global values
+            key (tuple): Hashable key; include the schema version for version-bound values
+            value: Value to cache
+            size (int, optional): Size in bytes, estimated when omitted
+        """
+        size = estimate_size(value) if size is None else size
+        with self._lock:
+            full_key = self._key(database_id, key)
+            previous = self._entries.pop(full_key, None)
+            if previous is not None:
+                self.used_bytes -= previous[1]
+            if size > self.max_bytes:
+                return
+            self._entries[full_key] = (value, size)
+            self.used_bytes += size
+            while self.used_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.used_bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_build(self, database_id, key, build, size=None):
+        """
+        Return a cached value, building it at most once per process when missing.
+
+        Concurrent callers asking for the same missing key wait for the first
+        caller's build instead of repeating it.
+        """
+        value = self.get(database_id, key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault((database_id, key), threading.Lock())
+        with build_lock:
+            value = self.get(database_id, key)
+            if value is None:
+                value = build()
+                self.set(database_id, key, value, size=size)
+        with self._lock:
+            self._build_locks.pop((database_id, key), None)
+        return value
+
+    def invalidate(self, database_id):
+        """Drop every entry of a database; stale entries are evicted lazily"""
+        with self._lock:
+            self._generations[database_id] = next(self._generation_counter)
+
+    def stats(self):
+        """Hit, miss and eviction counts with current memory use"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'used_bytes': self.used_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_metadata_cache():
+    """Return the process-wide metadata cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = MetadataCache()
+    return _cache
@@ -0,0 +1,150 @@
+import threading
+import zlib
+from functools import lru_cache
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from .text_utils import tokenize
+
+# Embeddings are stored as little-endian float32 regardless of platform
+VECTOR_DTYPE = np.dtype('<f4')
+
+
+def pack_vector(vector):
+    """Pack a vector into float32 bytes for a BinaryField"""
+    return np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+
+def unpack_vector(data):
+    """Unpack float32 bytes from a BinaryField into a read-only numpy vector"""
+    if data is None:
+        return None
+    return np.frombuffer(bytes(data), dtype=VECTOR_DTYPE)
+
+
+class EmbeddingBackend:
+    """
+    Base class for embedding backends.
+
+    Subclasses implement embed() and set dimensions; model_id identifies the
+    vector space so embeddings from a different backend are never compared.
+    """
+    name = 'base'
+    dimensions = None
+
+    @property
+    def model_id(self):
+        return f"{self.name}-{self.dimensions}"
+
+    def embed(self, texts):
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts (list): Strings to embed
+
+        Returns:
+            numpy.ndarray: (len(texts), dimensions) float32 matrix of L2-normalized rows
+        """
+        raise NotImplementedError
+
+    def embed_one(self, text):
+        """Embed a single text"""
+        return self.embed([text])[0]
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Hashed word and character n-gram features with sublinear term frequency.
+
+    CPU-only, offline and deterministic: no model download or corpus fitting,
+    and character n-grams make near-identical identifiers land close together.
+    """
+    name = 'hashing-ngram'
+
+    def __init__(self, dimensions=None, ngram_range=(3, 4)):
+        self.dimensions = dimensions or getattr(settings, 'EMBEDDING_DIMENSIONS', 384)
+        self.ngram_range = ngram_range
+
+    def embed(self, texts):
+        min_n, max_n = self.ngram_range
+        rows, columns, signs = [], [], []
+        for row, text in enumerate(texts):
+            for word in tokenize(text):
+                word_columns, word_signs = _word_features(word, self.dimensions, min_n, max_n)
+                rows.append(np.full(len(word_columns), row, dtype=np.intp))
+                columns.append(word_columns)
+                signs.append(word_signs)
+
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        if rows:
+            np.add.at(matrix, (np.concatenate(rows), np.concatenate(columns)), np.concatenate(signs))
+
+        # Sublinear term frequency: repeated features count logarithmically
+        magnitude = np.abs(matrix)
+        nonzero = magnitude > 0
+        matrix[nonzero] = np.sign(matrix[nonzero]) * (1.0 + np.log(magnitude[nonzero]))
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+@lru_cache(maxsize=65536)
+def _word_features(word, dimensions, min_n, max_n):
+    """
+    Hash a word and its boundary-padded character n-grams to (columns, signs).
+
+    Identifier words repeat heavily across a schema, so results are memoized.
+    The top hash bit picks the sign so bucket collisions cancel out instead of piling up.
+    """
+    padded = f"#{word}#"
+    features = [word] + [
+        padded[start:start + n]
+        for n in range(min_n, max_n + 1)
+        for start in range(len(padded) - n + 1)
+    ]
+    hashes = np.array([zlib.crc32(feature.encode('utf-8')) for feature in features], dtype=np.uint32)
+    columns = (hashes % dimensions).astype(np.intp)
+    signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+    return columns, signs
+
+
+class SentenceTransformerEmbeddingBackend(EmbeddingBackend):
+    """Small local transformer model on CPU (requires the optional sentence-transformers package)"""
+    name = 'sentence-transformers'
+
+    def __init__(self, model_name=None):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImproperlyConfigured(
+                "SentenceTransformerEmbeddingBackend requires 'pip install sentence-transformers'"
+            ) from e
+        self.model_name = model_name or getattr(settings, 'EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+        self.model = SentenceTransformer(self.model_name, device='cpu')
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+
+    @property
+    def model_id(self):
+        return f"{self.name}-{self.model_name}-{self.dimensions}"
+
+    def embed(self, texts):
+        vectors = self.model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_embedding_backend():
+    """Return the process-wide embedding backend configured by settings.EMBEDDING_BACKEND"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_path = getattr(settings, 'EMBEDDING_BACKEND', 'databases.embeddings.HashingEmbeddingBackend')
+                _backend = import_string(backend_path)()
+    return _backend
@@ -0,0 +1,118 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connection
+from .keyword_index import get_keyword_index, search_keywords
+from .trigram_index import get_trigram_index
+from .vector_index import get_vector_index
+
+logger = logging.getLogger(__name__)
+
+# Retrievers of concurrent searches run here; lexical and semantic stages overlap
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='hybrid-search')
+
+
+def _timed(search):
+    """Run one retrieval stage, returning (results, milliseconds, error message)"""
+    started = time.perf_counter()
+    try:
+        return search(), (time.perf_counter() - started) * 1000, None
+    except Exception as e:
+        return [], (time.perf_counter() - started) * 1000, str(e)
+    finally:
+        # Searches normally touch only loaded indexes; never leave a pool thread holding a connection
+        connection.close()
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merge ranked result lists by reciprocal rank fusion.
+
+    Each result scores sum(1 / (k + rank)) over the lists it appears in, so
+    agreement between retrievers outweighs a high rank in any single one and
+    the retrievers' raw scores, which are not comparable, are ignored.
+
+    Args:
+        rankings (dict): Retriever name -> result dicts (with 'type' and 'id'), best first
+        k (int): Damping constant; larger values flatten the advantage of top ranks
+
+    Returns:
+        list: Result dicts with the fused 'score' and a 'ranks' dict of 1-based ranks per retriever
+    """
+    fused = {}
+    for name, results in rankings.items():
+        for rank, result in enumerate(results, start=1):
+            key = (result['type'], result['id'])
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = dict(result, score=0.0, ranks={})
+            entry['score'] += 1.0 / (k + rank)
+            entry['ranks'][name] = rank
+    return sorted(fused.values(), key=lambda entry: -entry['score'])
+
+
+def hybrid_search(database_obj, query_text, limit=10, lexical_k=None, semantic_k=None, fuzzy_k=None, rrf_k=None):
+    """
+    Search table and column metadata with the keyword, vector and trigram indexes together.
+
+    The indexes are loaded in the calling thread, where the database
+    connection and any open transaction live; the searches then run
+    concurrently and their rankings are merged with reciprocal rank fusion.
+    The trigram index matches misspelled or abbreviated names that share no
+    exact word with any identifier. A failing retriever is logged and left
+    out, so keyword matches still come back when embeddings are unavailable.
+
+    Args:
+        database_obj (ClientDatabase): Database to search
+        query_text (str): Question or search terms
+        limit (int): Number of fused results
+        lexical_k (int, optional): Results taken from the keyword (BM25) index
+        semantic_k (int, optional): Results taken from the vector index
+        fuzzy_k (int, optional): Results taken from the trigram index
+        rrf_k (int, optional): Reciprocal rank fusion damping constant
+
+    Returns:
+        tuple: (result dicts best first, {stage: milliseconds} for indexes, keyword, semantic, fuzzy, fusion and total)
+    """
+    from .services import MetadataVectorizer
+
+    lexical_k = lexical_k or getattr(settings, 'HYBRID_LEXICAL_K', 20)
+    semantic_k = semantic_k or getattr(settings, 'HYBRID_SEMANTIC_K', 20)
+    fuzzy_k = fuzzy_k or getattr(settings, 'HYBRID_FUZZY_K', 10)
+    rrf_k = rrf_k or getattr(settings, 'HYBRID_RRF_K', 60)
+
+    started = time.perf_counter()
+    vectorizer = MetadataVectorizer()
+    searches = {'keyword': lambda: search_keywords(database_obj, query_text, limit=lexical_k)}
+    get_keyword_index(database_obj)
+    trigram_index = get_trigram_index(database_obj)
+    searches['fuzzy'] = lambda: trigram_index.search(query_text, k=fuzzy_k)
+    try:
+        get_vector_index(database_obj, vectorizer)
+        searches['semantic'] = lambda: vectorizer.search_metadata(database_obj, query_text, limit=semantic_k)
+    except Exception as e:
+        logger.warning(f"Semantic retrieval unavailable for database {database_obj.id}: {str(e)}")
+    indexes_loaded = time.perf_counter()
+
+    stages = {name: _executor.submit(_timed, search) for name, search in searches.items()}
+
+    rankings = {}
+    timings = {'indexes': (indexes_loaded - started) * 1000}
+    for name, future in stages.items():
+        results, elapsed, error = future.result()
+        timings[name] = elapsed
+        if error:
+            logger.warning(f"{name.capitalize()} retrieval failed for database {database_obj.id}: {error}")
+        rankings[name] = results
+
+    fusion_started = time.perf_counter()
+    results = reciprocal_rank_fusion(rankings, k=rrf_k)[:limit]
+    timings['fusion'] = (time.perf_counter() - fusion_started) * 1000
+    timings['total'] = (time.perf_counter() - started) * 1000
+
+    logger.debug(
+        f"Hybrid search for database {database_obj.id}: "
+        + ", ".join(f"{stage} {elapsed:.1f}ms" for stage, elapsed in timings.items())
+    )
+    return results, timings
@@ -0,0 +1,265 @@
+import logging
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+from django.conf import settings
+from .cache import get_metadata_cache
+from .models import TableMetadata, RelationshipMetadata
+
+logger = logging.getLogger(__name__)
+
+UNREACHABLE = np.iinfo(np.int32).max
+
+# Memory allowed for shortest-path trees memoized on demand, per graph
+MEMOIZED_TREE_BYTES = 64 * 1024 * 1024
+
+
+class JoinGraph:
+    """
+    Undirected graph of tables joined by foreign keys.
+
+    A breadth-first search from a table yields its shortest-path tree: for
+    every other table, the previous table and foreign key on the shortest join
+    path and the number of joins needed. Trees are computed for every table up
+    front on small schemas and memoized on first use on large ones, so a join
+    path is a walk of a few array entries.
+    """
+
+    def __init__(self, table_ids, table_names, edges):
+        """
+        Args:
+            table_ids (list): Table IDs; their positions are the graph's node numbers
+            table_names (list): 'schema.table' for each node
+            edges (list): (from node, from column, to node, to column) per foreign key
+        """
+        self.version = None
+        self.table_ids = list(table_ids)
+        self.table_names = list(table_names)
+        self.edges = list(edges)
+        self._nodes = {table_id: node for node, table_id in enumerate(self.table_ids)}
+        self._by_name = {name: self.table_ids[node] for node, name in enumerate(self.table_names)}
+
+        # One edge per neighbouring pair (the first foreign key between them) keeps paths deterministic
+        self._adjacency = [[] for _ in self.table_ids]
+        self._referenced = [[] for _ in self.table_ids]
+        linked = set()
+        for edge_id, (from_node, _, to_node, _) in enumerate(self.edges):
+            if from_node == to_node:
+                continue
+            self._referenced[from_node].append(to_node)
+            pair = (min(from_node, to_node), max(from_node, to_node))
+            if pair in linked:
+                continue
+            linked.add(pair)
+            self._adjacency[from_node].append((to_node, edge_id))
+            self._adjacency[to_node].append((from_node, edge_id))
+
+        self._trees = OrderedDict()
+        self._trees_lock = threading.Lock()
+        self._max_trees = max(16, MEMOIZED_TREE_BYTES // max(1, 12 * len(self.table_ids)))
+
+    def __len__(self):
+        return len(self.table_ids)
+
+    def memory_usage(self):
+        """Approximate bytes held by nodes, edges and shortest-path trees"""
+        return (
+            len(self.table_ids) * 300 + len(self.edges) * 200
+            + sum(parents.nbytes + via.nbytes + depths.nbytes for parents, via, depths in self._trees.values())
+        )
+
+    def precompute(self):
+        """Compute the shortest-path tree of every table"""
+        for node in range(len(self.table_ids)):
+            self._tree(node)
+
+    def _tree(self, source):
+        """(previous node, edge ID, depth) arrays of the shortest-path tree rooted at a node"""
+        with self._trees_lock:
+            tree = self._trees.get(source)
+            if tree is not None:
+                # Least recently used trees are evicted first
+                self._trees.move_to_end(source)
+                return tree
+
+        count = len(self.table_ids)
+        parents = np.full(count, -1, dtype=np.int32)
+        via = np.full(count, -1, dtype=np.int32)
+        depths = np.full(count, UNREACHABLE, dtype=np.int32)
+        depths[source] = 0
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            depth = depths[node] + 1
+            for neighbour, edge_id in self._adjacency[node]:
+                if depths[neighbour] == UNREACHABLE:
+                    depths[neighbour] = depth
+                    parents[neighbour] = node
+                    via[neighbour] = edge_id
+                    queue.append(neighbour)
+
+        tree = (parents, via, depths)
+        with self._trees_lock:
+            if source not in self._trees and len(self._trees) >= self._max_trees:
+                # Forget the least recently used tree; huge schemas only keep the busiest sources warm
+                self._trees.popitem(last=False)
+            self._trees[source] = tree
+        return tree
+
+    def _join(self, edge_id):
+        """A foreign key as a join description, oriented from the referencing table"""
+        from_node, from_column, to_node, to_column = self.edges[edge_id]
+        return {
+            'from_table_id': self.table_ids[from_node],
+            'from_table': self.table_names[from_node],
+            'from_column': from_column,
+            'to_table_id': self.table_ids[to_node],
+            'to_table': self.table_names[to_node],
+            'to_column': to_column
+        }
+
+    def table_id(self, schema_name, table_name):
+        """Table ID for a qualified table name, or None"""
+        return self._by_name.get(f"{schema_name}.{table_name}")
+
+    def referenced_tables(self, table_id):
+        """IDs of the tables a table references through its own foreign keys"""
+        node = self._nodes.get(table_id)
+        if node is None:
+            return []
+        return [self.table_ids[referenced] for referenced in self._referenced[node]]
+
+    def shortest_path(self, from_table_id, to_table_id):
+        """
+        Joins on a shortest path between two tables.
+
+        Returns:
+            list or None: Join dicts in order from the first table to the second;
+                empty for the same table, None if they are not connected
+        """
+        source, target = self._nodes.get(from_table_id), self._nodes.get(to_table_id)
+        if source is None or target is None:
+            return None
+        # Walking the target's tree from the source visits the path in source-to-target order
+        parents, via, depths = self._tree(target)
+        if depths[source] == UNREACHABLE:
+            return None
+        joins = []
+        node = source
+        while node != target:
+            joins.append(self._join(via[node]))
+            node = parents[node]
+        return joins
+
+    def join_tree(self, table_ids):
+        """
+        Smallest set of joins connecting the given tables.
+
+        Tables are attached one at a time, always the one closest to the tree
+        built so far, along its shortest path to that tree (the
+        Takahashi-Matsuyama heuristic for Steiner trees, exact for two tables).
+
+        Args:
+            table_ids (list): Tables a query needs, in priority order
+
+        Returns:
+            dict: 'tables' (connected table IDs in join order, including intermediate
+                tables), 'joins' (join dicts, each adding one table) and 'unreachable'
+                (requested tables with no join path to the first one)
+        """
+        terminals = []
+        for table_id in table_ids:
+            node = self._nodes.get(table_id)
+            if node is not None and node not in terminals:
+                terminals.append(node)
+        if not terminals:
+            return {'tables': [], 'joins': [], 'unreachable': []}
+
+        tree_nodes = [terminals[0]]
+        in_tree = {terminals[0]}
+        joins = []
+        remaining = terminals[1:]
+        unreachable = []
+        while remaining:
+            members = np.asarray(tree_nodes, dtype=np.int32)
+            best = None
+            for terminal in remaining:
+                depths = self._tree(terminal)[2][members]
+                nearest = int(np.argmin(depths))
+                if best is None or depths[nearest] < best[0]:
+                    best = (depths[nearest], terminal, int(members[nearest]))
+            distance, terminal, attach = best
+            if distance == UNREACHABLE:
+                unreachable = remaining
+                break
+            remaining = [node for node in remaining if node != terminal]
+
+            # Walk from the tree toward the terminal, adding each table on the way
+            parents, via, _ = self._tree(terminal)
+            node = attach
+            while node != terminal:
+                following = int(parents[node])
+                if following not in in_tree:
+                    joins.append(self._join(via[node]))
+                    in_tree.add(following)
+                    tree_nodes.append(following)
+                node = following
+
+        return {
+            'tables': [self.table_ids[node] for node in tree_nodes],
+            'joins': joins,
+            'unreachable': [self.table_ids[node] for node in unreachable]
+        }
+
+
+def build_join_graph(database_obj):
+    """Build the join graph of a database's current tables and foreign keys"""
+    tables = list(
+        TableMetadata.objects.filter(database=database_obj)
+        .order_by('id')
+        .values_list('id', 'schema_name', 'table_name')
+    )
+    nodes = {table_id: node for node, (table_id, _, _) in enumerate(tables)}
+    edges = [
+        (nodes[from_table], from_column, nodes[to_table], to_column)
+        for from_table, from_column, to_table, to_column in RelationshipMetadata.objects.filter(
+            from_column__table__database=database_obj
+        ).order_by('id').values_list(
+            'from_column__table_id', 'from_column__column_name', 'to_column__table_id', 'to_column__column_name'
+        )
+        if from_table in nodes and to_table in nodes
+    ]
+
+    graph = JoinGraph(
+        [table_id for table_id, _, _ in tables],
+        [f"{schema_name}.{table_name}" for _, schema_name, table_name in tables],
+        edges
+    )
+    graph.version = database_obj.metadata_version
+    if len(graph) <= getattr(settings, 'JOIN_GRAPH_PRECOMPUTE_MAX_TABLES', 500):
+        graph.precompute()
+    logger.info(f"Join graph for database {database_obj.id} built: {len(graph)} tables, {len(edges)} foreign keys")
+    return graph
+
+
+def get_join_graph(database_obj):
+    """
+    Return the join graph for a database's current metadata version, building it on a cache miss.
+
+    Args:
+        database_obj (ClientDatabase): Database whose tables are joined
+
+    Returns:
+        JoinGraph: Graph whose version matches database_obj.metadata_version
+    """
+    return get_metadata_cache().get_or_build(
+        database_obj.id, ('join_graph', database_obj.metadata_version), lambda: build_join_graph(database_obj)
+    )
+
+
+def format_joins(joins):
+    """Render joins as one equality per line, e.g. - public.orders.customer_id = public.customers.id"""
+    return '\n'.join(
+        f"- {join['from_table']}.{join['from_column']} = {join['to_table']}.{join['to_column']}"
+        for join in joins
+    )
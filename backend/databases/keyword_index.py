@@ -0,0 +1,183 @@
+import logging
+import math
+from collections import Counter, defaultdict
+import numpy as np
+from .cache import get_metadata_cache
+from .models import TableMetadata, ColumnMetadata
+from .text_utils import tokenize
+from .vector_index import table_entry, column_entry
+
+logger = logging.getLogger(__name__)
+
+# Name tokens count this many times toward term frequency, so a match on a
+# table or column name outranks the same word buried in a description
+NAME_WEIGHT = 2
+
+
+def table_terms(table):
+    """Weighted terms for a table document"""
+    return tokenize(table.table_name) * NAME_WEIGHT + tokenize(table.description)
+
+
+def column_terms(column):
+    """Weighted terms for a column document (expects column.table to be loaded)"""
+    return (
+        tokenize(column.column_name) * NAME_WEIGHT
+        + tokenize(column.table.table_name)
+        + tokenize(column.data_type)
+        + tokenize(column.description)
+    )
+
+
+class KeywordIndex:
+    """
+    BM25 inverted index over table and column metadata.
+
+    Each posting list stores document positions and their precomputed BM25
+    weights, so a query only touches the postings of its own terms and cost
+    grows with how common those terms are, not with schema size. Entries and
+    postings are swapped in as one tuple, so searches need no lock.
+    """
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.version = None
+        self._state = ([], {})
+
+    def __len__(self):
+        return len(self._state[0])
+
+    @property
+    def term_count(self):
+        return len(self._state[1])
+
+    def memory_usage(self):
+        """Approximate bytes held by postings and result payloads"""
+        entries, postings = self._state
+        return len(entries) * 600 + sum(
+            positions.nbytes + weights.nbytes + 100 for positions, weights in postings.values()
+        )
+
+    def build(self, documents):
+        """
+        Replace the index contents.
+
+        Args:
+            documents (iterable): (entry, terms) pairs, entry being the search result payload
+        """
+        entries = []
+        term_docs = defaultdict(list)
+        lengths = []
+
+        for position, (entry, terms) in enumerate(documents):
+            entries.append(entry)
+            lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                term_docs[term].append((position, frequency))
+
+        doc_count = len(entries)
+        lengths = np.asarray(lengths, dtype=np.float32)
+        average_length = float(lengths.mean()) if doc_count and lengths.sum() else 1.0
+        # Per-document length normalization, shared by every term
+        norms = self.k1 * (1 - self.b + self.b * lengths / average_length)
+
+        postings = {}
+        for term, docs in term_docs.items():
+            positions = np.fromiter((position for position, _ in docs), dtype=np.int32, count=len(docs))
+            frequencies = np.fromiter((frequency for _, frequency in docs), dtype=np.float32, count=len(docs))
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            weights = idf * frequencies * (self.k1 + 1) / (frequencies + norms[positions])
+            postings[term] = (positions, weights.astype(np.float32))
+
+        self._state = (entries, postings)
+
+    def search(self, query_text, k=10):
+        """
+        Return the top-k entries by BM25 score.
+
+        Args:
+            query_text (str): Free text or identifiers; split like the indexed names
+            k (int): Number of results
+
+        Returns:
+            list: Entry dicts with a 'score' key, best first
+        """
+        entries, postings = self._state
+        matched = [postings[term] for term in set(tokenize(query_text)) if term in postings]
+        if not matched or k <= 0:
+            return []
+
+        positions = np.concatenate([term_positions for term_positions, _ in matched])
+        weights = np.concatenate([term_weights for _, term_weights in matched])
+
+        if len(positions) * 8 > len(entries):
+            # Common terms touch much of the index; a dense accumulator beats sorting
+            scores = np.bincount(positions, weights=weights, minlength=len(entries))
+            documents = None
+        else:
+            # Sum weights per document over the matched postings only
+            order = np.argsort(positions, kind='stable')
+            positions = positions[order]
+            starts = np.flatnonzero(np.r_[True, positions[1:] != positions[:-1]])
+            documents = positions[starts]
+            scores = np.add.reduceat(weights[order], starts)
+
+        k = min(k, len(scores))
+        top = np.argpartition(scores, len(scores) - k)[len(scores) - k:]
+        top = top[np.argsort(-scores[top])]
+        if documents is not None:
+            return [dict(entries[documents[i]], score=float(scores[i])) for i in top]
+        return [dict(entries[i], score=float(scores[i])) for i in top if scores[i] > 0]
+
+
+def build_keyword_index(index, database_obj):
+    """Rebuild an index from the database's current metadata"""
+    tables = TableMetadata.objects.filter(database=database_obj).only(
+        'id', 'table_name', 'schema_name', 'description'
+    )
+    columns = ColumnMetadata.objects.filter(table__database=database_obj).select_related('table').only(
+        'id', 'column_name', 'data_type', 'description',
+        'table__table_name', 'table__schema_name'
+    )
+
+    def documents():
+        for table in tables.iterator(chunk_size=2000):
+            yield table_entry(table), table_terms(table)
+        for column in columns.iterator(chunk_size=2000):
+            yield column_entry(column), column_terms(column)
+
+    index.build(documents())
+    index.version = database_obj.metadata_version
+    logger.info(f"Keyword index for database {database_obj.id} built: {len(index)} documents, {index.term_count} terms")
+
+
+def get_keyword_index(database_obj):
+    """
+    Return the keyword index for a database's current metadata version, building it on a cache miss.
+
+    Args:
+        database_obj (ClientDatabase): Database to search
+
+    Returns:
+        KeywordIndex: Index whose version matches database_obj.metadata_version
+    """
+    def build():
+        index = KeywordIndex()
+        build_keyword_index(index, database_obj)
+        return index
+
+    return get_metadata_cache().get_or_build(
+        database_obj.id, ('keyword_index', database_obj.metadata_version), build
+    )
+
+
+def search_keywords(database_obj, query_text, limit=10):
+    """Search table and column metadata by BM25 keyword relevance, caching results per metadata version"""
+    cache = get_metadata_cache()
+    key = ('keyword_search', database_obj.metadata_version, query_text, limit)
+    results = cache.get(database_obj.id, key)
+    if results is None:
+        results = get_keyword_index(database_obj).search(query_text, k=limit)
+        cache.set(database_obj.id, key, results)
+    return [dict(result) for result in results]
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from databases.scheduler import MetadataRefreshScheduler
+
+
+class Command(BaseCommand):
+    help = "Refresh extracted metadata for client databases on a schedule"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run a single refresh pass and exit")
+        parser.add_argument('--database-id', type=int, action='append', dest='database_ids',
+                            help="Only refresh this database (may be repeated)")
+        parser.add_argument('--interval', type=int, help="Seconds between refreshes of a database")
+        parser.add_argument('--jitter', type=float, help="Fraction of the interval added as random jitter")
+        parser.add_argument('--max-concurrency', type=int, help="Refreshes running at once across all schedulers")
+        parser.add_argument('--per-host-concurrency', type=int, help="Refreshes running at once against one host")
+        parser.add_argument('--tick', type=int, help="Seconds to sleep between passes when looping")
+
+    def handle(self, *args, **options):
+        scheduler = MetadataRefreshScheduler(
+            interval=options['interval'],
+            jitter=options['jitter'],
+            max_concurrency=options['max_concurrency'],
+            per_host_concurrency=options['per_host_concurrency']
+        )
+
+        if not options['once']:
+            self.stdout.write("Starting metadata refresh scheduler")
+            scheduler.run_forever(tick=options['tick'], database_ids=options['database_ids'])
+            return
+
+        results = scheduler.run_once(database_ids=options['database_ids'])
+        for database_id, (success, message) in results.items():
+            style = self.style.SUCCESS if success else self.style.ERROR
+            self.stdout.write(style(f"Database {database_id}: {message}"))
+        self.stdout.write(f"Refreshed {len(results)} database(s)")
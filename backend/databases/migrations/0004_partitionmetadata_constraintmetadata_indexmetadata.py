@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0003_erdiagram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartitionMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('strategy', models.CharField(choices=[('range', 'Range'), ('list', 'List'), ('hash', 'Hash')], max_length=20)),
+                ('key_columns', models.JSONField(default=list)),
+                ('key_definition', models.TextField()),
+                ('partition_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('table', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='partitioning', to='databases.tablemetadata')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConstraintMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('constraint_name', models.CharField(max_length=255)),
+                ('constraint_type', models.CharField(choices=[('primary_key', 'Primary Key'), ('unique', 'Unique'), ('foreign_key', 'Foreign Key'), ('check', 'Check'), ('exclusion', 'Exclusion')], max_length=20)),
+                ('columns', models.JSONField(default=list)),
+                ('referenced_columns', models.JSONField(blank=True, default=list)),
+                ('definition', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('referenced_table', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='referencing_constraints', to='databases.tablemetadata')),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='constraints', to='databases.tablemetadata')),
+            ],
+            options={
+                'unique_together': {('table', 'constraint_name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='IndexMetadata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index_name', models.CharField(max_length=255)),
+                ('columns', models.JSONField(default=list)),
+                ('index_method', models.CharField(default='btree', max_length=50)),
+                ('is_unique', models.BooleanField(default=False)),
+                ('is_primary', models.BooleanField(default=False)),
+                ('predicate', models.TextField(blank=True, null=True)),
+                ('definition', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='indexes', to='databases.tablemetadata')),
+            ],
+            options={
+                'unique_together': {('table', 'index_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0004_partitionmetadata_constraintmetadata_indexmetadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='metadata_refresh_attempted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='metadata_refresh_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0005_clientdatabase_metadata_refresh_attempted_at_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='columnmetadata',
+            name='embedding_vector',
+        ),
+        migrations.RemoveField(
+            model_name='tablemetadata',
+            name='embedding_vector',
+        ),
+        migrations.AddField(
+            model_name='columnmetadata',
+            name='embedding',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='columnmetadata',
+            name='embedding_model',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='tablemetadata',
+            name='embedding',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tablemetadata',
+            name='embedding_model',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0006_remove_columnmetadata_embedding_vector_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='metadata_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
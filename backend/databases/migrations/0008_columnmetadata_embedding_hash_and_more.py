@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0007_clientdatabase_metadata_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='columnmetadata',
+            name='embedding_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='tablemetadata',
+            name='embedding_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
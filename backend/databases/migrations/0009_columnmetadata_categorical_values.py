@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0008_columnmetadata_embedding_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='columnmetadata',
+            name='categorical_values',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0009_columnmetadata_categorical_values'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='answer_cache_enabled',
+            field=models.BooleanField(default=True),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import F
 from django.conf import settings
+from .signals import metadata_version_bumped
 
 # Database type constants
 DATABASE_TYPES = [
@@ -33,9 +35,23 @@ class ClientDatabase(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     last_metadata_update = models.DateTimeField(null=True, blank=True)
     connection_status = models.CharField(max_length=20, choices=CONNECTION_STATUS, default='disconnected')
+    # Scheduled refresh bookkeeping: the claim acts as a lease shared by all schedulers
+    metadata_refresh_claimed_at = models.DateTimeField(null=True, blank=True)
+    metadata_refresh_attempted_at = models.DateTimeField(null=True, blank=True)
+    # Bumped whenever extracted metadata or embeddings change; derived indexes key on it
+    metadata_version = models.PositiveIntegerField(default=0)
+    # Serve repeated questions from the nl_to_sql answer cache
+    answer_cache_enabled = models.BooleanField(default=True)
     
     def __str__(self):
         return f"{self.name} ({self.database_type})"
+    
+    def bump_metadata_version(self):
+        """Mark metadata as changed so indexes and caches built from it are refreshed"""
+        ClientDatabase.objects.filter(id=self.id).update(metadata_version=F('metadata_version') + 1)
+        self.refresh_from_db(fields=['metadata_version'])
+        # Receivers precompute data for the new version; send_robust logs their failures instead of raising
+        metadata_version_bumped.send_robust(sender=ClientDatabase, database=self)
 
 class TableMetadata(models.Model):
     """Stores metadata about database tables"""
@@ -45,7 +61,9 @@ class TableMetadata(models.Model):
     table_type = models.CharField(max_length=50)  # table, view, etc.
     description = models.TextField(null=True, blank=True)
     row_count = models.IntegerField(null=True, blank=True)
-    embedding_vector = models.JSONField(null=True, blank=True)  # For semantic search
+    embedding = models.BinaryField(null=True, blank=True)  # Packed float32 vector for semantic search
+    embedding_model = models.CharField(max_length=255, null=True, blank=True)  # Backend that produced it
+    embedding_hash = models.CharField(max_length=64, null=True, blank=True)  # SHA-256 of the embedded text
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -64,7 +82,10 @@ class ColumnMetadata(models.Model):
     is_primary_key = models.BooleanField(default=False)
     is_foreign_key = models.BooleanField(default=False)
     description = models.TextField(null=True, blank=True)
-    embedding_vector = models.JSONField(null=True, blank=True)  # For semantic search
+    embedding = models.BinaryField(null=True, blank=True)  # Packed float32 vector for semantic search
+    embedding_model = models.CharField(max_length=255, null=True, blank=True)  # Backend that produced it
+    embedding_hash = models.CharField(max_length=64, null=True, blank=True)  # SHA-256 of the embedded text
+    categorical_values = models.JSONField(null=True, blank=True)  # Distinct values of a low-cardinality text column
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -85,6 +106,74 @@ class RelationshipMetadata(models.Model):
     def __str__(self):
         return f"{self.from_column} -> {self.to_column}"
 
+# Constraint type constants
+CONSTRAINT_TYPES = [
+    ('primary_key', 'Primary Key'),
+    ('unique', 'Unique'),
+    ('foreign_key', 'Foreign Key'),
+    ('check', 'Check'),
+    ('exclusion', 'Exclusion'),
+]
+
+# Partitioning strategy constants
+PARTITION_STRATEGIES = [
+    ('range', 'Range'),
+    ('list', 'List'),
+    ('hash', 'Hash'),
+]
+
+class IndexMetadata(models.Model):
+    """Stores index definitions so generation can prefer cheap predicates"""
+    table = models.ForeignKey(TableMetadata, on_delete=models.CASCADE, related_name='indexes')
+    index_name = models.CharField(max_length=255)
+    columns = models.JSONField(default=list)  # Ordered key columns/expressions
+    index_method = models.CharField(max_length=50, default='btree')  # btree, hash, gin, gist, brin
+    is_unique = models.BooleanField(default=False)
+    is_primary = models.BooleanField(default=False)
+    predicate = models.TextField(null=True, blank=True)  # WHERE clause of partial indexes
+    definition = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('table', 'index_name')
+    
+    def __str__(self):
+        return f"{self.index_name} on {self.table.table_name} ({', '.join(self.columns)})"
+
+class ConstraintMetadata(models.Model):
+    """Stores table constraints, including composite unique and foreign keys"""
+    table = models.ForeignKey(TableMetadata, on_delete=models.CASCADE, related_name='constraints')
+    constraint_name = models.CharField(max_length=255)
+    constraint_type = models.CharField(max_length=20, choices=CONSTRAINT_TYPES)
+    columns = models.JSONField(default=list)
+    referenced_table = models.ForeignKey(
+        TableMetadata, on_delete=models.CASCADE, null=True, blank=True, related_name='referencing_constraints'
+    )
+    referenced_columns = models.JSONField(default=list, blank=True)
+    definition = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('table', 'constraint_name')
+    
+    def __str__(self):
+        return f"{self.constraint_name} ({self.constraint_type}) on {self.table.table_name}"
+
+class PartitionMetadata(models.Model):
+    """Stores the partition key of a partitioned table"""
+    table = models.OneToOneField(TableMetadata, on_delete=models.CASCADE, related_name='partitioning')
+    strategy = models.CharField(max_length=20, choices=PARTITION_STRATEGIES)
+    key_columns = models.JSONField(default=list)
+    key_definition = models.TextField()  # e.g. RANGE (created_at)
+    partition_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.table.table_name} partitioned by {self.key_definition}"
+
 class ERDiagram(models.Model):
     """Stores ER diagram representation of a database schema"""
     database = models.OneToOneField(ClientDatabase, on_delete=models.CASCADE, related_name='er_diagram')
@@ -0,0 +1,179 @@
+import logging
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+import pytz
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max, Q
+from session.models import Session
+from .models import ClientDatabase
+from .services import MetadataExtractor, generate_er_diagram
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataRefreshScheduler:
+    """
+    Periodically refreshes extracted metadata for client databases.
+
+    Refresh claims are stored on ClientDatabase rows, so the global and per-host
+    concurrency caps hold across every scheduler process sharing the Django
+    database. A claim older than the lease timeout is treated as abandoned.
+    """
+
+    def __init__(self, interval=None, jitter=None, max_concurrency=None,
+                 per_host_concurrency=None, retry_delay=None, lease_timeout=None):
+        self.interval = interval or getattr(settings, 'METADATA_REFRESH_INTERVAL', 86400)
+        self.jitter = jitter if jitter is not None else getattr(settings, 'METADATA_REFRESH_JITTER', 0.1)
+        self.max_concurrency = max_concurrency or getattr(settings, 'METADATA_REFRESH_MAX_CONCURRENCY', 4)
+        self.per_host_concurrency = per_host_concurrency or getattr(settings, 'METADATA_REFRESH_PER_HOST_CONCURRENCY', 1)
+        self.retry_delay = retry_delay or getattr(settings, 'METADATA_REFRESH_RETRY_DELAY', 3600)
+        self.lease_timeout = lease_timeout or getattr(settings, 'METADATA_REFRESH_LEASE_TIMEOUT', 3600)
+
+    def _jittered_interval(self, database_obj):
+        """Refresh interval stretched by a stable per-database offset to spread load"""
+        offset = random.Random(database_obj.id).random() * self.jitter
+        return timedelta(seconds=self.interval * (1 + offset))
+
+    def _unclaimed(self, now):
+        """Filter matching databases without a live refresh claim"""
+        stale_before = now - timedelta(seconds=self.lease_timeout)
+        return Q(metadata_refresh_claimed_at__isnull=True) | Q(metadata_refresh_claimed_at__lt=stale_before)
+
+    def due_databases(self, now=None, database_ids=None):
+        """
+        Return databases whose metadata is due for a refresh, most recently used first.
+
+        Only databases that have been extracted at least once are refreshed.
+
+        Args:
+            now (datetime, optional): Reference time, defaults to the current time
+            database_ids (list, optional): Restrict to these database IDs
+
+        Returns:
+            list: ClientDatabase objects in refresh order
+        """
+        now = now or datetime.now(pytz.UTC)
+        candidates = ClientDatabase.objects.filter(
+            self._unclaimed(now),
+            last_metadata_update__lte=now - timedelta(seconds=self.interval)
+        ).filter(
+            Q(metadata_refresh_attempted_at__isnull=True) |
+            Q(metadata_refresh_attempted_at__lte=now - timedelta(seconds=self.retry_delay))
+        )
+        if database_ids:
+            candidates = candidates.filter(id__in=database_ids)
+
+        due = [
+            database for database in candidates
+            if database.last_metadata_update + self._jittered_interval(database) <= now
+        ]
+
+        # Sessions are touched on every query, so they tell us which databases are in use
+        last_used = dict(
+            Session.objects.filter(database_id__in=[database.id for database in due])
+            .values('database_id')
+            .annotate(last_used=Max('updated_at'))
+            .values_list('database_id', 'last_used')
+        )
+
+        def priority(database):
+            used_at = last_used.get(database.id)
+            return (
+                used_at is None,
+                -used_at.timestamp() if used_at else 0,
+                database.last_metadata_update
+            )
+
+        due.sort(key=priority)
+        return due
+
+    def _active_claims(self, now):
+        """Count live refresh claims per host across all scheduler processes"""
+        stale_before = now - timedelta(seconds=self.lease_timeout)
+        return Counter(
+            ClientDatabase.objects.filter(metadata_refresh_claimed_at__gte=stale_before)
+            .values_list('host', flat=True)
+        )
+
+    def _claim(self, database_obj, now):
+        """Atomically claim a database for refresh; False if another process holds it"""
+        claimed = ClientDatabase.objects.filter(self._unclaimed(now), id=database_obj.id).update(
+            metadata_refresh_claimed_at=now,
+            metadata_refresh_attempted_at=now
+        )
+        return claimed == 1
+
+    def refresh(self, database_obj):
+        """Extract metadata for one claimed database and release the claim"""
+        try:
+            extractor = MetadataExtractor()
+            success, message, changes = extractor.extract_full_metadata(database_obj)
+            if success:
+                generate_er_diagram(database_obj.id)
+            return success, message
+        except Exception as e:
+            logger.exception(f"Scheduled metadata refresh failed for database {database_obj.id}: {str(e)}")
+            return False, str(e)
+        finally:
+            ClientDatabase.objects.filter(id=database_obj.id).update(metadata_refresh_claimed_at=None)
+            # Worker threads each hold their own Django connection
+            connection.close()
+
+    def run_once(self, database_ids=None):
+        """
+        Refresh every due database once, honoring the global and per-host caps.
+
+        Args:
+            database_ids (list, optional): Restrict to these database IDs
+
+        Returns:
+            dict: Mapping of database ID to (success, message)
+        """
+        pending = self.due_databases(database_ids=database_ids)
+        results = {}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            while pending or running:
+                now = datetime.now(pytz.UTC)
+                active = self._active_claims(now)
+                total_active = sum(active.values())
+
+                for database in list(pending):
+                    if total_active >= self.max_concurrency:
+                        break
+                    if active[database.host] >= self.per_host_concurrency:
+                        continue
+                    pending.remove(database)
+                    if not self._claim(database, now):
+                        # Picked up by another scheduler process
+                        continue
+                    active[database.host] += 1
+                    total_active += 1
+                    running[pool.submit(self.refresh, database)] = database
+
+                if not running:
+                    # Everything left is blocked by claims held elsewhere; retry next pass
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    database = running.pop(future)
+                    results[database.id] = future.result()
+                    logger.info(f"Refreshed metadata for database {database.id}: {results[database.id][1]}")
+
+        return results
+
+    def run_forever(self, tick=None, database_ids=None):
+        """Run refresh passes indefinitely, sleeping a jittered tick between passes"""
+        tick = tick or getattr(settings, 'METADATA_REFRESH_TICK', 300)
+        while True:
+            try:
+                self.run_once(database_ids=database_ids)
+            except Exception as e:
+                logger.exception(f"Metadata refresh pass failed: {str(e)}")
+            time.sleep(tick * (1 + random.uniform(0, self.jitter)))
@@ -11,7 +11,7 @@ class ClientDatabaseSerializer(serializers.ModelSerializer):
             'host', 'port', 'database_name', 'username', 'password',
             'ssl_enabled', 'ssl_ca', 'ssl_cert', 'ssl_key', 
             'created_at', 'updated_at', 'last_metadata_update', 
-            'connection_status'
+            'connection_status', 'answer_cache_enabled'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'last_metadata_update', 'connection_status']
         extra_kwargs = {
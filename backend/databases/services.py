@@ -1,7 +1,46 @@
+import hashlib
+import logging
 import psycopg2
 import pytz
 from datetime import datetime
-from .models import ClientDatabase, TableMetadata, ColumnMetadata, RelationshipMetadata, CONNECTION_STATUS
+from django.conf import settings
+from django.db import transaction
+from .cache import get_metadata_cache
+from .embeddings import get_embedding_backend, pack_vector
+from .join_graph import get_join_graph
+from .vector_index import get_vector_index
+from .models import (
+    ClientDatabase, TableMetadata, ColumnMetadata, RelationshipMetadata, CONNECTION_STATUS,
+    IndexMetadata, ConstraintMetadata, PartitionMetadata
+)
+
+# Map pg_constraint.contype / pg_partitioned_table.partstrat codes to our choices
+PG_CONSTRAINT_TYPES = {
+    'p': 'primary_key',
+    'u': 'unique',
+    'f': 'foreign_key',
+    'c': 'check',
+    'x': 'exclusion',
+}
+PG_PARTITION_STRATEGIES = {
+    'r': 'range',
+    'l': 'list',
+    'h': 'hash',
+}
+# information_schema data types whose distinct values are collected for literal grounding
+CATEGORICAL_DATA_TYPES = ('text', 'character varying', 'character', 'USER-DEFINED')
+# Longer values are free text rather than labels a question would quote
+MAX_CATEGORICAL_VALUE_LENGTH = 100
+
+logger = logging.getLogger(__name__)
+
+def quote_identifier(name):
+    """A schema, table or column name quoted for interpolation into SQL"""
+    return '"' + name.replace('"', '""') + '"'
+
+def text_hash(text):
+    """SHA-256 of an embedding text, used to skip re-embedding unchanged items"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
 class DatabaseConnector:
     """Handles database connection and basic operations"""
@@ -126,10 +165,12 @@ class DatabaseConnector:
             database_obj.save(update_fields=['connection_status'])
             return results
     
-    def get_column_sample_values(self, database_obj, schema_name, table_name, column_name, limit=10):
-        """Fetch sample distinct values from a column to provide AI context"""
+    def get_column_sample_values(self, database_obj, schema_name, table_name, column_name, limit=10, conn=None):
+        """Fetch sample distinct values from a column to provide AI context, optionally over a caller-owned connection"""
+        owns_connection = conn is None
         try:
-            conn = self.create_connection(database_obj)
+            if owns_connection:
+                conn = self.create_connection(database_obj)
             results = []
             
             with conn.cursor() as cursor:
@@ -155,8 +196,12 @@ class DatabaseConnector:
                 except Exception as e:
                     # If query fails, just return empty list
                     print(f"Error getting sample values: {str(e)}")
+                    if not owns_connection:
+                        # Keep the shared connection usable for the caller's next query
+                        conn.rollback()
             
-            conn.close()
+            if owns_connection:
+                conn.close()
             return results
         except Exception as e:
             print(f"Connection error getting sample values: {str(e)}")
@@ -165,194 +210,181 @@ class DatabaseConnector:
 class MetadataExtractor:
     """Extracts schema metadata from connected databases"""
     
-    def __init__(self):
+    def __init__(self, chunk_size=None):
         self.connector = DatabaseConnector()
+        # Catalog rows are streamed and committed in chunks of this size to bound memory
+        self.chunk_size = chunk_size or getattr(settings, 'METADATA_EXTRACTION_CHUNK_SIZE', 500)
+        # Detailed change entries kept per list; totals are always exact
+        self.change_log_limit = getattr(settings, 'METADATA_CHANGE_LOG_LIMIT', 1000)
+        self.reset_changes()
+    
+    def reset_changes(self):
+        """Reset change tracking for a new extraction run"""
         self.changes = {
             'tables': {'added': [], 'updated': [], 'removed': []},
             'columns': {'added': [], 'updated': [], 'removed': []},
-            'relationships': {'added': [], 'updated': [], 'removed': []}
+            'relationships': {'added': [], 'updated': [], 'removed': []},
+            'totals': {
+                'tables': {'added': 0, 'updated': 0, 'removed': 0},
+                'columns': {'added': 0, 'updated': 0, 'removed': 0},
+                'relationships': {'added': 0, 'updated': 0, 'removed': 0}
+            }
         }
     
+    def _record_change(self, category, action, entry):
+        """Count a change and keep its details while under the change log limit"""
+        self.changes['totals'][category][action] += 1
+        entries = self.changes[category][action]
+        if len(entries) < self.change_log_limit:
+            entries.append(entry)
+    
+    def _stream_catalog(self, conn, cursor_name, query, params=None):
+        """Yield catalog query results in chunks through a server-side (named) cursor"""
+        with conn.cursor(name=cursor_name) as cursor:
+            cursor.itersize = self.chunk_size
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                yield rows
+    
+    def _iter_chunks(self, queryset):
+        """Yield lists of at most chunk_size objects, paginating on the primary key"""
+        last_id = 0
+        while True:
+            chunk = list(queryset.filter(id__gt=last_id).order_by('id')[:self.chunk_size])
+            if not chunk:
+                break
+            yield chunk
+            last_id = chunk[-1].id
+    
     def extract_full_metadata(self, database_obj):
         """Extract all metadata (tables, columns, relationships) from a database"""
         try:
             # Reset changes tracking
-            self.changes = {
-                'tables': {'added': [], 'updated': [], 'removed': []},
-                'columns': {'added': [], 'updated': [], 'removed': []},
-                'relationships': {'added': [], 'updated': [], 'removed': []}
-            }
+            self.reset_changes()
             
-            # Get all current tables in database to track removed tables
-            existing_tables = set(TableMetadata.objects.filter(database=database_obj)
-                                 .values_list('schema_name', 'table_name'))
+            # Every table seen during this run is saved, so anything not touched
+            # since now has been removed from the source database
+            started_at = datetime.now(pytz.UTC)
             
             # Get tables first
-            tables = self.extract_tables(database_obj)
+            self.extract_tables(database_obj)
             
-            # Check for removed tables
-            current_tables = set((table.schema_name, table.table_name) for table in tables)
-            removed_tables = existing_tables - current_tables
+            # Record and delete removed tables
+            removed_tables = TableMetadata.objects.filter(database=database_obj, updated_at__lt=started_at)
+            for schema_name, table_name in removed_tables.values_list('schema_name', 'table_name').iterator(chunk_size=self.chunk_size):
+                self._record_change('tables', 'removed', {
+                    'schema': schema_name,
+                    'name': table_name
+                })
+            removed_tables.delete()
             
-            # Record removed tables
-            for schema_name, table_name in removed_tables:
-                try:
-                    table = TableMetadata.objects.get(
-                        database=database_obj,
-                        schema_name=schema_name,
-                        table_name=table_name
-                    )
-                    self.changes['tables']['removed'].append({
-                        'schema': schema_name,
-                        'name': table_name
-                    })
-                    table.delete()
-                except TableMetadata.DoesNotExist:
-                    continue  # Table was already deleted somehow
-            
-            # For each table, get its columns
-            for table in tables:
-                # Get current columns in table to track removed columns
-                existing_columns = set(
-                    ColumnMetadata.objects.filter(table=table)
-                    .values_list('column_name', flat=True)
-                )
-                
-                # Extract columns
-                columns = self.extract_columns(database_obj, table.schema_name, table.table_name)
-                
-                # Check for removed columns
-                current_columns = set(col.column_name for col in columns)
-                removed_columns = existing_columns - current_columns
-                
-                # Record removed columns
-                for column_name in removed_columns:
-                    try:
-                        column = ColumnMetadata.objects.get(
-                            table=table,
-                            column_name=column_name
-                        )
-                        self.changes['columns']['removed'].append({
-                            'table': f"{table.schema_name}.{table.table_name}",
-                            'name': column_name
-                        })
-                        column.delete()
-                    except ColumnMetadata.DoesNotExist:
-                        continue  # Column was already deleted
+            # For each table, get its columns over a single connection, one chunk of tables at a time
+            conn = self.connector.create_connection(database_obj)
+            try:
+                for tables in self._iter_chunks(TableMetadata.objects.filter(database=database_obj)):
+                    with transaction.atomic():
+                        for table in tables:
+                            # Get current columns in table to track removed columns
+                            existing_columns = set(
+                                ColumnMetadata.objects.filter(table=table)
+                                .values_list('column_name', flat=True)
+                            )
+                            
+                            # Extract columns
+                            columns = self.extract_columns(database_obj, table.schema_name, table.table_name, conn=conn)
+                            
+                            # Check for removed columns
+                            current_columns = set(col.column_name for col in columns)
+                            removed_columns = existing_columns - current_columns
+                            
+                            # Record removed columns
+                            if removed_columns:
+                                for column_name in removed_columns:
+                                    self._record_change('columns', 'removed', {
+                                        'table': f"{table.schema_name}.{table.table_name}",
+                                        'name': column_name
+                                    })
+                                ColumnMetadata.objects.filter(table=table, column_name__in=removed_columns).delete()
+            finally:
+                conn.close()
             
             # Extract relationships between tables
             self.extract_relationships(database_obj)
             
+            # Extract indexes, constraints and partition keys for sargability hints
+            self.extract_indexes(database_obj)
+            self.extract_constraints(database_obj)
+            self.extract_partitions(database_obj)
+            
+            # Collect the values of low-cardinality text columns to ground literals in questions;
+            # they are only hints, so a failure keeps the previous values instead of failing the extraction
+            try:
+                self.extract_categorical_values(database_obj)
+            except Exception as e:
+                logger.warning(f"Categorical value extraction failed for database {database_obj.id}: {str(e)}")
+            
             # Update the timestamp for metadata update
             database_obj.last_metadata_update = datetime.now(pytz.UTC)
             database_obj.save(update_fields=['last_metadata_update'])
+            database_obj.bump_metadata_version()
+            
+            # Precompute join paths for the new version while the relationships are fresh; the metadata
+            # is committed by now, so a failure only leaves them to be built on first use
+            try:
+                get_join_graph(database_obj)
+            except Exception as e:
+                logger.warning(f"Precomputing join paths failed for database {database_obj.id}: {str(e)}")
             
             return True, "Metadata extraction completed successfully", self.changes
         except Exception as e:
             return False, str(e), self.changes
     
     def extract_tables(self, database_obj, schema_pattern=None):
-        """Extract tables and views from the database"""
-        tables = []
+        """
+        Extract tables and views from the database.
+        
+        The catalog is streamed through a server-side cursor and saved one
+        chunk per transaction, so memory stays flat regardless of catalog size.
+        
+        Returns:
+            int: Number of tables and views processed
+        """
+        table_count = 0
         
         try:
             conn = self.connector.create_connection(database_obj)
-            with conn.cursor() as cursor:
-                query = """
-                SELECT 
-                    table_schema, 
-                    table_name, 
-                    table_type,
-                    obj_description(
-                        (quote_ident(table_schema) || '.' || quote_ident(table_name))::regclass::oid, 
-                        'pg_class'
-                    ) as description
-                FROM 
-                    information_schema.tables 
-                WHERE 
-                    table_schema NOT IN ('pg_catalog', 'information_schema')
-                """
-                
-                if schema_pattern:
-                    query += " AND table_schema LIKE %s"
-                    cursor.execute(query, (schema_pattern,))
-                else:
-                    cursor.execute(query)
-                
-                for row in cursor.fetchall():
-                    schema_name, table_name, table_type, db_description = row
-                    
-                    # Convert PostgreSQL table_type to our format
-                    if table_type == 'BASE TABLE':
-                        table_type = 'table'
-                    elif table_type == 'VIEW':
-                        table_type = 'view'
-                    elif table_type == 'MATERIALIZED VIEW':
-                        table_type = 'materialized_view'
-                    
-                    # Try to find existing table metadata to preserve description
-                    try:
-                        existing_table = TableMetadata.objects.get(
-                            database=database_obj,
-                            schema_name=schema_name,
-                            table_name=table_name
-                        )
-                        # Preserve existing description if it exists and not empty
-                        description = existing_table.description if existing_table.description else db_description
-                    except TableMetadata.DoesNotExist:
-                        description = db_description if db_description else ""
-                    
-                    # Get or create table metadata record
-                    table_meta, created = TableMetadata.objects.update_or_create(
-                        database=database_obj,
-                        schema_name=schema_name,
-                        table_name=table_name,
-                        defaults={
-                            'table_type': table_type,
-                            'description': description
-                        }
-                    )
-                    
-                    # Generate default description if none exists
-                    if not table_meta.description:
-                        table_meta.description = self.generate_table_description(table_meta)
-                        table_meta.save(update_fields=['description'])
-                    
-                    # Track changes
-                    if created:
-                        self.changes['tables']['added'].append({
-                            'schema': schema_name,
-                            'name': table_name,
-                            'type': table_type
-                        })
-                    elif table_meta.table_type != table_type:
-                        # Only count as update if table type changed, not description
-                        self.changes['tables']['updated'].append({
-                            'schema': schema_name,
-                            'name': table_name,
-                            'type': table_type,
-                            'changes': {
-                                'type': table_type if table_meta.table_type != table_type else None,
-                            }
-                        })
-                    
-                    # Get row count for tables (not views)
-                    if table_type == 'table':
-                        try:
-                            count_query = f'SELECT COUNT(*) FROM "{schema_name}"."{table_name}"'
-                            cursor.execute(count_query)
-                            row_count = cursor.fetchone()[0]
-                            if table_meta.row_count != row_count:
-                                table_meta.row_count = row_count
-                                table_meta.save(update_fields=['row_count'])
-                        except:
-                            # Skip row count if it fails
-                            pass
-                    
-                    tables.append(table_meta)
+            query = """
+            SELECT 
+                table_schema, 
+                table_name, 
+                table_type,
+                obj_description(
+                    (quote_ident(table_schema) || '.' || quote_ident(table_name))::regclass::oid, 
+                    'pg_class'
+                ) as description
+            FROM 
+                information_schema.tables 
+            WHERE 
+                table_schema NOT IN ('pg_catalog', 'information_schema')
+            """
+            params = None
+            
+            if schema_pattern:
+                query += " AND table_schema LIKE %s"
+                params = (schema_pattern,)
+            
+            # Row counts run on a regular cursor next to the server-side catalog cursor
+            with conn.cursor() as count_cursor:
+                for rows in self._stream_catalog(conn, 'extract_tables', query, params):
+                    with transaction.atomic():
+                        self._save_table_chunk(database_obj, rows, count_cursor)
+                    table_count += len(rows)
             
             conn.close()
-            return tables
+            return table_count
         
         except Exception as e:
             # Cleanup connection and re-raise
@@ -360,12 +392,89 @@ class MetadataExtractor:
                 conn.close()
             raise e
     
-    def extract_columns(self, database_obj, schema_name, table_name):
-        """Extract column metadata for a specific table"""
+    def _save_table_chunk(self, database_obj, rows, count_cursor):
+        """Create or update TableMetadata for one chunk of catalog rows"""
+        # One lookup per chunk instead of one per table
+        existing_tables = {
+            (table.schema_name, table.table_name): table
+            for table in TableMetadata.objects.filter(
+                database=database_obj,
+                table_name__in={row[1] for row in rows}
+            )
+        }
+        
+        for schema_name, table_name, table_type, db_description in rows:
+            # Convert PostgreSQL table_type to our format
+            if table_type == 'BASE TABLE':
+                table_type = 'table'
+            elif table_type == 'VIEW':
+                table_type = 'view'
+            elif table_type == 'MATERIALIZED VIEW':
+                table_type = 'materialized_view'
+            
+            table_meta = existing_tables.get((schema_name, table_name))
+            
+            # Track changes
+            if table_meta is None:
+                table_meta = TableMetadata(
+                    database=database_obj,
+                    schema_name=schema_name,
+                    table_name=table_name,
+                    description=db_description if db_description else ""
+                )
+                self._record_change('tables', 'added', {
+                    'schema': schema_name,
+                    'name': table_name,
+                    'type': table_type
+                })
+            elif table_meta.table_type != table_type:
+                # Only count as update if table type changed, not description
+                self._record_change('tables', 'updated', {
+                    'schema': schema_name,
+                    'name': table_name,
+                    'type': table_type,
+                    'changes': {
+                        'type': table_type,
+                    }
+                })
+            
+            table_meta.table_type = table_type
+            
+            # Preserve existing description if it exists, otherwise fall back to
+            # the database comment and then to a generated default
+            if not table_meta.description:
+                table_meta.description = db_description if db_description else self.generate_table_description(table_meta)
+            
+            # Get row count for tables (not views)
+            if table_type == 'table':
+                row_count = self._count_rows(count_cursor, schema_name, table_name)
+                if row_count is not None:
+                    table_meta.row_count = row_count
+            
+            # Always save so updated_at marks the table as seen in this run
+            table_meta.save()
+    
+    def _count_rows(self, cursor, schema_name, table_name):
+        """Count rows in a table inside a savepoint so a failure cannot abort the catalog stream"""
+        try:
+            cursor.execute("SAVEPOINT row_count")
+            cursor.execute(f'SELECT COUNT(*) FROM "{schema_name}"."{table_name}"')
+            row_count = cursor.fetchone()[0]
+            cursor.execute("RELEASE SAVEPOINT row_count")
+            return row_count
+        except Exception:
+            # Skip row count if it fails
+            cursor.execute("ROLLBACK TO SAVEPOINT row_count")
+            return None
+    
+    def extract_columns(self, database_obj, schema_name, table_name, conn=None):
+        """Extract column metadata for a specific table, optionally over a caller-owned connection"""
         columns = []
+        owns_connection = conn is None
         
         try:
-            conn = self.connector.create_connection(database_obj)
+            if owns_connection:
+                conn = self.connector.create_connection(database_obj)
             table = TableMetadata.objects.get(
                 database=database_obj, 
                 schema_name=schema_name, 
@@ -473,7 +582,7 @@ class MetadataExtractor:
                     
                     # Track changes
                     if created:
-                        self.changes['columns']['added'].append({
+                        self._record_change('columns', 'added', {
                             'table': f"{schema_name}.{table_name}",
                             'name': column_name,
                             'type': data_type
@@ -492,7 +601,7 @@ class MetadataExtractor:
                         # Don't include description in changes since we're preserving it
                             
                         if changes:
-                            self.changes['columns']['updated'].append({
+                            self._record_change('columns', 'updated', {
                                 'table': f"{schema_name}.{table_name}",
                                 'name': column_name,
                                 'changes': changes
@@ -500,72 +609,60 @@ class MetadataExtractor:
                     
                     columns.append(column_meta)
             
-            conn.close()
+            if owns_connection:
+                conn.close()
             return columns
         
         except Exception as e:
             # Cleanup connection and re-raise
-            if 'conn' in locals() and conn:
+            if owns_connection and conn:
                 conn.close()
             raise e
     
     def extract_relationships(self, database_obj):
-        """Extract relationships between tables in the database"""
+        """Extract relationships between tables in the database, streaming the catalog in chunks"""
         try:
             conn = self.connector.create_connection(database_obj)
-            with conn.cursor() as cursor:
-                # Query to find foreign key relationships
-                cursor.execute("""
-                SELECT
-                    kcu.table_schema as fk_schema,
-                    kcu.table_name as fk_table,
-                    kcu.column_name as fk_column,
-                    ccu.table_schema as pk_schema,
-                    ccu.table_name as pk_table,
-                    ccu.column_name as pk_column,
-                    tc.constraint_name
-                FROM
-                    information_schema.table_constraints tc
-                JOIN
-                    information_schema.key_column_usage kcu
-                    ON tc.constraint_name = kcu.constraint_name
-                    AND tc.table_schema = kcu.table_schema
-                JOIN
-                    information_schema.constraint_column_usage ccu
-                    ON ccu.constraint_name = tc.constraint_name
-                    AND ccu.table_schema = tc.table_schema
-                WHERE
-                    tc.constraint_type = 'FOREIGN KEY'
-                    AND kcu.table_schema NOT IN ('pg_catalog', 'information_schema')
-                """)
+            
+            # Query to find foreign key relationships
+            query = """
+            SELECT
+                kcu.table_schema as fk_schema,
+                kcu.table_name as fk_table,
+                kcu.column_name as fk_column,
+                ccu.table_schema as pk_schema,
+                ccu.table_name as pk_table,
+                ccu.column_name as pk_column,
+                tc.constraint_name
+            FROM
+                information_schema.table_constraints tc
+            JOIN
+                information_schema.key_column_usage kcu
+                ON tc.constraint_name = kcu.constraint_name
+                AND tc.table_schema = kcu.table_schema
+            JOIN
+                information_schema.constraint_column_usage ccu
+                ON ccu.constraint_name = tc.constraint_name
+                AND ccu.table_schema = tc.table_schema
+            WHERE
+                tc.constraint_type = 'FOREIGN KEY'
+                AND kcu.table_schema NOT IN ('pg_catalog', 'information_schema')
+            """
+            
+            for rows in self._stream_catalog(conn, 'extract_relationships', query):
+                columns = self._get_column_lookup(
+                    database_obj,
+                    {row[1] for row in rows} | {row[4] for row in rows}
+                )
                 
-                for row in cursor.fetchall():
-                    fk_schema, fk_table, fk_column, pk_schema, pk_table, pk_column, constraint_name = row
-                    
-                    try:
-                        # Get the table metadata objects
-                        fk_table_meta = TableMetadata.objects.get(
-                            database=database_obj,
-                            schema_name=fk_schema,
-                            table_name=fk_table
-                        )
+                with transaction.atomic():
+                    for fk_schema, fk_table, fk_column, pk_schema, pk_table, pk_column, constraint_name in rows:
+                        from_column = columns.get((fk_schema, fk_table, fk_column))
+                        to_column = columns.get((pk_schema, pk_table, pk_column))
                         
-                        pk_table_meta = TableMetadata.objects.get(
-                            database=database_obj,
-                            schema_name=pk_schema,
-                            table_name=pk_table
-                        )
-                        
-                        # Get the column metadata objects
-                        from_column = ColumnMetadata.objects.get(
-                            table=fk_table_meta,
-                            column_name=fk_column
-                        )
-                        
-                        to_column = ColumnMetadata.objects.get(
-                            table=pk_table_meta,
-                            column_name=pk_column
-                        )
+                        if from_column is None or to_column is None:
+                            # Skip if the tables or columns aren't in our metadata yet
+                            continue
                         
                         # Create or update relationship
                         relationship, created = RelationshipMetadata.objects.update_or_create(
@@ -575,11 +672,365 @@ class MetadataExtractor:
                                 'relationship_type': 'many-to-one'  # Assuming foreign keys create many-to-one relationships
                             }
                         )
-                    except (TableMetadata.DoesNotExist, ColumnMetadata.DoesNotExist):
-                        # Skip if the tables or columns aren't in our metadata yet
+            
+            conn.close()
+            return True
+        
+        except Exception as e:
+            # Cleanup connection and re-raise
+            if 'conn' in locals() and conn:
+                conn.close()
+            raise e
+    
+    def _get_table_lookup(self, database_obj, table_names):
+        """Map (schema_name, table_name) to TableMetadata for the given table names"""
+        return {
+            (table.schema_name, table.table_name): table
+            for table in TableMetadata.objects.filter(database=database_obj, table_name__in=table_names)
+        }
+    
+    def _get_column_lookup(self, database_obj, table_names):
+        """Map (schema_name, table_name, column_name) to ColumnMetadata for the given table names"""
+        columns = ColumnMetadata.objects.filter(
+            table__database=database_obj,
+            table__table_name__in=table_names
+        ).select_related('table')
+        return {
+            (column.table.schema_name, column.table.table_name, column.column_name): column
+            for column in columns
+        }
+    
+    def extract_indexes(self, database_obj):
+        """Extract index definitions (key columns, method, uniqueness, partial predicate)"""
+        try:
+            conn = self.connector.create_connection(database_obj)
+            # Indexes saved during this run are newer than this; older ones were dropped at the source
+            started_at = datetime.now(pytz.UTC)
+            
+            query = """
+            SELECT
+                n.nspname AS schema_name,
+                t.relname AS table_name,
+                i.relname AS index_name,
+                am.amname AS index_method,
+                ix.indisunique,
+                ix.indisprimary,
+                ARRAY(
+                    SELECT pg_get_indexdef(ix.indexrelid, k, true)
+                    FROM generate_series(1, ix.indnkeyatts) AS k
+                    ORDER BY k
+                ) AS columns,
+                pg_get_expr(ix.indpred, ix.indrelid) AS predicate,
+                pg_get_indexdef(ix.indexrelid) AS definition
+            FROM
+                pg_index ix
+            JOIN pg_class i ON i.oid = ix.indexrelid
+            JOIN pg_class t ON t.oid = ix.indrelid
+            JOIN pg_namespace n ON n.oid = t.relnamespace
+            JOIN pg_am am ON am.oid = i.relam
+            WHERE
+                n.nspname NOT IN ('pg_catalog', 'information_schema')
+                AND n.nspname NOT LIKE 'pg_toast%'
+            """
+            
+            for rows in self._stream_catalog(conn, 'extract_indexes', query):
+                tables = self._get_table_lookup(database_obj, {row[1] for row in rows})
+                
+                with transaction.atomic():
+                    for schema_name, table_name, index_name, index_method, is_unique, is_primary, columns, predicate, definition in rows:
+                        table = tables.get((schema_name, table_name))
+                        if table is None:
+                            continue
+                        
+                        IndexMetadata.objects.update_or_create(
+                            table=table,
+                            index_name=index_name,
+                            defaults={
+                                'columns': [col.strip('"') for col in columns],
+                                'index_method': index_method,
+                                'is_unique': is_unique,
+                                'is_primary': is_primary,
+                                'predicate': predicate,
+                                'definition': definition
+                            }
+                        )
+            
+            conn.close()
+            
+            # Drop indexes that no longer exist in the source database
+            IndexMetadata.objects.filter(table__database=database_obj, updated_at__lt=started_at).delete()
+            return True
+        
+        except Exception as e:
+            # Cleanup connection and re-raise
+            if 'conn' in locals() and conn:
+                conn.close()
+            raise e
+    
+    def extract_constraints(self, database_obj):
+        """Extract primary key, unique, foreign key, check and exclusion constraints"""
+        try:
+            conn = self.connector.create_connection(database_obj)
+            started_at = datetime.now(pytz.UTC)
+            
+            query = """
+            SELECT
+                n.nspname AS schema_name,
+                t.relname AS table_name,
+                c.conname AS constraint_name,
+                c.contype AS constraint_type,
+                ARRAY(
+                    SELECT a.attname::text
+                    FROM unnest(c.conkey) WITH ORDINALITY AS k(attnum, ord)
+                    JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+                    ORDER BY k.ord
+                ) AS columns,
+                rn.nspname AS referenced_schema,
+                rt.relname AS referenced_table,
+                ARRAY(
+                    SELECT a.attname::text
+                    FROM unnest(c.confkey) WITH ORDINALITY AS k(attnum, ord)
+                    JOIN pg_attribute a ON a.attrelid = c.confrelid AND a.attnum = k.attnum
+                    ORDER BY k.ord
+                ) AS referenced_columns,
+                pg_get_constraintdef(c.oid, true) AS definition
+            FROM
+                pg_constraint c
+            JOIN pg_class t ON t.oid = c.conrelid
+            JOIN pg_namespace n ON n.oid = t.relnamespace
+            LEFT JOIN pg_class rt ON rt.oid = c.confrelid
+            LEFT JOIN pg_namespace rn ON rn.oid = rt.relnamespace
+            WHERE
+                c.contype IN ('p', 'u', 'f', 'c', 'x')
+                AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+            """
+            
+            for rows in self._stream_catalog(conn, 'extract_constraints', query):
+                tables = self._get_table_lookup(
+                    database_obj,
+                    {row[1] for row in rows} | {row[6] for row in rows if row[6]}
+                )
+                
+                with transaction.atomic():
+                    for (schema_name, table_name, constraint_name, contype, columns,
+                         referenced_schema, referenced_table, referenced_columns, definition) in rows:
+                        table = tables.get((schema_name, table_name))
+                        if table is None:
+                            continue
+                        
+                        ConstraintMetadata.objects.update_or_create(
+                            table=table,
+                            constraint_name=constraint_name,
+                            defaults={
+                                'constraint_type': PG_CONSTRAINT_TYPES[contype],
+                                'columns': columns or [],
+                                'referenced_table': tables.get((referenced_schema, referenced_table)),
+                                'referenced_columns': referenced_columns or [],
+                                'definition': definition
+                            }
+                        )
+            
+            conn.close()
+            
+            ConstraintMetadata.objects.filter(table__database=database_obj, updated_at__lt=started_at).delete()
+            return True
+        
+        except Exception as e:
+            # Cleanup connection and re-raise
+            if 'conn' in locals() and conn:
+                conn.close()
+            raise e
+    
+    def extract_partitions(self, database_obj):
+        """Extract partitioning strategy and key for partitioned tables"""
+        try:
+            conn = self.connector.create_connection(database_obj)
+            started_at = datetime.now(pytz.UTC)
+            
+            query = """
+            SELECT
+                n.nspname AS schema_name,
+                c.relname AS table_name,
+                p.partstrat,
+                pg_get_partkeydef(c.oid) AS key_definition,
+                ARRAY(
+                    SELECT a.attname::text
+                    FROM unnest(p.partattrs::int2[]) WITH ORDINALITY AS k(attnum, ord)
+                    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+                    ORDER BY k.ord
+                ) AS key_columns,
+                (SELECT COUNT(*) FROM pg_inherits inh WHERE inh.inhparent = c.oid) AS partition_count
+            FROM
+                pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE
+                n.nspname NOT IN ('pg_catalog', 'information_schema')
+            """
+            
+            for rows in self._stream_catalog(conn, 'extract_partitions', query):
+                tables = self._get_table_lookup(database_obj, {row[1] for row in rows})
+                
+                with transaction.atomic():
+                    for schema_name, table_name, partstrat, key_definition, key_columns, partition_count in rows:
+                        table = tables.get((schema_name, table_name))
+                        if table is None:
+                            continue
+                        
+                        PartitionMetadata.objects.update_or_create(
+                            table=table,
+                            defaults={
+                                'strategy': PG_PARTITION_STRATEGIES.get(partstrat, partstrat),
+                                'key_columns': key_columns or [],
+                                'key_definition': key_definition,
+                                'partition_count': partition_count
+                            }
+                        )
+            
+            conn.close()
+            
+            PartitionMetadata.objects.filter(table__database=database_obj, updated_at__lt=started_at).delete()
+            return True
+        
+        except Exception as e:
+            # Cleanup connection and re-raise
+            if 'conn' in locals() and conn:
+                conn.close()
+            raise e
+    
+    def extract_categorical_values(self, database_obj):
+        """
+        Store the distinct values of low-cardinality text columns.
+        
+        Planner statistics are read from pg_stats: a column whose estimated
+        number of distinct values is at most CATEGORICAL_MAX_DISTINCT keeps its
+        most common values. Text columns of tables that were never analyzed,
+        or every text column when pg_stats cannot be read (it only shows
+        tables the role may select from, and some roles may not read it at
+        all), are judged from a bounded sample of their rows instead. A sample
+        only counts as categorical when it has at least CATEGORICAL_MIN_SAMPLE_ROWS
+        values that repeat, at most CATEGORICAL_MAX_DISTINCT_RATIO distinct
+        values per sampled row, so names, emails or tokens of small tables are
+        never stored and sent to the LLM. Values are
+        written with bulk updates so updated_at, which drives incremental
+        embedding refreshes, is left alone.
+        """
+        max_distinct = getattr(settings, 'CATEGORICAL_MAX_DISTINCT', 50)
+        sample_rows = getattr(settings, 'CATEGORICAL_SAMPLE_ROWS', 10000)
+        min_sample_rows = getattr(settings, 'CATEGORICAL_MIN_SAMPLE_ROWS', 100)
+        max_distinct_ratio = getattr(settings, 'CATEGORICAL_MAX_DISTINCT_RATIO', 0.2)
+        
+        def labels(values):
+            return [
+                value for value in values
+                if isinstance(value, str) and value.strip() and len(value) <= MAX_CATEGORICAL_VALUE_LENGTH
+            ]
+        
+        try:
+            conn = self.connector.create_connection(database_obj)
+            with_stats = set()
+            categorical = set()
+            
+            query = """
+            SELECT
+                s.schemaname,
+                s.tablename,
+                s.attname,
+                s.n_distinct,
+                c.reltuples,
+                s.most_common_vals::text::text[] AS most_common_vals
+            FROM
+                pg_stats s
+            JOIN pg_namespace n ON n.nspname = s.schemaname
+            JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = s.tablename
+            WHERE
+                s.schemaname NOT IN ('pg_catalog', 'information_schema')
+                AND NOT s.inherited
+            """
+            
+            try:
+                for rows in self._stream_catalog(conn, 'extract_categorical_values', query):
+                    columns = self._get_column_lookup(database_obj, {row[1] for row in rows})
+                    updated = []
+                    for schema_name, table_name, column_name, n_distinct, reltuples, most_common_vals in rows:
+                        column = columns.get((schema_name, table_name, column_name))
+                        if column is None or column.data_type not in CATEGORICAL_DATA_TYPES:
+                            continue
+                        with_stats.add(column.id)
+                        # Negative n_distinct is a fraction of the row count
+                        distinct = n_distinct if n_distinct >= 0 else -n_distinct * max(reltuples, 0)
+                        values = labels(most_common_vals or [])
+                        if values and distinct <= max_distinct:
+                            column.categorical_values = values
+                            categorical.add(column.id)
+                            updated.append(column)
+                    ColumnMetadata.objects.bulk_update(updated, ['categorical_values'])
+            except psycopg2.Error as e:
+                # Columns the statistics did not cover are sampled below
+                logger.warning(f"Could not read pg_stats for database {database_obj.id}, sampling values instead: {str(e)}")
+                conn.rollback()
+            
+            # Tables without statistics: a bounded sample decides
+            unanalyzed = ColumnMetadata.objects.filter(
+                table__database=database_obj, data_type__in=CATEGORICAL_DATA_TYPES
+            ).select_related('table').only(
+                'id', 'column_name', 'data_type', 'table__schema_name', 'table__table_name'
+            )
+            updated = []
+            with conn.cursor() as cursor:
+                for column in unanalyzed.iterator(chunk_size=self.chunk_size):
+                    if column.id in with_stats:
+                        continue
+                    column_name = quote_identifier(column.column_name)
+                    try:
+                        # Distinct values with the number of distinct values and of sampled rows
+                        # (window functions are computed before the LIMIT)
+                        cursor.execute(f"""
+                        SELECT value, COUNT(*) OVER (), SUM(occurrences) OVER ()
+                        FROM (
+                            SELECT {column_name} AS value, COUNT(*) AS occurrences
+                            FROM (
+                                SELECT {column_name}
+                                FROM {quote_identifier(column.table.schema_name)}.{quote_identifier(column.table.table_name)}
+                                WHERE {column_name} IS NOT NULL
+                                LIMIT %s
+                            ) AS sample
+                            GROUP BY {column_name}
+                        ) AS distinct_values
+                        LIMIT %s
+                        """, (sample_rows, max_distinct + 1))
+                        rows = cursor.fetchall()
+                    except Exception as e:
+                        logger.warning(f"Error sampling values of {column}: {str(e)}")
+                        conn.rollback()
                         continue
+                    if not rows:
+                        continue
+                    distinct, sampled = rows[0][1], rows[0][2]
+                    if sampled < min_sample_rows or distinct > sampled * max_distinct_ratio:
+                        # Too few rows to tell, or mostly unique values such as names or emails
+                        continue
+                    values = labels(row[0] for row in rows)
+                    if values and distinct <= max_distinct:
+                        column.categorical_values = values
+                        categorical.add(column.id)
+                        updated.append(column)
+                    if len(updated) >= self.chunk_size:
+                        ColumnMetadata.objects.bulk_update(updated, ['categorical_values'])
+                        updated = []
+            ColumnMetadata.objects.bulk_update(updated, ['categorical_values'])
             
             conn.close()
+            
+            # Columns that are no longer categorical (or no longer text) lose their values
+            stale = [
+                column_id for column_id in ColumnMetadata.objects.filter(
+                    table__database=database_obj, categorical_values__isnull=False
+                ).values_list('id', flat=True)
+                if column_id not in categorical
+            ]
+            for start in range(0, len(stale), self.chunk_size):
+                ColumnMetadata.objects.filter(id__in=stale[start:start + self.chunk_size]).update(categorical_values=None)
             return True
         
         except Exception as e:
@@ -592,8 +1043,8 @@ class MetadataExtractor:
         """Generate natural language description of table (placeholder)"""
         return f"Table {table_metadata.schema_name}.{table_metadata.table_name} containing data related to {table_metadata.table_name.lower().replace('_', ' ')}."
     
-    def generate_column_description(self, column_metadata):
-        """Generate natural language description of column (placeholder)"""
+    def generate_column_description(self, column_metadata, conn=None, with_samples=True):
+        """Generate natural language description of column (placeholder), optionally over a caller-owned connection"""
         column_type = f"of type {column_metadata.data_type}"
         nullability = "nullable" if column_metadata.is_nullable else "not nullable"
         key_info = ""
@@ -605,19 +1056,21 @@ class MetadataExtractor:
             
         # Get sample values for the column
         sample_values = []
-        try:
-            connector = DatabaseConnector()
-            table = column_metadata.table
-            database = table.database
-            sample_values = connector.get_column_sample_values(
-                database,
-                table.schema_name,
-                table.table_name,
-                column_metadata.column_name,
-                limit=10
-            )
-        except Exception as e:
-            print(f"Error getting sample values for default description: {str(e)}")
+        if with_samples:
+            try:
+                connector = DatabaseConnector()
+                table = column_metadata.table
+                database = table.database
+                sample_values = connector.get_column_sample_values(
+                    database,
+                    table.schema_name,
+                    table.table_name,
+                    column_metadata.column_name,
+                    limit=10,
+                    conn=conn
+                )
+            except Exception as e:
+                print(f"Error getting sample values for default description: {str(e)}")
         
         # Include sample values in description if available
         sample_text = ""
@@ -635,181 +1088,195 @@ class MetadataExtractor:
 class MetadataVectorizer:
     """Creates vector embeddings for metadata for RAG"""
     
-    def __init__(self):
+    def __init__(self, backend=None):
         self.extractor = MetadataExtractor()
-        self.cache = {}  # Simple in-memory cache for embeddings
+        self.backend = backend or get_embedding_backend()
+        self.cache = get_metadata_cache()  # Shared by every vectorizer in the process
+    
+    def table_embedding_text(self, table_metadata):
+        """Text that represents a table in embedding space"""
+        return f"{table_metadata.schema_name}.{table_metadata.table_name}: {table_metadata.description or ''}"
+    
+    def column_embedding_text(self, column_metadata, table_metadata=None):
+        """Text that represents a column in embedding space"""
+        table = table_metadata or column_metadata.table
+        return (
+            f"{table.table_name}.{column_metadata.column_name} ({column_metadata.data_type}): "
+            f"{column_metadata.description or ''}"
+        )
     
     def create_table_embedding(self, table_metadata):
-        """Generate embedding vector for table (placeholder)"""
-        # In a real implementation, this would use an embedding model
-        # For now, just create a placeholder JSON structure
-        
-        # Check if we have a cached embedding
-        cache_key = f"table_{table_metadata.id}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-        
+        """Generate and store the embedding vector for a table"""
         # Generate a description if none exists
-        description = table_metadata.description
-        if not description:
-            description = self.extractor.generate_table_description(table_metadata)
-            table_metadata.description = description
+        if not table_metadata.description:
+            table_metadata.description = self.extractor.generate_table_description(table_metadata)
             table_metadata.save(update_fields=['description'])
         
-        # Create a simple embedding structure
-        # This would be replaced with actual vector embeddings in production
-        embedding = {
-            "type": "table",
-            "name": table_metadata.table_name,
-            "schema": table_metadata.schema_name,
-            "description": description,
-            "vector_placeholder": [0.1, 0.2, 0.3]  # Placeholder for actual embedding vector
-        }
+        text = self.table_embedding_text(table_metadata)
+        digest = text_hash(text)
+        
+        # The same text was embedded and stored already
+        cache_key = ('embedding', 'table', table_metadata.id, self.backend.model_id, digest)
+        embedding = self.cache.get(table_metadata.database_id, cache_key)
+        if embedding is not None:
+            return embedding
+        
+        embedding = self.backend.embed_one(text)
         
-        # Save the embedding to the database
-        table_metadata.embedding_vector = embedding
-        table_metadata.save(update_fields=['embedding_vector'])
+        # Save the embedding to the database as packed float32
+        table_metadata.embedding = pack_vector(embedding)
+        table_metadata.embedding_model = self.backend.model_id
+        table_metadata.embedding_hash = digest
+        table_metadata.save(update_fields=['embedding', 'embedding_model', 'embedding_hash', 'updated_at'])
         
         # Cache the result
-        self.cache[cache_key] = embedding
+        self.cache.set(table_metadata.database_id, cache_key, embedding)
         
         return embedding
     
     def create_column_embedding(self, column_metadata):
-        """Generate embedding vector for column (placeholder)"""
-        # In a real implementation, this would use an embedding model
-        
-        # Check if we have a cached embedding
-        cache_key = f"column_{column_metadata.id}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-        
+        """Generate and store the embedding vector for a column"""
         # Generate a description if none exists
-        description = column_metadata.description
-        if not description:
-            description = self.extractor.generate_column_description(column_metadata)
-            column_metadata.description = description
+        if not column_metadata.description:
+            column_metadata.description = self.extractor.generate_column_description(column_metadata)
             column_metadata.save(update_fields=['description'])
         
-        # Include table information
-        table = column_metadata.table
-        
-        # Create a simple embedding structure
-        # This would be replaced with actual vector embeddings in production
-        embedding = {
-            "type": "column",
-            "name": column_metadata.column_name,
-            "table": table.table_name,
-            "schema": table.schema_name,
-            "data_type": column_metadata.data_type,
-            "is_primary_key": column_metadata.is_primary_key,
-            "is_foreign_key": column_metadata.is_foreign_key,
-            "description": description,
-            "vector_placeholder": [0.4, 0.5, 0.6]  # Placeholder for actual embedding vector
-        }
+        text = self.column_embedding_text(column_metadata)
+        digest = text_hash(text)
+        
+        # The same text was embedded and stored already
+        cache_key = ('embedding', 'column', column_metadata.id, self.backend.model_id, digest)
+        embedding = self.cache.get(column_metadata.table.database_id, cache_key)
+        if embedding is not None:
+            return embedding
         
-        # Save the embedding to the database
-        column_metadata.embedding_vector = embedding
-        column_metadata.save(update_fields=['embedding_vector'])
+        embedding = self.backend.embed_one(text)
+        
+        # Save the embedding to the database as packed float32
+        column_metadata.embedding = pack_vector(embedding)
+        column_metadata.embedding_model = self.backend.model_id
+        column_metadata.embedding_hash = digest
+        column_metadata.save(update_fields=['embedding', 'embedding_model', 'embedding_hash', 'updated_at'])
         
         # Cache the result
-        self.cache[cache_key] = embedding
+        self.cache.set(column_metadata.table.database_id, cache_key, embedding)
         
         return embedding
     
+    def embed_metadata(self, tables, columns):
+        """
+        Embed tables and columns whose embedding text changed, in batches.
+
+        Items are skipped when their stored embedding came from the current
+        backend and the SHA-256 of their text is unchanged. Embeddings are
+        written with one bulk_update per model; updated_at is left alone so the
+        change does not look like a metadata edit.
+
+        Args:
+            tables (list): TableMetadata objects
+            columns (list): ColumnMetadata objects with table loaded
+
+        Returns:
+            int: Number of items embedded
+        """
+        batch_size = getattr(settings, 'EMBEDDING_BATCH_SIZE', 256)
+        embedded = 0
+
+        for model, items, text_for in (
+            (TableMetadata, tables, self.table_embedding_text),
+            (ColumnMetadata, columns, self.column_embedding_text),
+        ):
+            stale = []
+            texts = []
+            for item in items:
+                text = text_for(item)
+                digest = text_hash(text)
+                if item.embedding and item.embedding_model == self.backend.model_id and item.embedding_hash == digest:
+                    continue
+                item.embedding_hash = digest
+                stale.append(item)
+                texts.append(text)
+
+            for start in range(0, len(stale), batch_size):
+                vectors = self.backend.embed(texts[start:start + batch_size])
+                for item, vector in zip(stale[start:start + batch_size], vectors):
+                    item.embedding = pack_vector(vector)
+                    item.embedding_model = self.backend.model_id
+
+            if stale:
+                model.objects.bulk_update(
+                    stale, ['embedding', 'embedding_model', 'embedding_hash'], batch_size=batch_size
+                )
+            embedded += len(stale)
+
+        return embedded
+
+    def fill_missing_descriptions(self, database_obj, tables, columns):
+        """
+        Generate placeholder descriptions where none exist.
+
+        Column descriptions sample values over one connection to the client
+        database, opened only if some column needs it.
+        """
+        now = datetime.now(pytz.UTC)
+        missing_tables = [table for table in tables if not table.description]
+        for table in missing_tables:
+            table.description = self.extractor.generate_table_description(table)
+            table.updated_at = now
+        if missing_tables:
+            TableMetadata.objects.bulk_update(missing_tables, ['description', 'updated_at'])
+
+        missing_columns = [column for column in columns if not column.description]
+        if missing_columns:
+            conn = None
+            try:
+                conn = self.extractor.connector.create_connection(database_obj)
+            except Exception as e:
+                logger.warning(f"Describing columns without sample values: {str(e)}")
+            try:
+                for column in missing_columns:
+                    column.description = self.extractor.generate_column_description(
+                        column, conn=conn, with_samples=conn is not None
+                    )
+                    column.updated_at = now
+            finally:
+                if conn is not None:
+                    conn.close()
+            ColumnMetadata.objects.bulk_update(missing_columns, ['description', 'updated_at'])
+
     def update_all_embeddings(self, database_obj):
-        """Update all embeddings for a database"""
+        """Update all embeddings for a database, re-embedding only items whose text changed"""
         try:
-            # Clear cache for this database
-            self.clear_cache_for_database(database_obj)
-            
-            # Get all tables
-            tables = TableMetadata.objects.filter(database=database_obj)
-            for table in tables:
-                # Create table embedding
-                self.create_table_embedding(table)
-                
-                # Create column embeddings for all columns in this table
-                columns = ColumnMetadata.objects.filter(table=table)
-                for column in columns:
-                    self.create_column_embedding(column)
+            tables = list(TableMetadata.objects.filter(database=database_obj))
+            columns = list(ColumnMetadata.objects.filter(table__database=database_obj).select_related('table__database'))
             
-            return True, "Embeddings updated successfully"
+            self.fill_missing_descriptions(database_obj, tables, columns)
+            embedded = self.embed_metadata(tables, columns)
+            
+            if embedded:
+                database_obj.bump_metadata_version()
+            return True, f"Embeddings updated successfully ({embedded} of {len(tables) + len(columns)} re-embedded)"
         except Exception as e:
             return False, str(e)
     
     def clear_cache_for_database(self, database_obj):
-        """Clear the embedding cache for a specific database"""
-        # Get all tables for this database
-        table_ids = TableMetadata.objects.filter(database=database_obj).values_list('id', flat=True)
-        
-        # Get all columns for these tables
-        column_ids = ColumnMetadata.objects.filter(table__in=table_ids).values_list('id', flat=True)
-        
-        # Clear cache entries
-        keys_to_remove = []
-        for key in self.cache.keys():
-            if key.startswith('table_') and int(key[6:]) in table_ids:
-                keys_to_remove.append(key)
-            elif key.startswith('column_') and int(key[7:]) in column_ids:
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del self.cache[key]
+        """Clear cached embeddings, indexes and search results for a specific database"""
+        self.cache.invalidate(database_obj.id)
+    
+    def embed_query(self, query_text):
+        """Embed search text, reusing the embedding of text seen before"""
+        key = ('query_embedding', self.backend.model_id, query_text)
+        return self.cache.get_or_build(None, key, lambda: self.backend.embed_one(query_text))
     
     def search_metadata(self, database_obj, query_text, limit=10):
-        """Search metadata based on text similarity (placeholder)"""
-        # In a real implementation, this would use vector similarity search
-        # For this skeleton, we'll just do a simple text match
-        
-        results = []
-        
-        # Search in tables
-        tables = TableMetadata.objects.filter(database=database_obj)
-        for table in tables:
-            score = 0
-            if query_text.lower() in table.table_name.lower():
-                score += 5
-            if table.description and query_text.lower() in table.description.lower():
-                score += 3
-            
-            if score > 0:
-                results.append({
-                    'type': 'table',
-                    'id': table.id,
-                    'name': table.table_name,
-                    'schema': table.schema_name,
-                    'description': table.description,
-                    'score': score
-                })
-        
-        # Search in columns
-        columns = ColumnMetadata.objects.filter(table__database=database_obj)
-        for column in columns:
-            score = 0
-            if query_text.lower() in column.column_name.lower():
-                score += 4
-            if column.description and query_text.lower() in column.description.lower():
-                score += 2
-            # Give some score to data type matches
-            if query_text.lower() in column.data_type.lower():
-                score += 1
-            
-            if score > 0:
-                results.append({
-                    'type': 'column',
-                    'id': column.id,
-                    'name': column.column_name,
-                    'table_name': column.table.table_name,
-                    'schema': column.table.schema_name,
-                    'data_type': column.data_type,
-                    'description': column.description,
-                    'score': score
-                })
-        
-        # Sort by score (descending) and limit results
-        results.sort(key=lambda x: x['score'], reverse=True)
-        return results[:limit]
+        """Search table and column metadata by embedding similarity, caching results per metadata version"""
+        key = ('semantic_search', self.backend.model_id, database_obj.metadata_version, query_text, limit)
+        results = self.cache.get(database_obj.id, key)
+        if results is None:
+            index = get_vector_index(database_obj, self)
+            results = index.search(self.embed_query(query_text), k=limit)
+            self.cache.set(database_obj.id, key, results)
+        return [dict(result) for result in results]
 
 def generate_er_diagram(database_id):
     """
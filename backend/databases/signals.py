@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent by ClientDatabase.bump_metadata_version once the new version is saved, with the database as
+# `database`. Apps that derive data from the metadata connect here to precompute it for the new
+# version; receivers are called robustly, so a failing one is logged and never fails the change.
+metadata_version_bumped = Signal()
@@ -1,3 +1,755 @@
-from django.test import TestCase
+import gc
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+import psycopg2
+import pytz
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from session.models import Session
+from .cache import MetadataCache
+from .join_graph import JoinGraph
+from .keyword_index import KeywordIndex, get_keyword_index, search_keywords, table_terms
+from .models import ClientDatabase, TableMetadata, ColumnMetadata, RelationshipMetadata
+from .scheduler import MetadataRefreshScheduler
+from .services import MetadataExtractor
+from .signals import metadata_version_bumped
+from .text_utils import expand_synonyms, tokenize, trigrams
+from .trigram_index import TrigramIndex, name_variants
+from .vector_index import VectorIndex, get_vector_index, load_vector_store
 
-# Create your tests here.
+
+class SyntheticCatalog:
+    """Generates a large catalog lazily, one row at a time"""
+
+    def __init__(self, table_count):
+        self.table_count = table_count
+        self.fetch_sizes = set()
+
+    def table_rows(self):
+        for i in range(self.table_count):
+            yield ('public', f'table_{i}', 'BASE TABLE', f'Synthetic table {i}')
+
+    def relationship_rows(self):
+        for i in range(1, self.table_count):
+            yield ('public', f'table_{i}', 'parent_id', 'public', f'table_{i - 1}', 'id', f'table_{i}_parent_fk')
+
+
+class SyntheticCursor:
+    """psycopg2-like cursor that serves the synthetic catalog and refuses fetchall()"""
+
+    def __init__(self, catalog, name=None):
+        self.catalog = catalog
+        self.name = name
+        self.itersize = None
+        self.rows = iter(())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, query, params=None):
+        if 'information_schema.tables' in query:
+            self.rows = self.catalog.table_rows()
+        elif 'pk_table' in query:
+            self.rows = self.catalog.relationship_rows()
+        elif 'COUNT(*) FROM "' in query:
+            self.rows = iter([(42,)])
+        else:
+            self.rows = iter(())
+
+    def fetchmany(self, size):
+        self.catalog.fetch_sizes.add(size)
+        return list(islice(self.rows, size))
+
+    def fetchone(self):
+        return next(self.rows, None)
+
+    def fetchall(self):
+        raise AssertionError("Catalog queries must be streamed, not fetched all at once")
+
+
+class RestrictedStatsCursor(SyntheticCursor):
+    """Cursor of a role that may not read pg_stats, sampling the text columns of SAMPLES"""
+
+    SAMPLES = {
+        'tier': ['Gold'] * 300 + ['Silver'] * 200,
+        'odd"tier': ['Gold'] * 300 + ['Silver'] * 200,
+        'email': [f'user{i}@example.com' for i in range(500)],
+        'status': ['new', 'shipped'] * 20,
+    }
+
+    def execute(self, query, params=None):
+        if 'pg_stats' in query:
+            raise psycopg2.errors.InsufficientPrivilege("permission denied for view pg_stats")
+        sampled_column = re.search(r'GROUP BY "((?:[^"]|"")*)"', query)
+        if sampled_column:
+            values = self.SAMPLES[sampled_column[1].replace('""', '"')][:params[0]]
+            counts = Counter(values)
+            self.rows = iter([(value, len(counts), len(values)) for value in counts][:params[1]])
+            return
+        super().execute(query, params)
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+class SyntheticConnection:
+    def __init__(self, catalog, cursor_class=SyntheticCursor):
+        self.catalog = catalog
+        self.cursor_class = cursor_class
+
+    def cursor(self, name=None):
+        return self.cursor_class(self.catalog, name=name)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryBoundedExtractionTests(TransactionTestCase):
+    chunk_size = 100
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='password')
+
+    def _create_database(self, name):
+        return ClientDatabase.objects.create(
+            name=name, owner=self.owner, host='localhost',
+            database_name=name, username='user', password='password'
+        )
+
+    def _extractor(self, catalog, cursor_class=SyntheticCursor):
+        extractor = MetadataExtractor(chunk_size=self.chunk_size)
+        extractor.change_log_limit = self.chunk_size
+        extractor.connector = mock.Mock()
+        extractor.connector.create_connection.return_value = SyntheticConnection(catalog, cursor_class)
+        return extractor
+
+    def _peak_extraction_memory(self, table_count):
+        database = self._create_database(f'catalog_{table_count}')
+        catalog = SyntheticCatalog(table_count)
+        extractor = self._extractor(catalog)
+
+        tracemalloc.start()
+        try:
+            processed = extractor.extract_tables(database)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(processed, table_count)
+        self.assertEqual(TableMetadata.objects.filter(database=database).count(), table_count)
+        self.assertEqual(catalog.fetch_sizes, {self.chunk_size})
+        return peak
+
+    def test_peak_memory_is_bounded_by_chunk_size_not_catalog_size(self):
+        # Warm up query compilation and other one-off caches
+        self._peak_extraction_memory(self.chunk_size)
+
+        small_peak = self._peak_extraction_memory(500)
+        large_peak = self._peak_extraction_memory(5000)
+
+        # Retaining even one small object per table would add well over 200 bytes
+        # per extra table; streaming keeps the difference to allocator noise
+        self.assertLess(large_peak - small_peak, (5000 - 500) * 200)
+
+    def test_relationships_are_streamed_in_chunks(self):
+        database = self._create_database('relationships')
+        catalog = SyntheticCatalog(1000)
+        extractor = self._extractor(catalog)
+        extractor.extract_tables(database)
+
+        columns = []
+        for table in TableMetadata.objects.filter(database=database):
+            columns.append(ColumnMetadata(table=table, column_name='id', data_type='integer', is_primary_key=True))
+            columns.append(ColumnMetadata(table=table, column_name='parent_id', data_type='integer', is_foreign_key=True))
+        ColumnMetadata.objects.bulk_create(columns)
+
+        extractor.extract_relationships(database)
+
+        self.assertEqual(
+            RelationshipMetadata.objects.filter(from_column__table__database=database).count(),
+            catalog.table_count - 1
+        )
+        self.assertEqual(catalog.fetch_sizes, {self.chunk_size})
+
+    def test_tables_missing_from_catalog_are_removed(self):
+        database = self._create_database('removed')
+        self._extractor(SyntheticCatalog(300)).extract_tables(database)
+
+        extractor = self._extractor(SyntheticCatalog(250))
+        # Columns, relationships and indexes are not part of this synthetic catalog
+        with mock.patch.object(MetadataExtractor, 'extract_columns', return_value=[]):
+            success, message, changes = extractor.extract_full_metadata(database)
+
+        self.assertTrue(success, message)
+        self.assertEqual(changes['totals']['tables']['removed'], 50)
+        self.assertEqual(len(changes['tables']['added']), 0)
+        self.assertEqual(TableMetadata.objects.filter(database=database).count(), 250)
+
+
+    def test_value_hint_failures_do_not_fail_the_extraction(self):
+        database = self._create_database('hints')
+        version = database.metadata_version
+        extractor = self._extractor(SyntheticCatalog(10))
+        with mock.patch.object(MetadataExtractor, 'extract_columns', return_value=[]), \
+                mock.patch.object(MetadataExtractor, 'extract_categorical_values', side_effect=RuntimeError("boom")):
+            success, message, _ = extractor.extract_full_metadata(database)
+
+        self.assertTrue(success, message)
+        database.refresh_from_db()
+        self.assertEqual(database.metadata_version, version + 1)
+
+    def test_precomputation_failures_do_not_fail_the_extraction(self):
+        database = self._create_database('precompute')
+        version = database.metadata_version
+        extractor = self._extractor(SyntheticCatalog(10))
+
+        def failing_receiver(sender, database, **kwargs):
+            raise RuntimeError("prompt store unavailable")
+
+        metadata_version_bumped.connect(failing_receiver)
+        try:
+            with mock.patch.object(MetadataExtractor, 'extract_columns', return_value=[]), \
+                    mock.patch('databases.services.get_join_graph', side_effect=RuntimeError("boom")):
+                success, message, _ = extractor.extract_full_metadata(database)
+        finally:
+            metadata_version_bumped.disconnect(failing_receiver)
+
+        self.assertTrue(success, message)
+        database.refresh_from_db()
+        self.assertEqual(database.metadata_version, version + 1)
+
+    def test_unreadable_pg_stats_falls_back_to_sampling(self):
+        database = self._create_database('restricted')
+        extractor = self._extractor(SyntheticCatalog(1), RestrictedStatsCursor)
+        extractor.extract_tables(database)
+        table = TableMetadata.objects.get(database=database)
+        for column_name in RestrictedStatsCursor.SAMPLES:
+            ColumnMetadata.objects.create(table=table, column_name=column_name, data_type='character varying')
+
+        self.assertTrue(extractor.extract_categorical_values(database))
+        values = dict(ColumnMetadata.objects.filter(table=table).values_list('column_name', 'categorical_values'))
+        self.assertEqual(values['tier'], ['Gold', 'Silver'])
+        self.assertEqual(values['odd"tier'], ['Gold', 'Silver'])
+        # Unique values and too small samples are never stored
+        self.assertIsNone(values['email'])
+        self.assertIsNone(values['status'])
+
+
+class MetadataCacheTests(SimpleTestCase):
+    def test_least_recently_used_entries_are_evicted_to_stay_within_budget(self):
+        cache = MetadataCache(max_bytes=300)
+        for name in 'abc':
+            cache.set(1, (name,), name, size=100)
+        cache.get(1, ('a',))
+        cache.set(1, ('d',), 'd', size=100)
+
+        self.assertIsNone(cache.get(1, ('b',)))
+        self.assertEqual([cache.get(1, (name,)) for name in 'acd'], ['a', 'c', 'd'])
+        self.assertEqual(cache.stats()['used_bytes'], 300)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_sizes_are_replaced_not_added_and_oversized_values_are_not_kept(self):
+        cache = MetadataCache(max_bytes=1000)
+        cache.set(1, ('a',), 'a', size=100)
+        cache.set(1, ('a',), 'a2', size=200)
+        self.assertEqual(cache.stats()['used_bytes'], 200)
+
+        cache.set(1, ('a',), 'huge', size=2000)
+        self.assertIsNone(cache.get(1, ('a',)))
+        self.assertEqual(cache.stats()['used_bytes'], 0)
+        # Arrays are charged their buffer size
+        cache.set(1, ('array',), np.zeros(100, dtype=np.float32))
+        self.assertEqual(cache.stats()['used_bytes'], 400)
+
+    def test_invalidate_drops_one_database(self):
+        cache = MetadataCache()
+        cache.set(1, ('index', 3), 'one')
+        cache.set(2, ('index', 3), 'two')
+        cache.invalidate(1)
+
+        self.assertIsNone(cache.get(1, ('index', 3)))
+        self.assertEqual(cache.get(2, ('index', 3)), 'two')
+        cache.set(1, ('index', 3), 'rebuilt')
+        self.assertEqual(cache.get(1, ('index', 3)), 'rebuilt')
+
+    def test_concurrent_misses_build_once(self):
+        cache = MetadataCache()
+        builds = []
+        started = threading.Event()
+
+        def build():
+            builds.append(1)
+            started.set()
+            time.sleep(0.05)
+            return 'built'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_build(1, ('key',), build))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(builds, [1])
+        self.assertEqual(results, ['built'] * 4)
+
+
+@override_settings(EMBEDDING_STORE_DIR='')
+class VectorIndexCacheTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='password')
+        self.database = ClientDatabase.objects.create(
+            name='vectors', owner=owner, host='localhost', database_name='vectors', username='user', password='password'
+        )
+        for name in ('customers', 'orders', 'products'):
+            table = TableMetadata.objects.create(database=self.database, table_name=name, table_type='BASE TABLE')
+            ColumnMetadata.objects.create(table=table, column_name='id', data_type='integer', is_primary_key=True)
+        self.cache = MetadataCache()
+        patcher = mock.patch('databases.vector_index.get_metadata_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_evicted_index_is_not_pinned_by_the_latest_entry(self):
+        from .services import MetadataVectorizer
+
+        vectorizer = MetadataVectorizer()
+        index = get_vector_index(self.database, vectorizer)
+        self.assertEqual(len(index), 6)
+        self.assertGreaterEqual(self.cache.stats()['used_bytes'], index.memory_usage())
+
+        latest = self.cache.get(self.database.id, ('vector_index', vectorizer.backend.model_id, 'latest'))
+        self.assertIs(latest(), index)
+
+        # Charge the whole budget to another entry so the index is evicted
+        self.cache.set(self.database.id, ('filler',), 'filler', size=self.cache.max_bytes)
+        self.assertEqual(self.cache.stats()['used_bytes'], self.cache.max_bytes)
+        del index
+        gc.collect()
+        self.assertIsNone(latest())
+
+
+
+class VectorStoreTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='password')
+        self.database = ClientDatabase.objects.create(
+            name='vectors', owner=owner, host='localhost', database_name='vectors', username='user', password='password'
+        )
+        for name in ('customers', 'orders'):
+            table = TableMetadata.objects.create(database=self.database, table_name=name, table_type='BASE TABLE')
+            ColumnMetadata.objects.create(table=table, column_name='id', data_type='integer', is_primary_key=True)
+        store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(store_dir.cleanup)
+        self.root = Path(store_dir.name)
+        settings_override = override_settings(EMBEDDING_STORE_DIR=store_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.cache = MetadataCache()
+        patcher = mock.patch('databases.vector_index.get_metadata_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _snapshots(self):
+        return sorted(path.name.split('-')[0] for path in (self.root / f'db{self.database.id}').iterdir())
+
+    def test_published_snapshot_is_loaded_memory_mapped_by_a_fresh_index(self):
+        from .services import MetadataVectorizer
+
+        vectorizer = MetadataVectorizer()
+        published = get_vector_index(self.database, vectorizer)
+        self.assertEqual(self._snapshots(), [f'v{self.database.metadata_version}'])
+        self.assertIsInstance(published._state[0], np.memmap)
+
+        backend = vectorizer.backend
+        index = VectorIndex(backend.dimensions, backend.model_id)
+        self.assertTrue(load_vector_store(index, self.database.id, self.database.metadata_version))
+        self.assertIsInstance(index._state[0], np.memmap)
+        self.assertEqual(index._state[1], published._state[1])
+        self.assertEqual(index._state[2], published._state[2])
+        self.assertEqual(index.version, self.database.metadata_version)
+        self.assertEqual(index.watermark, published.watermark)
+        query = np.asarray(published._state[0][0])
+        self.assertEqual(index.search(query, k=1), published.search(query, k=1))
+
+        # No snapshot for another version or another model
+        self.assertFalse(load_vector_store(index, self.database.id, self.database.metadata_version + 1))
+        other_model = VectorIndex(backend.dimensions, 'other/model')
+        self.assertFalse(load_vector_store(other_model, self.database.id, self.database.metadata_version))
+
+    def test_new_version_is_refreshed_and_replaces_the_old_snapshot(self):
+        from . import vector_index
+        from .services import MetadataVectorizer
+
+        get_vector_index(self.database, MetadataVectorizer())
+        old_version = self.database.metadata_version
+        table = TableMetadata.objects.create(database=self.database, table_name='products', table_type='BASE TABLE')
+        ColumnMetadata.objects.create(table=table, column_name='id', data_type='integer', is_primary_key=True)
+        self.database.bump_metadata_version()
+
+        # A fresh worker finds no snapshot for the new version and refreshes
+        self.cache.invalidate(self.database.id)
+        with mock.patch.object(vector_index, 'refresh_vector_index', wraps=vector_index.refresh_vector_index) as refresh:
+            index = get_vector_index(self.database, MetadataVectorizer())
+
+        refresh.assert_called_once()
+        self.assertEqual(len(index), 6)
+        self.assertEqual(index.version, self.database.metadata_version)
+        self.assertEqual(self._snapshots(), [f'v{self.database.metadata_version}'])
+        self.assertGreater(self.database.metadata_version, old_version)
+
+    def test_deleting_the_database_removes_its_snapshots(self):
+        from .services import MetadataVectorizer
+
+        get_vector_index(self.database, MetadataVectorizer())
+        self.assertTrue((self.root / f'db{self.database.id}').exists())
+
+        client = APIClient()
+        client.force_authenticate(self.database.owner)
+        response = client.delete(f'/api/databases/databases/{self.database.id}/')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse((self.root / f'db{self.database.id}').exists())
+        self.assertIsNone(self.cache.get(self.database.id, ('vector_index', MetadataVectorizer().backend.model_id, 'latest')))
+
+
+@override_settings(EMBEDDING_STORE_DIR='', EMBEDDING_BATCH_SIZE=2)
+class EmbeddingUpdateTests(TestCase):
+    def setUp(self):
+        from .services import MetadataVectorizer
+
+        owner = User.objects.create_user(username='owner', password='password')
+        self.database = ClientDatabase.objects.create(
+            name='embeddings', owner=owner, host='localhost', database_name='embeddings', username='user', password='password'
+        )
+        for name in ('customers', 'orders'):
+            table = TableMetadata.objects.create(database=self.database, table_name=name, table_type='BASE TABLE')
+            for column in ('id', 'name'):
+                ColumnMetadata.objects.create(table=table, column_name=column, data_type='text')
+        self.vectorizer = MetadataVectorizer()
+        # No client database is reachable, so columns are described without sample values
+        patcher = mock.patch.object(
+            self.vectorizer.extractor.connector, 'create_connection', side_effect=psycopg2.OperationalError('unreachable')
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unchanged_text_is_not_embedded_again(self):
+        backend = self.vectorizer.backend
+        with mock.patch.object(backend, 'embed', wraps=backend.embed) as embed, \
+                self.assertLogs('databases.services', 'WARNING') as logs:
+            success, message = self.vectorizer.update_all_embeddings(self.database)
+
+        self.assertTrue(success, message)
+        self.assertIn('6 of 6 re-embedded', message)
+        self.assertIn('Describing columns without sample values: unreachable', logs.output[0])
+        # Batches of EMBEDDING_BATCH_SIZE, tables and columns separately
+        self.assertEqual([len(args[0]) for args, _ in embed.call_args_list], [2, 2, 2])
+        stored = ColumnMetadata.objects.filter(table__database=self.database)
+        self.assertTrue(all(column.embedding and column.embedding_hash for column in stored))
+        version = ClientDatabase.objects.get(id=self.database.id).metadata_version
+
+        with mock.patch.object(backend, 'embed', wraps=backend.embed) as embed:
+            success, message = self.vectorizer.update_all_embeddings(self.database)
+
+        self.assertTrue(success, message)
+        self.assertIn('0 of 6 re-embedded', message)
+        embed.assert_not_called()
+        self.assertEqual(ClientDatabase.objects.get(id=self.database.id).metadata_version, version)
+
+    def test_only_items_whose_text_changed_are_embedded(self):
+        self.vectorizer.update_all_embeddings(self.database)
+        column = ColumnMetadata.objects.get(table__table_name='orders', column_name='name')
+        column.description = 'Name the order was placed under'
+        column.save()
+
+        backend = self.vectorizer.backend
+        with mock.patch.object(backend, 'embed', wraps=backend.embed) as embed:
+            success, message = self.vectorizer.update_all_embeddings(self.database)
+
+        self.assertTrue(success, message)
+        self.assertIn('1 of 6 re-embedded', message)
+        embed.assert_called_once_with(['orders.name (text): Name the order was placed under'])
+
+
+class KeywordIndexTests(SimpleTestCase):
+    def _index(self, documents):
+        index = KeywordIndex()
+        index.build(({'id': position}, terms) for position, terms in enumerate(documents))
+        return index
+
+    def test_identifiers_and_text_are_split_into_lowercase_words(self):
+        self.assertEqual(tokenize('customerOrders.ship_date2'), ['customer', 'orders', 'ship', 'date', '2'])
+        self.assertEqual(tokenize('HTTPServer logs'), ['http', 'server', 'logs'])
+        self.assertEqual(tokenize('Order-ID, (net)'), ['order', 'id', 'net'])
+        self.assertEqual(tokenize(None), [])
+
+    def test_rare_terms_outrank_common_ones(self):
+        index = self._index([['customers', 'name'], ['customers', 'email'], ['customers', 'phone'], ['orders', 'date']])
+        results = index.search('customers orders')
+
+        self.assertEqual(results[0]['id'], 3)
+        self.assertEqual({result['id'] for result in results[1:]}, {0, 1, 2})
+        self.assertEqual(len({round(result['score'], 6) for result in results[1:]}), 1)
+        self.assertGreater(results[0]['score'], results[1]['score'])
+        self.assertEqual(index.search('invoices'), [])
+        self.assertEqual(len(index.search('customers', k=2)), 2)
+
+    def test_name_matches_outrank_description_matches(self):
+        named = SimpleNamespace(table_name='shipments', description='Parcels sent to customers')
+        described = SimpleNamespace(table_name='orders', description='Orders, each with a list of shipments')
+        index = KeywordIndex()
+        index.build([({'name': 'shipments'}, table_terms(named)), ({'name': 'orders'}, table_terms(described))])
+
+        self.assertEqual([result['name'] for result in index.search('shipments')], ['shipments', 'orders'])
+
+    def test_sparse_and_dense_scoring_agree(self):
+        documents = [['customers', 'name'], ['orders', 'date'], ['orders', 'customers', 'total']]
+        small = self._index(documents)
+        # Filler documents make the matched postings sparse relative to the index
+        large = self._index(documents + [[f'filler{n}', 'other'] for n in range(200)])
+
+        for query in ('customers', 'orders total', 'customers orders'):
+            with self.subTest(query=query):
+                dense = {result['id']: result['score'] for result in small.search(query)}
+                sparse = {result['id']: result['score'] for result in large.search(query)}
+                self.assertEqual(set(dense), set(sparse))
+                self.assertEqual(
+                    sorted(dense, key=lambda position: (-dense[position], position)),
+                    sorted(sparse, key=lambda position: (-sparse[position], position))
+                )
+
+
+class TrigramIndexTests(SimpleTestCase):
+    NAMES = ['customers', 'cust_addr', 'order_items', 'quantity', 'qty', 'products', 'categories']
+
+    def setUp(self):
+        self.index = TrigramIndex()
+        self.index.build(({'name': name}, name_variants(name)) for name in self.NAMES)
+
+    def names(self, query):
+        return [result['name'] for result in self.index.search(query)]
+
+    def test_trigrams_are_padded_like_pg_trgm(self):
+        self.assertEqual(trigrams('cat'), {'  c', ' ca', 'cat', 'at '})
+        self.assertEqual(trigrams('Order_ID'), trigrams('order id'))
+        self.assertEqual(trigrams(''), set())
+
+    def test_scores_are_jaccard_similarity_of_trigram_sets(self):
+        query, name = trigrams('custmers'), trigrams('customers')
+        result = self.index.search('custmers')[0]
+
+        self.assertEqual(result['name'], 'customers')
+        self.assertAlmostEqual(result['score'], len(query & name) / len(query | name))
+        self.assertEqual(self.index.search('customers')[0]['score'], 1.0)
+        self.assertEqual(self.index.search('zzz'), [])
+        self.assertEqual(self.index.search('custmers', min_similarity=0.9), [])
+
+    def test_abbreviations_are_expanded_in_names(self):
+        self.assertEqual(name_variants('cust_addr'), ['cust addr', 'customer address'])
+        self.assertEqual(name_variants('orders', 'qty'), ['orders qty', 'orders quantity'])
+        self.assertEqual(name_variants('customers'), ['customers'])
+        self.assertEqual(expand_synonyms(['cust', 'qty', 'total']), ['customer', 'quantity', 'total'])
+
+        # Full words find abbreviated names
+        self.assertEqual(self.names('customer address')[0], 'cust_addr')
+        self.assertEqual(self.names('quantity')[:2], ['quantity', 'qty'])
+
+    def test_abbreviated_queries_find_full_names(self):
+        self.assertEqual(self.names('cust')[0], 'customers')
+        self.assertEqual(set(self.names('qty')[:2]), {'qty', 'quantity'})
+        self.assertEqual(self.names('prod')[0], 'products')
+        # Each entry is listed once, under its best variant
+        names = self.names('cust')
+        self.assertEqual(len(names), len(set(names)))
+
+
+class KeywordIndexCacheTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='password')
+        self.database = ClientDatabase.objects.create(
+            name='keywords', owner=owner, host='localhost', database_name='keywords', username='user', password='password'
+        )
+        table = TableMetadata.objects.create(database=self.database, table_name='customers', table_type='BASE TABLE')
+        ColumnMetadata.objects.create(table=table, column_name='id', data_type='integer', is_primary_key=True)
+        self.cache = MetadataCache()
+        patcher = mock.patch('databases.keyword_index.get_metadata_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_index_is_rebuilt_for_a_new_metadata_version(self):
+        index = get_keyword_index(self.database)
+        self.assertIs(get_keyword_index(self.database), index)
+        self.assertEqual(index.version, self.database.metadata_version)
+        self.assertEqual(search_keywords(self.database, 'invoices'), [])
+
+        TableMetadata.objects.create(database=self.database, table_name='invoices', table_type='BASE TABLE')
+        # Until the version changes, the cached index and results are served
+        self.assertEqual(search_keywords(self.database, 'invoices'), [])
+        self.database.bump_metadata_version()
+
+        rebuilt = get_keyword_index(self.database)
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual((len(index), len(rebuilt)), (2, 3))
+        self.assertEqual([result['name'] for result in search_keywords(self.database, 'invoices')], ['invoices'])
+
+class JoinGraphTests(SimpleTestCase):
+    def _chain(self, length):
+        """Tables t0..tN, each referencing the one before it"""
+        return JoinGraph(
+            range(100, 100 + length),
+            [f'public.t{node}' for node in range(length)],
+            [(node, 'parent_id', node - 1, 'id') for node in range(1, length)]
+        )
+
+    def test_memoized_trees_are_evicted_least_recently_used_first(self):
+        graph = self._chain(10)
+        graph._max_trees = 3
+        for node in (0, 1, 2, 0):
+            graph._tree(node)
+
+        graph._tree(3)
+
+        self.assertEqual(list(graph._trees), [2, 0, 3])
+        # A memoized tree is returned as is, not recomputed
+        self.assertIs(graph._tree(0), graph._trees[0])
+        self.assertEqual(graph._tree(3)[2].tolist(), [3, 2, 1, 0, 1, 2, 3, 4, 5, 6])
+
+
+class RecordingExtraction:
+    """Stands in for MetadataExtractor.extract_full_metadata, recording start order and peak concurrency"""
+
+    def __init__(self, duration=0.05):
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.started = []
+        self.running = Counter()
+        self.peak_total = 0
+        self.peak_per_host = Counter()
+
+    def __call__(self, database_obj):
+        with self.lock:
+            self.started.append(database_obj.name)
+            self.running[database_obj.host] += 1
+            self.peak_total = max(self.peak_total, sum(self.running.values()))
+            self.peak_per_host[database_obj.host] = max(
+                self.peak_per_host[database_obj.host], self.running[database_obj.host]
+            )
+        time.sleep(self.duration)
+        with self.lock:
+            self.running[database_obj.host] -= 1
+        return True, "refreshed", {}
+
+
+class MetadataRefreshSchedulerTests(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='password')
+        self.now = datetime.now(pytz.UTC)
+        self.scheduler = MetadataRefreshScheduler(interval=3600, jitter=0, max_concurrency=3, per_host_concurrency=1)
+
+    def _create_database(self, name, host='db1', updated_hours_ago=2, used_minutes_ago=None):
+        database = ClientDatabase.objects.create(
+            name=name, owner=self.owner, host=host, database_name=name, username='user', password='password',
+            last_metadata_update=self.now - timedelta(hours=updated_hours_ago)
+        )
+        if used_minutes_ago is not None:
+            session = Session.objects.create(user=self.owner, database_id=database.id, database_name=name)
+            # updated_at is auto_now, so backdate it with an update
+            Session.objects.filter(id=session.id).update(updated_at=self.now - timedelta(minutes=used_minutes_ago))
+        return database
+
+    def _run_once(self, extraction):
+        with mock.patch.object(MetadataExtractor, 'extract_full_metadata', extraction), \
+                mock.patch('databases.scheduler.generate_er_diagram'):
+            return self.scheduler.run_once()
+
+    def test_recently_used_then_stalest_databases_go_first(self):
+        self._create_database('fresh', updated_hours_ago=0.5)
+        self._create_database('unused_stale', updated_hours_ago=10)
+        self._create_database('unused_recent', updated_hours_ago=3)
+        self._create_database('used_long_ago', updated_hours_ago=2, used_minutes_ago=120)
+        self._create_database('used_just_now', updated_hours_ago=2, used_minutes_ago=1)
+
+        due = [database.name for database in self.scheduler.due_databases(now=self.now)]
+
+        self.assertEqual(due, ['used_just_now', 'used_long_ago', 'unused_stale', 'unused_recent'])
+
+    def test_refreshes_start_in_priority_order(self):
+        self.scheduler.max_concurrency = 1
+        self._create_database('unused_recent', host='db1', updated_hours_ago=3)
+        self._create_database('unused_stale', host='db2', updated_hours_ago=10)
+        self._create_database('used', host='db3', updated_hours_ago=2, used_minutes_ago=5)
+        extraction = RecordingExtraction(duration=0)
+
+        results = self._run_once(extraction)
+
+        self.assertEqual(extraction.started, ['used', 'unused_stale', 'unused_recent'])
+        self.assertTrue(all(success for success, _ in results.values()))
+
+    def test_per_host_and_global_caps_hold(self):
+        for i in range(4):
+            self._create_database(f'a{i}', host='db1', updated_hours_ago=2 + i)
+            self._create_database(f'b{i}', host='db2', updated_hours_ago=2 + i)
+        for i in range(2):
+            self._create_database(f'c{i}', host='db3', updated_hours_ago=2 + i)
+            self._create_database(f'd{i}', host='db4', updated_hours_ago=2 + i)
+        extraction = RecordingExtraction()
+
+        results = self._run_once(extraction)
+
+        self.assertEqual(len(results), 12)
+        self.assertEqual(extraction.peak_total, 3)
+        self.assertEqual(max(extraction.peak_per_host.values()), 1)
+        # Every claim is released once its refresh finishes
+        self.assertFalse(ClientDatabase.objects.filter(metadata_refresh_claimed_at__isnull=False).exists())
+
+    def test_live_claims_are_skipped_and_count_against_the_host_cap(self):
+        claimed = self._create_database('claimed_elsewhere', host='db1', updated_hours_ago=5)
+        ClientDatabase.objects.filter(id=claimed.id).update(metadata_refresh_claimed_at=datetime.now(pytz.UTC))
+        self._create_database('same_host', host='db1')
+        self._create_database('other_host', host='db2')
+        extraction = RecordingExtraction(duration=0)
+
+        results = self._run_once(extraction)
+
+        self.assertNotIn(claimed.id, results)
+        # db1 is at its cap while the other process holds its claim
+        self.assertEqual(extraction.started, ['other_host'])
+        self.assertFalse(self.scheduler._claim(claimed, datetime.now(pytz.UTC)))
+
+    def test_abandoned_claims_are_taken_over(self):
+        database = self._create_database('abandoned')
+        abandoned_at = self.now - timedelta(seconds=self.scheduler.lease_timeout + 60)
+        ClientDatabase.objects.filter(id=database.id).update(metadata_refresh_claimed_at=abandoned_at)
+
+        self.assertEqual([due.name for due in self.scheduler.due_databases(now=self.now)], ['abandoned'])
+        self.assertTrue(self.scheduler._claim(database, self.now))
+        # A second claim by another process is refused until the first is released
+        self.assertFalse(self.scheduler._claim(database, self.now))
+
+    def test_failed_databases_wait_for_the_retry_delay(self):
+        database = self._create_database('failed')
+        self.scheduler.retry_delay = 600
+        ClientDatabase.objects.filter(id=database.id).update(metadata_refresh_attempted_at=self.now - timedelta(seconds=60))
+
+        self.assertEqual(self.scheduler.due_databases(now=self.now), [])
+        self.assertEqual(
+            [due.name for due in self.scheduler.due_databases(now=self.now + timedelta(seconds=600))],
+            ['failed']
+        )
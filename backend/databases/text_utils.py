@@ -0,0 +1,68 @@
+import re
+
+# Boundaries inside identifiers: lower->Upper (orderId), acronym->Word (HTTPServer), letter<->digit
+CAMEL_BOUNDARY = re.compile(r'(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])|(?<=[A-Za-z])(?=[0-9])|(?<=[0-9])(?=[A-Za-z])')
+NON_ALPHANUMERIC = re.compile(r'[^A-Za-z0-9]+')
+
+
+def tokenize(text):
+    """
+    Split free text and identifiers into lowercase word tokens.
+
+    snake_case, camelCase, dotted names and digits are split apart, so
+    "customerOrders.ship_date2" becomes ['customer', 'orders', 'ship', 'date', '2'].
+    """
+    if not text:
+        return []
+    tokens = []
+    for chunk in NON_ALPHANUMERIC.split(text):
+        if chunk:
+            tokens.extend(part.lower() for part in CAMEL_BOUNDARY.split(chunk) if part)
+    return tokens
+
+
+# Common abbreviations in identifiers, expanded so "cust_addr" also matches "customer address"
+IDENTIFIER_SYNONYMS = {
+    'acct': 'account',
+    'addr': 'address',
+    'amt': 'amount',
+    'cat': 'category',
+    'cnt': 'count',
+    'cust': 'customer',
+    'desc': 'description',
+    'dept': 'department',
+    'dt': 'date',
+    'emp': 'employee',
+    'inv': 'invoice',
+    'loc': 'location',
+    'msg': 'message',
+    'num': 'number',
+    'org': 'organization',
+    'pmt': 'payment',
+    'prod': 'product',
+    'qty': 'quantity',
+    'ref': 'reference',
+    'tel': 'telephone',
+    'ts': 'timestamp',
+    'txn': 'transaction',
+    'usr': 'user',
+}
+
+
+def expand_synonyms(tokens):
+    """Replace known identifier abbreviations with the words they stand for"""
+    return [IDENTIFIER_SYNONYMS.get(token, token) for token in tokens]
+
+
+def trigrams(text):
+    """
+    Character trigrams of each word, padded like PostgreSQL's pg_trgm.
+
+    Words get two leading spaces and one trailing space, so prefixes weigh
+    more than suffixes and "cust" already shares trigrams with "customer".
+    """
+    grams = set()
+    for word in tokenize(text):
+        padded = f"  {word} "
+        grams.update(padded[start:start + 3] for start in range(len(padded) - 2))
+    return grams
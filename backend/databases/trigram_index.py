@@ -0,0 +1,201 @@
+import logging
+import numpy as np
+from collections import defaultdict
+from .cache import get_metadata_cache
+from .models import TableMetadata, ColumnMetadata
+from .text_utils import tokenize, expand_synonyms, trigrams
+from .vector_index import table_entry, column_entry
+
+logger = logging.getLogger(__name__)
+
+# Name variants per entry: a column is indexed by its own name and by "table column"
+MAX_VARIANTS = 4
+
+
+def name_variants(*names):
+    """
+    Spellings under which an identifier can be found.
+
+    The words of the names joined, plus the same with abbreviations expanded
+    when that differs.
+    """
+    tokens = [token for name in names for token in tokenize(name)]
+    variants = [' '.join(tokens)]
+    expanded = ' '.join(expand_synonyms(tokens))
+    if expanded != variants[0]:
+        variants.append(expanded)
+    return variants
+
+
+class TrigramIndex:
+    """
+    Character-trigram index over table and column names for typo-tolerant lookup.
+
+    Each entry is indexed under several name variants. A query counts shared
+    trigrams only over the posting lists of its own trigrams and scores each
+    variant by Jaccard similarity, like pg_trgm's similarity(); an entry scores
+    as its best variant.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._state = ([], np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), {})
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def memory_usage(self):
+        """Approximate bytes held by postings and result payloads"""
+        entries, variant_entries, variant_sizes, postings = self._state
+        return (
+            len(entries) * 600 + variant_entries.nbytes + variant_sizes.nbytes
+            + sum(variants.nbytes + 100 for variants in postings.values())
+        )
+
+    def build(self, documents):
+        """
+        Replace the index contents.
+
+        Args:
+            documents (iterable): (entry, variants) pairs, variants being name strings
+        """
+        entries = []
+        variant_entries = []
+        variant_sizes = []
+        gram_variants = defaultdict(list)
+
+        for position, (entry, variants) in enumerate(documents):
+            entries.append(entry)
+            for variant in variants:
+                grams = trigrams(variant)
+                if not grams:
+                    continue
+                variant_id = len(variant_entries)
+                variant_entries.append(position)
+                variant_sizes.append(len(grams))
+                for gram in grams:
+                    gram_variants[gram].append(variant_id)
+
+        self._state = (
+            entries,
+            np.asarray(variant_entries, dtype=np.int32),
+            np.asarray(variant_sizes, dtype=np.int32),
+            {gram: np.asarray(variants, dtype=np.int32) for gram, variants in gram_variants.items()}
+        )
+
+    def _similar_variants(self, grams, min_similarity):
+        """Indexed variants sharing trigrams with a query variant, and their Jaccard similarity"""
+        _, variant_entries, variant_sizes, postings = self._state
+        matched = [postings[gram] for gram in grams if gram in postings]
+        if not matched:
+            return np.zeros(0, dtype=np.int32), np.zeros(0)
+
+        variant_ids = np.concatenate(matched)
+        if len(variant_ids) * 8 > len(variant_entries):
+            # Short, common trigrams hit much of the index; count densely
+            counts = np.bincount(variant_ids, minlength=len(variant_entries))
+            variants = np.flatnonzero(counts)
+            shared = counts[variants]
+        else:
+            variants, shared = np.unique(variant_ids, return_counts=True)
+        scores = shared / (len(grams) + variant_sizes[variants] - shared)
+        keep = scores >= min_similarity
+        return variants[keep], scores[keep]
+
+    def search(self, query_text, k=10, min_similarity=0.3):
+        """
+        Return the top-k entries by trigram similarity to the query.
+
+        The query is matched as written and with abbreviations expanded, so
+        "qty" finds "quantity" as well as "qty".
+
+        Args:
+            query_text (str): Possibly misspelled, partial or abbreviated names
+            k (int): Number of results
+            min_similarity (float): Minimum Jaccard similarity of trigram sets
+
+        Returns:
+            list: Entry dicts with a 'score' key, best first
+        """
+        if k <= 0:
+            return []
+        entries, variant_entries, _, _ = self._state
+        queries = name_variants(query_text)
+        found = [self._similar_variants(trigrams(query), min_similarity) for query in queries]
+        variants = np.concatenate([query_variants for query_variants, _ in found])
+        scores = np.concatenate([query_scores for _, query_scores in found])
+        if not len(scores):
+            return []
+
+        # Entries have at most MAX_VARIANTS variants per query variant, so this many candidates hold k distinct entries
+        candidates = min(len(scores), k * MAX_VARIANTS * len(queries))
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        variants, scores = variants[top], scores[top]
+
+        # Best variant per entry, best entries first
+        order = np.argsort(-scores, kind='stable')
+        results = []
+        seen = set()
+        for i in order:
+            position = variant_entries[variants[i]]
+            if position in seen:
+                continue
+            seen.add(position)
+            results.append(dict(entries[position], score=float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+
+def build_trigram_index(index, database_obj):
+    """Rebuild an index from the database's current table and column names"""
+    tables = TableMetadata.objects.filter(database=database_obj).only(
+        'id', 'table_name', 'schema_name', 'description'
+    )
+    columns = ColumnMetadata.objects.filter(table__database=database_obj).select_related('table').only(
+        'id', 'column_name', 'data_type', 'description',
+        'table__table_name', 'table__schema_name'
+    )
+
+    def documents():
+        for table in tables.iterator(chunk_size=2000):
+            yield table_entry(table), name_variants(table.table_name)
+        for column in columns.iterator(chunk_size=2000):
+            yield column_entry(column), (
+                name_variants(column.column_name) + name_variants(column.table.table_name, column.column_name)
+            )
+
+    index.build(documents())
+    index.version = database_obj.metadata_version
+    logger.info(f"Trigram index for database {database_obj.id} built: {len(index)} identifiers")
+
+
+def get_trigram_index(database_obj):
+    """
+    Return the trigram index for a database's current metadata version, building it on a cache miss.
+
+    Args:
+        database_obj (ClientDatabase): Database to search
+
+    Returns:
+        TrigramIndex: Index whose version matches database_obj.metadata_version
+    """
+    def build():
+        index = TrigramIndex()
+        build_trigram_index(index, database_obj)
+        return index
+
+    return get_metadata_cache().get_or_build(
+        database_obj.id, ('trigram_index', database_obj.metadata_version), build
+    )
+
+
+def search_fuzzy(database_obj, query_text, limit=10):
+    """Search table and column names tolerating typos and abbreviations, caching results per metadata version"""
+    cache = get_metadata_cache()
+    key = ('fuzzy_search', database_obj.metadata_version, query_text, limit)
+    results = cache.get(database_obj.id, key)
+    if results is None:
+        results = get_trigram_index(database_obj).search(query_text, k=limit)
+        cache.set(database_obj.id, key, results)
+    return [dict(result) for result in results]
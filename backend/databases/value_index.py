@@ -0,0 +1,170 @@
+import logging
+from collections import defaultdict
+from .cache import get_metadata_cache
+from .models import ColumnMetadata
+from .text_utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Values longer than this many words are not looked up as question phrases
+MAX_VALUE_WORDS = 5
+
+# Single words too common in questions to ground a filter on
+STOPWORDS = frozenset({
+    'a', 'all', 'an', 'and', 'any', 'are', 'by', 'false', 'for', 'from', 'in', 'is', 'it', 'n', 'no',
+    'none', 'not', 'null', 'of', 'on', 'or', 'other', 'the', 'to', 'true', 'unknown', 'with', 'y', 'yes',
+})
+
+
+def value_key(value):
+    """
+    Normalized phrase a stored value is matched under, or None if it should not be indexed.
+
+    Case, punctuation and identifier-style word boundaries are ignored, so
+    'PREMIUM_TIER' and 'Premium tier' share a key. Numbers and common words
+    are skipped: a question's "2" or "no" says nothing about which column it filters.
+    """
+    tokens = tokenize(value)
+    if not tokens or len(tokens) > MAX_VALUE_WORDS:
+        return None
+    if all(token.isdigit() for token in tokens):
+        return None
+    if len(tokens) == 1 and (len(tokens[0]) < 2 or tokens[0] in STOPWORDS):
+        return None
+    return ' '.join(tokens)
+
+
+class ValueIndex:
+    """
+    Phrase index over the distinct values of categorical columns.
+
+    Every stored value is keyed by its normalized phrase, so grounding a
+    question costs one dictionary lookup per question n-gram, independent of
+    how many values the database holds. The mapping is swapped in whole, so
+    lookups need no lock.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._state = ({}, 0)
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def memory_usage(self):
+        """Approximate bytes held by phrases and hit payloads"""
+        postings, _ = self._state
+        return sum(len(phrase) + 100 + 400 * len(hits) for phrase, hits in postings.items())
+
+    def build(self, documents):
+        """
+        Replace the index contents.
+
+        Args:
+            documents (iterable): (entry, value) pairs, entry describing the column holding the value
+        """
+        postings = defaultdict(list)
+        longest = 0
+        for entry, value in documents:
+            key = value_key(value)
+            if key is None:
+                continue
+            postings[key].append(dict(entry, value=value))
+            longest = max(longest, key.count(' ') + 1)
+        self._state = (dict(postings), longest)
+
+    def search(self, question, limit=10):
+        """
+        Find stored values mentioned in a question.
+
+        Longer phrases win: once "new york" matches, "york" alone is not looked up.
+
+        Args:
+            question (str): Natural language question
+            limit (int): Maximum number of hits
+
+        Returns:
+            list: Hit dicts (table_id, schema, table, column, value, phrase), longest phrases first
+        """
+        postings, longest = self._state
+        tokens = tokenize(question)
+        covered = [False] * len(tokens)
+        results = []
+        for size in range(min(longest, len(tokens)), 0, -1):
+            for start in range(len(tokens) - size + 1):
+                if any(covered[start:start + size]):
+                    continue
+                phrase = ' '.join(tokens[start:start + size])
+                hits = postings.get(phrase)
+                if not hits:
+                    continue
+                covered[start:start + size] = [True] * size
+                results.extend(dict(hit, phrase=phrase) for hit in hits)
+                if len(results) >= limit:
+                    return results[:limit]
+        return results
+
+
+def build_value_index(index, database_obj):
+    """Rebuild an index from the database's stored categorical values"""
+    columns = ColumnMetadata.objects.filter(
+        table__database=database_obj, categorical_values__isnull=False
+    ).select_related('table').only(
+        'id', 'column_name', 'categorical_values', 'table__id', 'table__table_name', 'table__schema_name'
+    )
+
+    def documents():
+        for column in columns.iterator(chunk_size=2000):
+            entry = {
+                'table_id': column.table.id,
+                'column_id': column.id,
+                'schema': column.table.schema_name,
+                'table': column.table.table_name,
+                'column': column.column_name
+            }
+            for value in column.categorical_values or []:
+                yield entry, value
+
+    index.build(documents())
+    index.version = database_obj.metadata_version
+    logger.info(f"Value index for database {database_obj.id} built: {len(index)} phrases")
+
+
+def get_value_index(database_obj):
+    """
+    Return the value index for a database's current metadata version, building it on a cache miss.
+
+    Args:
+        database_obj (ClientDatabase): Database to search
+
+    Returns:
+        ValueIndex: Index whose version matches database_obj.metadata_version
+    """
+    def build():
+        index = ValueIndex()
+        build_value_index(index, database_obj)
+        return index
+
+    return get_metadata_cache().get_or_build(
+        database_obj.id, ('value_index', database_obj.metadata_version), build
+    )
+
+
+def find_value_hints(database_obj, question, limit=10):
+    """Find the column values a question mentions, caching results per metadata version"""
+    cache = get_metadata_cache()
+    key = ('value_search', database_obj.metadata_version, question, limit)
+    results = cache.get(database_obj.id, key)
+    if results is None:
+        results = get_value_index(database_obj).search(question, limit=limit)
+        cache.set(database_obj.id, key, results)
+    return [dict(result) for result in results]
+
+
+def format_value_hints(hints):
+    """Render value hints as one filter suggestion per line, e.g. - "california": public.customers.state = 'California'"""
+    lines = []
+    for hint in hints:
+        literal = hint['value'].replace("'", "''")
+        lines.append(f"- \"{hint['phrase']}\": {hint['schema']}.{hint['table']}.{hint['column']} = '{literal}'")
+    return '\n'.join(lines)
@@ -0,0 +1,434 @@
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import weakref
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from django.db.models import Max
+from .cache import get_metadata_cache
+from .embeddings import unpack_vector
+from .models import TableMetadata, ColumnMetadata
+
+logger = logging.getLogger(__name__)
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+
+def table_entry(table):
+    """Search result payload for a table"""
+    return {
+        'type': 'table',
+        'id': table.id,
+        'name': table.table_name,
+        'schema': table.schema_name,
+        'description': table.description
+    }
+
+
+def column_entry(column):
+    """Search result payload for a column (expects column.table to be loaded)"""
+    return {
+        'type': 'column',
+        'id': column.id,
+        'name': column.column_name,
+        'table_id': column.table_id,
+        'table_name': column.table.table_name,
+        'schema': column.table.schema_name,
+        'data_type': column.data_type,
+        'description': column.description
+    }
+
+
+class VectorIndex:
+    """
+    Dense index of unit vectors for one database.
+
+    Small indexes are searched exactly with one matrix-vector product. Once an
+    index reaches VECTOR_INDEX_HNSW_THRESHOLD entries and hnswlib is installed,
+    an HNSW graph is kept alongside the matrix and searched instead.
+
+    The matrix, keys and entries are swapped in as one tuple, so exact searches
+    never see a half-applied update and need no lock. The matrix may be a
+    read-only memory map of a shared snapshot; updates always build a new array.
+    """
+
+    def __init__(self, dimensions, model_id, hnsw_threshold=None):
+        self.dimensions = dimensions
+        self.model_id = model_id
+        self.version = None
+        self.watermark = None
+        self.lock = threading.Lock()
+        self.hnsw_threshold = hnsw_threshold or getattr(settings, 'VECTOR_INDEX_HNSW_THRESHOLD', 20000)
+        self._state = (np.zeros((0, dimensions), dtype=np.float32), [], [])
+        # HNSW labels are stable per key; rows move whenever entries are removed
+        self._graph = None
+        self._graph_lock = threading.Lock()
+        self._labels = {}
+        self._next_label = 0
+        self._label_rows = np.zeros(0, dtype=np.intp)
+
+    def __len__(self):
+        return len(self._state[1])
+
+    def upsert(self, items):
+        """
+        Insert or replace vectors.
+
+        Args:
+            items (list): (key, vector, entry) tuples, key being ('table'|'column', id)
+        """
+        if not items:
+            return
+        matrix, keys, entries = self._state
+        positions = {key: row for row, key in enumerate(keys)}
+        matrix = matrix.copy()
+        keys = list(keys)
+        entries = list(entries)
+        new_vectors = []
+
+        for key, vector, entry in items:
+            row = positions.get(key)
+            if row is None:
+                positions[key] = len(keys)
+                keys.append(key)
+                entries.append(entry)
+                new_vectors.append(vector)
+            else:
+                matrix[row] = vector
+                entries[row] = entry
+
+        if new_vectors:
+            matrix = np.vstack([matrix, np.asarray(new_vectors, dtype=np.float32)])
+        self._swap((matrix, keys, entries), upserted=[key for key, _, _ in items])
+
+    def successor(self):
+        """
+        Start the next version's index from this one's contents.
+
+        The HNSW graph moves to the successor rather than being rebuilt; this
+        index keeps answering exactly from its matrix until it is dropped.
+        """
+        index = VectorIndex(self.dimensions, self.model_id, self.hnsw_threshold)
+        with self._graph_lock:
+            index._state = self._state
+            index._graph, self._graph = self._graph, None
+            index._labels = self._labels
+            index._next_label = self._next_label
+            index._label_rows = self._label_rows
+        index.watermark = self.watermark
+        return index
+
+    def adopt_matrix(self, matrix):
+        """Swap in an identical copy of the current matrix, such as its memory-mapped snapshot"""
+        with self._graph_lock:
+            _, keys, entries = self._state
+            self._state = (matrix, keys, entries)
+
+    def memory_usage(self):
+        """Approximate bytes held by this process (memory-mapped vectors are shared and not counted)"""
+        matrix, keys, _ = self._state
+        usage = 0 if isinstance(matrix, np.memmap) else matrix.nbytes
+        # Result payload dicts and keys
+        usage += len(keys) * 600
+        if self._graph is not None:
+            usage += self._graph.get_max_elements() * (self.dimensions * 4 + 16 * 2 * 4 + 64)
+        return usage
+
+    def replace(self, matrix, keys, entries):
+        """Swap in an entirely new set of vectors, e.g. one opened from the shared store"""
+        with self._graph_lock:
+            self._graph = None
+            self._labels = {}
+            self._next_label = 0
+        self._swap((matrix, list(keys), list(entries)), upserted=keys)
+
+    def remove(self, removed_keys):
+        """Drop vectors by key"""
+        if not removed_keys:
+            return
+        matrix, keys, entries = self._state
+        keep = [row for row, key in enumerate(keys) if key not in removed_keys]
+        self._swap(
+            (matrix[keep], [keys[row] for row in keep], [entries[row] for row in keep]),
+            removed=removed_keys
+        )
+
+    def _swap(self, state, upserted=(), removed=()):
+        """Install a new state and apply the same change to the HNSW graph, if any"""
+        if hnswlib is None or (self._graph is None and len(state[1]) < self.hnsw_threshold):
+            self._state = state
+            return
+
+        matrix, keys, _ = state
+        with self._graph_lock:
+            if self._graph is None:
+                self._graph = hnswlib.Index(space='ip', dim=self.dimensions)
+                self._graph.init_index(max_elements=len(keys), ef_construction=200, M=16)
+                self._labels = {}
+                self._next_label = 0
+                upserted = keys
+
+            for key in removed:
+                label = self._labels.pop(key, None)
+                if label is not None:
+                    self._graph.mark_deleted(label)
+
+            rows = {key: row for row, key in enumerate(keys)}
+            if upserted:
+                for key in upserted:
+                    if key not in self._labels:
+                        self._labels[key] = self._next_label
+                        self._next_label += 1
+                labels = np.asarray([self._labels[key] for key in upserted])
+                if self._next_label > self._graph.get_max_elements():
+                    self._graph.resize_index(max(self._next_label, self._graph.get_max_elements() * 2))
+                self._graph.add_items(matrix[[rows[key] for key in upserted]], labels)
+
+            label_rows = np.full(self._graph.get_max_elements(), -1, dtype=np.intp)
+            for key, label in self._labels.items():
+                label_rows[label] = rows[key]
+            self._label_rows = label_rows
+            self._state = state
+
+    def search(self, query_vector, k=10, min_score=0.0):
+        """
+        Return the top-k entries by cosine similarity.
+
+        Args:
+            query_vector (numpy.ndarray): Unit query vector
+            k (int): Number of results
+            min_score (float): Results must score strictly above this
+
+        Returns:
+            list: Entry dicts with a 'score' key, best first
+        """
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if self._graph is not None:
+            results = self._search_graph(query_vector, k, min_score)
+            if results is not None:
+                return results
+
+        matrix, keys, entries = self._state
+        if not keys or k <= 0:
+            return []
+
+        scores = matrix @ query_vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            dict(entries[row], score=float(scores[row]))
+            for row in top
+            if scores[row] > min_score
+        ]
+
+    def _search_graph(self, query_vector, k, min_score):
+        """Approximate top-k through the HNSW graph; None if the graph was handed on"""
+        with self._graph_lock:
+            if self._graph is None:
+                return None
+            _, keys, entries = self._state
+            k = min(k, len(keys))
+            if k <= 0:
+                return []
+            self._graph.set_ef(max(64, k * 2))
+            labels, distances = self._graph.knn_query(query_vector, k=k)
+            rows = self._label_rows[labels[0]]
+
+        # Inner-product distance is 1 - cosine for unit vectors
+        return [
+            dict(entries[row], score=float(1.0 - distance))
+            for row, distance in zip(rows, distances[0])
+            if 1.0 - distance > min_score
+        ]
+
+
+def refresh_vector_index(index, database_obj, vectorizer):
+    """
+    Bring an index up to date with the database's metadata.
+
+    Only rows updated since the last refresh are re-read; deletions are found
+    by comparing primary keys.
+    """
+    tables = TableMetadata.objects.filter(database=database_obj)
+    columns = ColumnMetadata.objects.filter(table__database=database_obj).select_related('table')
+
+    watermark = max(
+        filter(None, [
+            tables.aggregate(latest=Max('updated_at'))['latest'],
+            columns.aggregate(latest=Max('updated_at'))['latest'],
+        ]),
+        default=None
+    )
+
+    if index.watermark is not None:
+        changed_tables = list(tables.filter(updated_at__gt=index.watermark))
+        changed_columns = list(columns.filter(updated_at__gt=index.watermark))
+
+        current_keys = {('table', table_id) for table_id in tables.values_list('id', flat=True)}
+        current_keys.update(('column', column_id) for column_id in columns.values_list('id', flat=True))
+        index.remove({key for key in index._state[1] if key not in current_keys})
+    else:
+        changed_tables = list(tables)
+        changed_columns = list(columns)
+
+    # Only rows whose embedding text changed are re-embedded
+    vectorizer.embed_metadata(changed_tables, changed_columns)
+
+    items = [(('table', table.id), unpack_vector(table.embedding), table_entry(table)) for table in changed_tables]
+    items.extend(
+        (('column', column.id), unpack_vector(column.embedding), column_entry(column))
+        for column in changed_columns
+    )
+    index.upsert(items)
+
+    index.watermark = watermark
+    index.version = database_obj.metadata_version
+    logger.info(f"Vector index for database {database_obj.id} refreshed: {len(items)} updated, {len(index)} total")
+
+
+def _store_root():
+    """Directory holding the shared per-version embedding files, or None when disabled"""
+    root = getattr(settings, 'EMBEDDING_STORE_DIR', None)
+    return Path(root) if root else None
+
+
+def _store_path(database_id, version, model_id):
+    """Directory of one immutable embedding snapshot"""
+    return _store_root() / f"db{database_id}" / f"v{version}-{re.sub(r'[^A-Za-z0-9_.-]', '_', model_id)}"
+
+
+def load_vector_store(index, database_id, version):
+    """
+    Open a published snapshot and install it in an index without copying the vectors.
+
+    The matrix is memory-mapped read-only, so every worker process searching the
+    same snapshot shares one copy in the OS page cache.
+
+    Returns:
+        bool: True if a snapshot for this version and model existed and was loaded
+    """
+    if _store_root() is None:
+        return False
+    path = _store_path(database_id, version, index.model_id)
+    try:
+        with open(path / 'entries.json', encoding='utf-8') as f:
+            meta = json.load(f)
+        matrix = np.load(path / 'vectors.npy', mmap_mode='r')
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable embedding snapshot {path}: {str(e)}")
+        return False
+
+    index.replace(matrix, [tuple(key) for key in meta['keys']], meta['entries'])
+    index.watermark = datetime.fromisoformat(meta['watermark']) if meta['watermark'] else None
+    index.version = version
+    return True
+
+
+def publish_vector_store(index, database_id):
+    """
+    Write an index to an immutable snapshot and reopen it memory-mapped.
+
+    The snapshot is written to a temporary directory and renamed into place,
+    so readers only ever see complete snapshots. If another worker published
+    the same version first, its snapshot is used instead. Older versions are
+    removed; workers still mapping them keep working until they move on.
+    """
+    if _store_root() is None:
+        return
+    matrix, keys, entries = index._state
+    path = _store_path(database_id, index.version, index.model_id)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+        np.save(staging / 'vectors.npy', np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(staging / 'entries.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'keys': keys,
+                'entries': entries,
+                'watermark': index.watermark.isoformat() if index.watermark else None
+            }, f)
+        try:
+            os.rename(staging, path)
+            published = True
+        except OSError:
+            # Lost the race to another worker; its snapshot has the same content
+            shutil.rmtree(staging, ignore_errors=True)
+            published = False
+    except OSError as e:
+        logger.warning(f"Could not publish embedding snapshot for database {database_id}: {str(e)}")
+        return
+
+    if published:
+        # Same rows in the same order, so only the matrix needs swapping
+        index.adopt_matrix(np.load(path / 'vectors.npy', mmap_mode='r'))
+    else:
+        load_vector_store(index, database_id, index.version)
+    for snapshot in path.parent.iterdir():
+        match = re.match(r'v(\d+)-', snapshot.name)
+        if match and int(match.group(1)) < index.version:
+            shutil.rmtree(snapshot, ignore_errors=True)
+
+
+def _build_vector_index(database_obj, vectorizer):
+    """Open the published snapshot for the current version, or refresh from the previous version and publish"""
+    backend = vectorizer.backend
+    cache = get_metadata_cache()
+    latest_key = ('vector_index', backend.model_id, 'latest')
+    version = database_obj.metadata_version
+
+    previous_ref = cache.get(database_obj.id, latest_key)
+    previous = previous_ref() if previous_ref is not None else None
+    if previous is not None and previous.version is not None and previous.version < version:
+        index = previous.successor()
+    else:
+        index = VectorIndex(backend.dimensions, backend.model_id)
+
+    if not load_vector_store(index, database_obj.id, version):
+        refresh_vector_index(index, database_obj, vectorizer)
+        publish_vector_store(index, database_obj.id)
+
+    # Only a weak reference: the index is charged to, and kept alive by, its versioned entry,
+    # so evicting that entry frees it and the next version starts from the published snapshot
+    cache.set(database_obj.id, latest_key, weakref.ref(index))
+    return index
+
+
+def get_vector_index(database_obj, vectorizer):
+    """
+    Return the vector index for a database's current metadata version.
+
+    Indexes live in the process-wide metadata cache, keyed by database, model
+    and metadata_version. On a miss, a snapshot already published for this
+    version by any worker is memory-mapped; otherwise the previous version's
+    index is refreshed incrementally and published.
+
+    Args:
+        database_obj (ClientDatabase): Database to search; its metadata_version decides freshness
+        vectorizer (MetadataVectorizer): Supplies the embedding backend and item texts
+
+    Returns:
+        VectorIndex: Index whose version matches database_obj.metadata_version
+    """
+    key = ('vector_index', vectorizer.backend.model_id, database_obj.metadata_version)
+    return get_metadata_cache().get_or_build(
+        database_obj.id, key, lambda: _build_vector_index(database_obj, vectorizer)
+    )
+
+
+def discard_vector_index(database_id):
+    """Forget everything cached for a database and its snapshots, e.g. when the database is deleted"""
+    get_metadata_cache().invalidate(database_id)
+    if _store_root() is not None:
+        shutil.rmtree(_store_root() / f"db{database_id}", ignore_errors=True)
@@ -11,6 +11,10 @@ from .serializers import (
     QueryResultSerializer
 )
 from .services import DatabaseConnector, MetadataExtractor, MetadataVectorizer
+from .keyword_index import search_keywords
+from .hybrid_search import hybrid_search
+from .trigram_index import search_fuzzy
+from .vector_index import discard_vector_index
 
 class DatabaseViewSet(viewsets.ModelViewSet):
     """CRUD operations for database connections"""
@@ -27,6 +31,12 @@ class DatabaseViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
     
+    def perform_destroy(self, instance):
+        database_id = instance.id
+        instance.delete()
+        # Also drops the keyword and trigram indexes, which share the metadata cache
+        discard_vector_index(database_id)
+    
     @action(detail=True, methods=['post'])
     def test_connection(self, request, pk=None):
         """Test database connection"""
@@ -173,17 +183,38 @@ class DatabaseViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def search(self, request, pk=None):
-        """Search database schema metadata"""
+        """
+        Search database schema metadata by hybrid keyword, embedding and fuzzy name retrieval
+        (the default), keyword (BM25), fuzzy name match or embedding similarity.
+        
+        Hybrid searches report per-stage latency in a Server-Timing header.
+        """
         database = self.get_object()
         query = request.query_params.get('q', '')
+        mode = request.query_params.get('mode', 'hybrid')
         
         if not query:
             return Response({'error': 'Query parameter "q" is required'}, status=400)
         
-        vectorizer = MetadataVectorizer()
-        results = vectorizer.search_metadata(database, query)
+        timings = None
+        if mode == 'hybrid':
+            results, timings = hybrid_search(database, query)
+        elif mode == 'keyword':
+            results = search_keywords(database, query)
+            if not results:
+                # Misspelled or abbreviated names share no exact words; fall back to fuzzy matching
+                results = search_fuzzy(database, query)
+        elif mode == 'fuzzy':
+            results = search_fuzzy(database, query)
+        elif mode == 'semantic':
+            results = MetadataVectorizer().search_metadata(database, query)
+        else:
+            return Response({'error': f'Invalid search mode: {mode}'}, status=400)
 
-        return Response(results)
+        response = Response(results)
+        if timings:
+            response['Server-Timing'] = ', '.join(f"{stage};dur={elapsed:.2f}" for stage, elapsed in timings.items())
+        return response
     
     @action(detail=True, methods=['post'])
     def update_description(self, request, pk=None):
@@ -202,20 +233,26 @@ class DatabaseViewSet(viewsets.ModelViewSet):
         description = request.data['description']
         
         try:
+            vectorizer = MetadataVectorizer()
             if metadata_type == 'table':
                 table = TableMetadata.objects.get(id=metadata_id, database=database)
                 table.description = description
-                table.save(update_fields=['description'])
+                table.save(update_fields=['description', 'updated_at'])
+                vectorizer.create_table_embedding(table)
             elif metadata_type == 'column':
                 # Ensure column belongs to this database
                 column = ColumnMetadata.objects.get(id=metadata_id, table__database=database)
                 column.description = description
-                column.save(update_fields=['description'])
+                column.save(update_fields=['description', 'updated_at'])
+                vectorizer.create_column_embedding(column)
             else:
                 return Response({
                     'success': False,
                     'message': f'Invalid metadata type: {metadata_type}'
                 }, status=400)
+            
+            # Re-embedded descriptions must reach the search indexes and the schema prompt
+            database.bump_metadata_version()
                 
             return Response({
                 'success': True,
@@ -0,0 +1,235 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from django.conf import settings
+from databases.services import MetadataVectorizer
+from databases.value_index import find_value_hints
+
+# Filler that does not change what a question asks for; negations, quantifiers and numbers are kept
+QUESTION_STOPWORDS = frozenset({
+    'a', 'an', 'the', 'please', 'show', 'me', 'give', 'list', 'find', 'get', 'tell', 'display', 'return',
+    'what', 'which', 'is', 'are', 'was', 'were', 'do', 'does', 'did', 'can', 'could', 'would',
+    'you', 'i', 'we', 'us', 'my', 'our',
+})
+# Words, and comparison symbols, which change the SQL as much as the words they stand for
+TOKEN = re.compile(r'\w+|[<>!]=|<>|[<>=]')
+OPERATOR_SYMBOL = re.compile(r'[<>!]=|<>|[<>=]')
+NUMBER = re.compile(r'\d+(?:\.\d+)?')
+# Words that flip or bound what a question asks for, yet barely move its embedding
+# ("active" vs "not active", "ascending" vs "descending"); "n't" counts as "not"
+OPERATOR_WORD = re.compile(
+    r"n't\b|\b(?:not|no|never|none|nor|neither|without|except|excluding|exclude|excluded|other|non"
+    r"|more|less|fewer|greater|higher|lower|above|below|over|under|exceeding|at|least|most|between|before|after"
+    r"|since|until|equal|equals|only|all|any|each"
+    r"|asc|ascending|desc|descending|increasing|decreasing|reverse|oldest|newest|earliest|latest|recent"
+    r"|first|last|top|bottom|highest|lowest|largest|smallest|biggest|cheapest|best|worst"
+    r"|min|minimum|max|maximum|limit|average|avg|sum|total|count|distinct|unique)\b"
+)
+
+LEVELS = ('exact', 'normalized', 'semantic')
+
+
+def _symbol(token):
+    """One spelling per comparison symbol"""
+    return '!=' if token == '<>' else token
+
+
+def normalize_question(question):
+    """Lowercase words and comparison symbols of a question without other punctuation, extra whitespace or filler words"""
+    return ' '.join(
+        _symbol(token) for token in TOKEN.findall(question.lower()) if token not in QUESTION_STOPWORDS
+    )
+
+
+def question_signature(database_obj, question):
+    """
+    What a cached answer depends on beyond topic: numbers, stored column values and operator words or symbols.
+
+    Questions that differ only in a literal ("customers in Texas" vs
+    "customers in California"), a negation ("active" vs "not active"), a
+    comparison, an aggregate or an order direction embed almost identically
+    but need different SQL, so a semantic match requires all of these to agree.
+    """
+    values = {(hint['column_id'], hint['value']) for hint in find_value_hints(database_obj, question)}
+    lowered = question.lower().replace('\u2019', "'")
+    operators = sorted(
+        ['not' if word == "n't" else word for word in OPERATOR_WORD.findall(lowered)]
+        + [_symbol(symbol) for symbol in OPERATOR_SYMBOL.findall(lowered)]
+    )
+    return tuple(sorted(NUMBER.findall(question))), tuple(sorted(values)), tuple(operators)
+
+
+class AnswerCache:
+    """
+    Process-wide cache of nl_to_sql answers, scoped by database and metadata version.
+
+    A question is looked up by its exact text, then by its normalized text,
+    then by embedding similarity to cached questions with the same literals
+    and operator words (see question_signature).
+    Entries expire after ttl seconds and the least recently used are evicted
+    beyond max_entries. A bumped metadata_version simply stops matching old
+    entries, which then age out.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, min_similarity=None):
+        self.max_entries = max_entries or getattr(settings, 'ANSWER_CACHE_MAX_ENTRIES', 5000)
+        self.ttl = ttl or getattr(settings, 'ANSWER_CACHE_TTL', 86400)
+        self.min_similarity = min_similarity or getattr(settings, 'ANSWER_CACHE_MIN_SIMILARITY', 0.95)
+        self._entries = OrderedDict()
+        self._normalized = {}
+        self._scopes = {}
+        self._lock = threading.Lock()
+        self.hits = dict.fromkeys(LEVELS, 0)
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _drop(self, key):
+        """Remove an entry from every level (caller holds the lock)"""
+        entry = self._entries.pop(key)
+        scope = key[:2]
+        if self._normalized.get(scope + (entry['normalized'],)) == key:
+            del self._normalized[scope + (entry['normalized'],)]
+        members = self._scopes.get(scope)
+        if members is not None:
+            members['keys'].discard(key)
+            members['matrix'] = None
+            if not members['keys']:
+                del self._scopes[scope]
+
+    def _live(self, key, now):
+        """The entry under key if present and fresh, marking it recently used (caller holds the lock)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry['created'] > self.ttl:
+            self._drop(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _nearest(self, scope, vector, signature, now):
+        """Most similar fresh entry with the same signature in a scope (caller holds the lock)"""
+        members = self._scopes.get(scope)
+        if members is None:
+            return None, 0.0
+        if members['matrix'] is None:
+            members['order'] = list(members['keys'])
+            members['matrix'] = np.stack([self._entries[key]['vector'] for key in members['order']])
+        similarities = members['matrix'] @ vector
+        for position in np.argsort(-similarities):
+            similarity = float(similarities[position])
+            if similarity < self.min_similarity:
+                break
+            key = members['order'][position]
+            if key not in self._entries:
+                continue
+            if self._entries[key]['signature'] != signature:
+                continue
+            entry = self._live(key, now)
+            if entry is not None:
+                return entry, similarity
+        return None, 0.0
+
+    def _embed(self, question):
+        """Unit-length question embedding, shared with schema linking through the metadata cache"""
+        vector = np.asarray(MetadataVectorizer().embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, database_obj, question):
+        """
+        Find a cached answer for a question.
+
+        Args:
+            database_obj (ClientDatabase): Database the question is about
+            question (str): Natural language question
+
+        Returns:
+            dict or None: Copy of the cached answer with 'cache_hit' ({'level', 'similarity'}), or None
+        """
+        scope = (database_obj.id, database_obj.metadata_version)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(scope + (question,), now)
+            level, similarity = 'exact', 1.0
+            if entry is None:
+                key = self._normalized.get(scope + (normalize_question(question),))
+                entry = self._live(key, now) if key else None
+                level = 'normalized'
+            has_candidates = scope in self._scopes
+
+        if entry is None and has_candidates:
+            vector = self._embed(question)
+            signature = question_signature(database_obj, question)
+            with self._lock:
+                entry, similarity = self._nearest(scope, vector, signature, now)
+            level = 'semantic'
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits[level] += 1
+        return dict(entry['answer'], cache_hit={'level': level, 'similarity': round(similarity, 4)})
+
+    def store(self, database_obj, question, answer):
+        """Cache a successful answer for a question under the database's current metadata version"""
+        scope = (database_obj.id, database_obj.metadata_version)
+        key = scope + (question,)
+        normalized = normalize_question(question)
+        entry = {
+            'answer': dict(answer),
+            'normalized': normalized,
+            'vector': self._embed(question),
+            'signature': question_signature(database_obj, question),
+            'created': time.monotonic()
+        }
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._normalized[scope + (normalized,)] = key
+            members = self._scopes.setdefault(scope, {'keys': set(), 'matrix': None})
+            members['keys'].add(key)
+            members['matrix'] = None
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self):
+        """Hits per level, misses, hit rate, evictions and expirations"""
+        with self._lock:
+            hits = sum(self.hits.values())
+            lookups = hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': dict(self.hits),
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Return the process-wide answer cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
+
+
+def answer_cache_enabled(database_obj):
+    """Whether answers for this database may be served from and stored in the cache"""
+    return getattr(settings, 'ANSWER_CACHE_ENABLED', True) and database_obj.answer_cache_enabled
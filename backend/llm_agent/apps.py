@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class LlmAgentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'llm_agent'
+
+    def ready(self):
+        from databases.signals import metadata_version_bumped
+        from .signals import refresh_schema_prompt
+
+        # Schema prompts are rebuilt whenever the databases app changes metadata
+        metadata_version_bumped.connect(refresh_schema_prompt, dispatch_uid='llm_agent.refresh_schema_prompt')
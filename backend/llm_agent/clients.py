@@ -0,0 +1,94 @@
+import logging
+import threading
+import httpx
+from django.conf import settings
+from openai import OpenAI, DefaultHttpxClient
+
+try:
+    import h2  # noqa: F401 (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# OpenAI-compatible chat completion endpoints
+PROVIDER_BASE_URLS = {
+    'openai': None,
+    'groq': 'https://api.groq.com/openai/v1',
+}
+# Providers known to negotiate HTTP/2 over TLS
+HTTP2_PROVIDERS = {'openai', 'groq'}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _http_client(provider):
+    """Keep-alive connection pool for one provider, sized from settings"""
+    http2 = (
+        provider in HTTP2_PROVIDERS
+        and getattr(settings, 'LLM_HTTP2', True)
+        and HTTP2_AVAILABLE
+    )
+    return DefaultHttpxClient(
+        http2=http2,
+        timeout=getattr(settings, 'LLM_HTTP_TIMEOUT', 60),
+        limits=httpx.Limits(
+            max_connections=getattr(settings, 'LLM_HTTP_MAX_CONNECTIONS', 20),
+            max_keepalive_connections=getattr(settings, 'LLM_HTTP_MAX_KEEPALIVE', 10),
+            # Idle connections must outlive the gap between a user's generations to be reused
+            keepalive_expiry=getattr(settings, 'LLM_HTTP_KEEPALIVE_EXPIRY', 120)
+        )
+    )
+
+
+def get_llm_client(provider, api_key):
+    """
+    Return the process-wide client for an LLM provider, creating it on first use.
+
+    Clients are kept per provider and API key, so every call after the first
+    reuses pooled keep-alive connections (HTTP/2 when the h2 package is
+    installed) instead of paying for DNS, TCP and TLS again.
+
+    Args:
+        provider (str): 'openai', 'groq' or 'offline' (the local stand-in, see offline.py)
+        api_key (str): Provider API key
+
+    Returns:
+        OpenAI: Chat completions client for the provider
+    """
+    if provider == 'offline':
+        from .offline import get_offline_client
+        return get_offline_client()
+
+    key = (provider, api_key)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAI(
+                api_key=api_key,
+                base_url=PROVIDER_BASE_URLS[provider],
+                timeout=getattr(settings, 'LLM_HTTP_TIMEOUT', 60),
+                # Retries, pacing and backoff are handled by resilience.call_provider
+                max_retries=0,
+                http_client=_http_client(provider)
+            )
+            # A rotated key replaces the provider's old client; requests in flight keep their reference
+            for stale in [other for other in _clients if other[0] == provider]:
+                del _clients[stale]
+            _clients[key] = client
+            logger.info(f"Created pooled {provider} client")
+    return client
+
+
+def close_llm_clients():
+    """Close every pooled client and its connections"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,188 @@
+import logging
+from django.conf import settings
+from django.db.models import Count, Max
+from databases.cache import get_metadata_cache
+from databases.embeddings import get_embedding_backend, pack_vector, unpack_vector
+from databases.vector_index import VectorIndex
+from .models import SQLExample
+
+logger = logging.getLogger(__name__)
+
+
+def add_example(database_id, question, sql, source='session', query=None):
+    """
+    Store a question/SQL pair, replacing the SQL of an existing identical question.
+
+    Args:
+        database_id (int): Database the SQL runs against
+        question (str): Natural language question
+        sql (str): SQL answering the question
+        source (str): 'session' or 'import'
+        query (Query, optional): Session query the pair came from
+
+    Returns:
+        SQLExample: The stored example
+    """
+    backend = get_embedding_backend()
+    example, _ = SQLExample.objects.update_or_create(
+        database_id=database_id,
+        question=question.strip(),
+        defaults={
+            'sql': sql.strip(),
+            'source': source,
+            'query': query,
+            'embedding': pack_vector(backend.embed_one(question)),
+            'embedding_model': backend.model_id
+        }
+    )
+    return example
+
+
+def record_query_example(query):
+    """
+    Learn from a session query once it has succeeded with generated SQL, and forget it once it no longer does.
+
+    Called whenever a query is saved: an example stored from an earlier
+    version of the query is deleted when the query is marked failed or loses
+    its SQL, and replaced when its question or SQL changed.
+
+    Args:
+        query (Query): Session query; only stored when successful, with SQL and a database
+
+    Returns:
+        SQLExample or None: The stored example, if any
+    """
+    database_id = query.session.database_id
+    try:
+        stored = SQLExample.objects.filter(query=query)
+        if not (query.success and query.generated_sql and query.prompt and database_id):
+            # Known-bad SQL must not keep being offered as an example
+            stored.delete()
+            return None
+        stored.exclude(database_id=database_id, question=query.prompt.strip()).delete()
+        return add_example(database_id, query.prompt, query.generated_sql, source='session', query=query)
+    except Exception as e:
+        # Losing an example must never fail the user's request
+        logger.error(f"Failed to record SQL example from query {query.id}: {str(e)}")
+        return None
+
+
+def import_examples(database_id, pairs, source='import', batch_size=500):
+    """
+    Bulk import question/SQL pairs, updating the SQL of questions already stored.
+
+    Args:
+        database_id (int): Database the SQL runs against
+        pairs (iterable): (question, sql) tuples; for repeated questions the last SQL wins
+        source (str): 'import' or 'session'
+        batch_size (int): Pairs embedded and written per batch
+
+    Returns:
+        int: Number of distinct questions imported
+    """
+    backend = get_embedding_backend()
+    imported = 0
+    # Keyed by question: one INSERT ... ON CONFLICT cannot touch the same row twice
+    batch = {}
+
+    def flush():
+        questions = list(batch)
+        vectors = backend.embed(questions)
+        SQLExample.objects.bulk_create(
+            [
+                SQLExample(
+                    database_id=database_id, question=question, sql=batch[question], source=source,
+                    embedding=pack_vector(vector), embedding_model=backend.model_id
+                )
+                for question, vector in zip(questions, vectors)
+            ],
+            update_conflicts=True,
+            unique_fields=['database', 'question'],
+            update_fields=['sql', 'source', 'embedding', 'embedding_model', 'updated_at']
+        )
+        return len(questions)
+
+    for question, sql in pairs:
+        if not question or not sql:
+            continue
+        batch[question.strip()] = sql.strip()
+        if len(batch) >= batch_size:
+            imported += flush()
+            batch = {}
+    if batch:
+        imported += flush()
+    return imported
+
+
+def get_example_index(database_id):
+    """
+    Return the example index for a database from the process-wide metadata cache, refreshed from SQLExample rows.
+
+    Only examples updated since the last refresh are re-read; deleted
+    examples are dropped by primary key.
+
+    Args:
+        database_id (int): Database ID
+
+    Returns:
+        VectorIndex: Index of question embeddings whose entries carry question and sql
+    """
+    backend = get_embedding_backend()
+    examples = SQLExample.objects.filter(database_id=database_id)
+    signature = examples.aggregate(count=Count('id'), latest=Max('updated_at'))
+
+    def build():
+        index = VectorIndex(backend.dimensions, backend.model_id)
+        # Example count and latest update when the index was last refreshed; examples have no metadata version
+        index.example_signature = None
+        return index
+
+    cache = get_metadata_cache()
+    key = ('sql_example_index', backend.model_id)
+    index = cache.get_or_build(database_id, key, build)
+
+    if index.example_signature == signature:
+        return index
+
+    with index.lock:
+        if index.example_signature != signature:
+            changed = examples
+            if index.watermark is not None:
+                changed = examples.filter(updated_at__gt=index.watermark)
+                current_ids = set(examples.values_list('id', flat=True))
+                index.remove({key for key in index._state[1] if key not in current_ids})
+
+            items = []
+            for example in changed:
+                vector = unpack_vector(example.embedding)
+                if vector is None or example.embedding_model != backend.model_id:
+                    vector = backend.embed_one(example.question)
+                items.append((example.id, vector, {'question': example.question, 'sql': example.sql}))
+            index.upsert(items)
+            index.watermark = signature['latest']
+            index.example_signature = signature
+            # Re-cache so the memory budget sees the new size
+            cache.set(database_id, key, index)
+    return index
+
+
+def find_similar_examples(question, database_id, top_k=None, min_score=None):
+    """
+    Return stored examples for a database whose questions resemble this one.
+
+    Args:
+        question (str): Natural language question
+        database_id (int): Database ID
+        top_k (int, optional): Maximum number of examples
+        min_score (float, optional): Minimum cosine similarity of the questions
+
+    Returns:
+        list: Dicts with question, sql and score, best first
+    """
+    top_k = top_k or getattr(settings, 'SQL_EXAMPLES_TOP_K', 3)
+    if min_score is None:
+        min_score = getattr(settings, 'SQL_EXAMPLES_MIN_SCORE', 0.3)
+    index = get_example_index(database_id)
+    if not len(index):
+        return []
+    return index.search(get_embedding_backend().embed_one(question), k=top_k, min_score=min_score)
@@ -0,0 +1,125 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import override_settings
+from databases.cache import get_metadata_cache
+from .resilience import provider_states
+from .retrieval_benchmark import load_dataset, install_schema, percentile
+from .router import get_llm_router
+from .services import nl_to_sql, nl_to_sql_stream
+from .single_flight import get_llm_single_flight
+
+LOAD_TEST_USERNAME = 'llm-load-test'
+
+
+def _generate(database_id, question, user, stream):
+    """One nl_to_sql request, returning (result dict, seconds, seconds to the first SQL delta)"""
+    started = time.perf_counter()
+    first_delta = None
+    try:
+        if not stream:
+            result = nl_to_sql(question, database_id, user=user)
+            return result, time.perf_counter() - started, None
+        result = {'success': False, 'error_type': 'stream_ended'}
+        for event, data in nl_to_sql_stream(question, database_id, user=user):
+            if event == 'sql' and first_delta is None:
+                first_delta = time.perf_counter() - started
+            elif event == 'done':
+                result = data
+            elif event == 'error':
+                result = dict(data, success=False)
+        return result, time.perf_counter() - started, first_delta
+    finally:
+        connection.close()
+
+
+def run_load_test(cases, requests, concurrency, user, stream=False):
+    """
+    Send nl_to_sql requests from concurrent workers and summarize latency and outcomes.
+
+    Args:
+        cases (list): (database id, question) pairs, cycled through in order
+        requests (int): Number of requests to send
+        concurrency (int): Requests in flight at once
+        user (User): User the requests (and their token usage) belong to
+        stream (bool): Use the streaming pipeline and also measure time to the first SQL delta
+
+    Returns:
+        dict: Throughput, latency percentiles (ms), success rate, error types and the LLM layer's counters
+    """
+    work = [cases[i % len(cases)] for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load-test') as executor:
+        outcomes = list(executor.map(lambda case: _generate(case[0], case[1], user, stream), work))
+    elapsed = time.perf_counter() - started
+
+    latencies = [seconds * 1000 for _, seconds, _ in outcomes]
+    first_deltas = [seconds * 1000 for _, _, seconds in outcomes if seconds is not None]
+    errors = Counter(result.get('error_type', 'unknown') for result, _, _ in outcomes if not result.get('success'))
+    report = {
+        'requests': requests,
+        'concurrency': concurrency,
+        'throughput_rps': requests / elapsed if elapsed else 0.0,
+        'success_rate': 1 - sum(errors.values()) / requests,
+        'p50_ms': percentile(latencies, 0.5),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'errors': dict(errors),
+        'single_flight': get_llm_single_flight().stats(),
+        'providers': provider_states(),
+        'routes': get_llm_router().stats(),
+    }
+    if first_deltas:
+        report['first_sql_p50_ms'] = percentile(first_deltas, 0.5)
+        report['first_sql_p95_ms'] = percentile(first_deltas, 0.95)
+    return report
+
+
+def run_offline_load_test(requests=200, concurrency=8, stream=False, **offline_settings):
+    """
+    Load-test the whole nl_to_sql pipeline against the offline LLM stand-in and the fixture schemas.
+
+    The fixture metadata is committed so worker threads can read it, then
+    deleted again. Offline provider settings (e.g. LLM_OFFLINE_LATENCY_MEDIAN_MS,
+    LLM_OFFLINE_ERROR_RATE) can be overridden as keyword arguments; the answer
+    cache is off so every request reaches the provider.
+    """
+    overrides = dict(LLM_OFFLINE=True, ANSWER_CACHE_ENABLED=False, EMBEDDING_STORE_DIR='', **offline_settings)
+    with override_settings(**overrides):
+        owner = User.objects.create_user(username=LOAD_TEST_USERNAME)
+        databases = []
+        try:
+            cases = []
+            for schema in load_dataset()['schemas']:
+                database = install_schema(schema, owner)
+                databases.append(database)
+                cases.extend((database.id, case['question']) for case in schema['questions'])
+            return run_load_test(cases, requests, concurrency, owner, stream=stream)
+        finally:
+            for database in databases:
+                get_metadata_cache().invalidate(database.id)
+            # Deleting the owner cascades to the fixture databases and recorded token usage
+            owner.delete()
+
+
+def format_load_report(report):
+    """Render a load test report as text"""
+    lines = [
+        f"{report['requests']} requests at concurrency {report['concurrency']}: "
+        f"{report['throughput_rps']:.1f} req/s, {report['success_rate']:.1%} succeeded",
+        f"latency p50 {report['p50_ms']:.0f}ms  p95 {report['p95_ms']:.0f}ms  p99 {report['p99_ms']:.0f}ms",
+    ]
+    if 'first_sql_p50_ms' in report:
+        lines.append(f"first SQL delta p50 {report['first_sql_p50_ms']:.0f}ms  p95 {report['first_sql_p95_ms']:.0f}ms")
+    if report['errors']:
+        lines.append("errors: " + ", ".join(f"{error_type} {count}" for error_type, count in report['errors'].items()))
+    flight = report['single_flight']
+    lines.append(f"upstream calls {flight['calls']}, deduplicated {flight['deduplicated']}")
+    for provider, state in report['providers'].items():
+        lines.append(
+            f"{provider}: retries {state['retries']}, rate limited {state['rate_limited']}, "
+            f"rejected {state['rejected']}, circuit {state['circuit']['state']}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from llm_agent.retrieval_benchmark import (
+    STRATEGIES, run_and_rollback, load_baseline, regressions, format_report
+)
+
+
+class Command(BaseCommand):
+    help = "Measure schema retrieval recall, MRR and latency on the bundled fixture schemas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--strategy', action='append', choices=sorted(STRATEGIES),
+                            help="Strategy to run (repeatable); all by default")
+        parser.add_argument('--check', action='store_true',
+                            help="Fail when a tracked number is worse than the baseline")
+
+    def handle(self, *args, **options):
+        report = run_and_rollback(strategies=options['strategy'])
+        self.stdout.write(format_report(report))
+
+        if options['check']:
+            failures = regressions(report, load_baseline())
+            if failures:
+                raise CommandError("Retrieval regressed:\n" + "\n".join(failures))
+            self.stdout.write(self.style.SUCCESS("No tracked number regressed"))
@@ -0,0 +1,47 @@
+import csv
+import json
+from django.core.management.base import BaseCommand, CommandError
+from databases.models import ClientDatabase
+from session.models import Query
+from llm_agent.examples import import_examples
+
+
+def read_pairs(path):
+    """Yield (question, sql) pairs from a .json, .jsonl or .csv file with question and sql fields"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            rows = csv.DictReader(f)
+        elif path.endswith('.jsonl'):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = json.load(f)
+        for row in rows:
+            yield row.get('question'), row.get('sql')
+
+
+class Command(BaseCommand):
+    help = "Import question/SQL pairs used as few-shot examples for a database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('database_id', type=int, help="Database the SQL runs against")
+        parser.add_argument('--file', help="Dataset (.json, .jsonl or .csv) with question and sql fields")
+        parser.add_argument('--from-sessions', action='store_true',
+                            help="Import successful session queries against this database")
+
+    def handle(self, *args, **options):
+        database_id = options['database_id']
+        if not ClientDatabase.objects.filter(id=database_id).exists():
+            raise CommandError(f"Database with ID {database_id} does not exist")
+        if not options['file'] and not options['from_sessions']:
+            raise CommandError("Pass --file, --from-sessions or both")
+
+        if options['file']:
+            imported = import_examples(database_id, read_pairs(options['file']))
+            self.stdout.write(self.style.SUCCESS(f"Imported {imported} example(s) from {options['file']}"))
+
+        if options['from_sessions']:
+            queries = Query.objects.filter(
+                session__database_id=database_id, success=True, generated_sql__isnull=False
+            ).exclude(generated_sql='').order_by('created_at').values_list('prompt', 'generated_sql')
+            imported = import_examples(database_id, queries.iterator(), source='session')
+            self.stdout.write(self.style.SUCCESS(f"Imported {imported} example(s) from session queries"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from llm_agent.load_test import run_offline_load_test, format_load_report
+
+
+class Command(BaseCommand):
+    help = "Load-test SQL generation end to end against the offline LLM stand-in (no network needed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests to send")
+        parser.add_argument('--concurrency', type=int, default=8, help="Requests in flight at once")
+        parser.add_argument('--stream', action='store_true', help="Use the streaming (SSE) pipeline")
+        parser.add_argument('--latency-ms', type=float, help="Median offline completion latency")
+        parser.add_argument('--latency-sigma', type=float, help="Log-normal spread of the latency")
+        parser.add_argument('--error-rate', type=float, help="Fraction of completions failing with a server error")
+        parser.add_argument('--rate-limit-rate', type=float, help="Fraction of completions answered with 429")
+        parser.add_argument('--seed', type=int, help="Seed of the offline provider's randomness")
+
+    def handle(self, *args, **options):
+        overrides = {
+            setting: options[option]
+            for option, setting in [
+                ('latency_ms', 'LLM_OFFLINE_LATENCY_MEDIAN_MS'),
+                ('latency_sigma', 'LLM_OFFLINE_LATENCY_SIGMA'),
+                ('error_rate', 'LLM_OFFLINE_ERROR_RATE'),
+                ('rate_limit_rate', 'LLM_OFFLINE_RATE_LIMIT_RATE'),
+                ('seed', 'LLM_OFFLINE_SEED'),
+            ]
+            if options[option] is not None
+        }
+        report = run_offline_load_test(
+            requests=options['requests'],
+            concurrency=options['concurrency'],
+            stream=options['stream'],
+            **overrides
+        )
+        self.stdout.write(format_load_report(report))
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from databases.cache import get_metadata_cache
+from databases.models import ClientDatabase
+from llm_agent.retrieval_benchmark import load_dataset, install_schema
+from llm_agent.schema_encoding import compare_encodings, tokenizer_name
+from llm_agent.schema_linking import prune_schema
+from llm_agent.services import build_schema_representation
+
+REPORT_USERNAME = 'schema-token-report'
+
+
+class Command(BaseCommand):
+    help = "Compare prompt tokens of the JSON and compact schema encodings on the fixture schemas or given databases"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', type=int, action='append', help="Report on this database (repeatable)")
+
+    def report(self, label, schema):
+        stats = compare_encodings(schema)
+        self.stdout.write(
+            f"{label}: {stats['tables']} tables, {stats['columns']} columns, "
+            f"json {stats['json_tokens']} tokens, compact {stats['compact_tokens']} tokens "
+            f"({stats['savings']:.1%} saved)"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Tokenizer: {tokenizer_name()}")
+        if options['database']:
+            for database_id in options['database']:
+                if not ClientDatabase.objects.filter(id=database_id).exists():
+                    raise CommandError(f"Database {database_id} does not exist")
+                self.report(f"database {database_id} (full schema)", build_schema_representation(database_id))
+            return
+
+        with override_settings(EMBEDDING_STORE_DIR=''):
+            owner = User.objects.create_user(username=REPORT_USERNAME)
+            try:
+                for fixture in load_dataset()['schemas']:
+                    database = install_schema(fixture, owner)
+                    try:
+                        self.report(f"{fixture['name']} (full schema)", build_schema_representation(database.id))
+                        # The pruned schemas the fixture questions would send, taken together
+                        pruned = [
+                            table_info
+                            for case in fixture['questions']
+                            for table_info in prune_schema(case['question'], database)
+                        ]
+                        self.report(f"{fixture['name']} (prompts for {len(fixture['questions'])} questions)", pruned)
+                    finally:
+                        get_metadata_cache().invalidate(database.id)
+            finally:
+                # Deleting the owner cascades to the fixture databases
+                owner.delete()
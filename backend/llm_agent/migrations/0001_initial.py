@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('databases', '0007_clientdatabase_metadata_version'),
+        ('session', '0004_query_error_query_error_type_query_generated_sql'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SQLExample',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('sql', models.TextField()),
+                ('source', models.CharField(choices=[('session', 'Session Query'), ('import', 'Imported Dataset')], default='session', max_length=20)),
+                ('embedding', models.BinaryField(blank=True, null=True)),
+                ('embedding_model', models.CharField(blank=True, max_length=255, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('database', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sql_examples', to='databases.clientdatabase')),
+                ('query', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sql_examples', to='session.query')),
+            ],
+            options={
+                'unique_together': {('database', 'question')},
+            },
+        ),
+    ]
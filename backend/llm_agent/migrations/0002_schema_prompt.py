@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0010_clientdatabase_answer_cache_enabled'),
+        ('llm_agent', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchemaPrompt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metadata_version', models.PositiveIntegerField()),
+                ('schema_format', models.CharField(max_length=20)),
+                ('text', models.TextField(blank=True)),
+                ('tokens', models.PositiveIntegerField(default=0)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('database', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='schema_prompt', to='databases.clientdatabase')),
+            ],
+        ),
+    ]
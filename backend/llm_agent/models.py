@@ -1,3 +1,41 @@
 from django.db import models
+from databases.models import ClientDatabase
 
-# Create your models here.
+EXAMPLE_SOURCES = [
+    ('session', 'Session Query'),
+    ('import', 'Imported Dataset'),
+]
+
+class SQLExample(models.Model):
+    """Question/SQL pair used as a few-shot example for a database"""
+    database = models.ForeignKey(ClientDatabase, on_delete=models.CASCADE, related_name='sql_examples')
+    question = models.TextField()
+    sql = models.TextField()
+    source = models.CharField(max_length=20, choices=EXAMPLE_SOURCES, default='session')
+    query = models.ForeignKey('session.Query', on_delete=models.SET_NULL, null=True, blank=True, related_name='sql_examples')
+    embedding = models.BinaryField(null=True, blank=True)
+    embedding_model = models.CharField(max_length=255, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('database', 'question')
+    
+    def __str__(self):
+        return f"{self.database.name}: {self.question[:50]}"
+
+
+class SchemaPrompt(models.Model):
+    """Schema section of a database's SQL generation prompts, built once per metadata version"""
+    database = models.OneToOneField(ClientDatabase, on_delete=models.CASCADE, related_name='schema_prompt')
+    metadata_version = models.PositiveIntegerField()
+    schema_format = models.CharField(max_length=20)
+    # Empty when the whole schema is over SCHEMA_PREFIX_MAX_TOKENS (at most SCHEMA_PROMPT_TOKEN_BUDGET)
+    # and prompts are pruned per question
+    text = models.TextField(blank=True)
+    tokens = models.PositiveIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.database.name} v{self.metadata_version} ({self.tokens} tokens)"
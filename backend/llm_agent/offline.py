@@ -0,0 +1,318 @@
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from pathlib import Path
+import httpx
+import openai
+from django.conf import settings
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_chunk import Choice as ChunkChoice, ChoiceDelta
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from .schema_encoding import decode_schema
+
+logger = logging.getLogger(__name__)
+
+# Markers of the prompts built by services.py
+SQL_PROMPT_MARKER = 'Convert this natural language question to a valid SQL query:'
+SCHEMA_BLOCK = re.compile(r'Given the following database schema:\n```\n(.*?)\n```', re.DOTALL)
+QUESTION = re.compile(re.escape(SQL_PROMPT_MARKER) + r'\n"(.*?)"\n', re.DOTALL)
+VALUE_HINT = re.compile(r"""^- "(?P<phrase>.+?)": (?P<schema>[^.\s]+)\.(?P<table>[^.\s]+)\.(?P<column>[^.\s]+) = (?P<literal>'.*')$""", re.MULTILINE)
+JOIN_LINE = re.compile(r'^- (\S+)\.(\w+)\.(\w+) = (\S+)\.(\w+)\.(\w+)$', re.MULTILINE)
+DESCRIPTION_PROMPT = re.compile(r"description for a database (table|column) named '([^']*)'")
+COUNT_WORDS = re.compile(r'\b(how many|count|number of)\b')
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def prompt_hash(prompt):
+    """Key of a prompt in recordings"""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+def _words(text):
+    """Lowercase words of a text with naive singulars added"""
+    words = set(WORD.findall(text.lower()))
+    return words | {word[:-1] for word in words if word.endswith('s') and len(word) > 3}
+
+
+def canned_sql(prompt):
+    """
+    Plausible SQL for an nl_to_sql prompt, built from the schema, value hints and joins it contains.
+
+    The table sharing most words with the question is queried (ties go to the
+    earlier, more relevant table); columns named in the question are selected,
+    value hints become equality filters and a hinted column on another table
+    is reached through the listed foreign key joins.
+
+    Returns:
+        dict: {'sql_query', 'explanation'}
+    """
+    schema_match = SCHEMA_BLOCK.search(prompt)
+    tables = decode_schema(schema_match.group(1)) if schema_match else []
+    question_match = QUESTION.search(prompt)
+    question = question_match.group(1) if question_match else ''
+    if not tables:
+        return {'sql_query': 'SELECT 1', 'explanation': 'Offline stand-in: no schema was provided.'}
+
+    words = _words(question)
+    table = max(
+        tables,
+        key=lambda candidate: (len(_words(candidate['table_name'].replace('_', ' ')) & words), -tables.index(candidate))
+    )
+    name = f"{table['schema_name']}.{table['table_name']}"
+
+    joins = []
+    filters = []
+    for hint in VALUE_HINT.finditer(prompt):
+        hinted = f"{hint['schema']}.{hint['table']}"
+        if hinted != name:
+            join = next((
+                line for line in JOIN_LINE.finditer(prompt)
+                if {f"{line[1]}.{line[2]}", f"{line[4]}.{line[5]}"} == {name, hinted}
+            ), None)
+            if join is None:
+                continue
+            condition = f"{join[1]}.{join[2]}.{join[3]} = {join[4]}.{join[5]}.{join[6]}"
+            if (hinted, condition) not in joins:
+                joins.append((hinted, condition))
+        filters.append(f"{hinted}.{hint['column']} = {hint['literal']}")
+
+    counting = bool(COUNT_WORDS.search(question.lower()))
+    columns = [
+        column['name'] for column in table['columns']
+        if column['name'] != 'id' and _words(column['name'].replace('_', ' ')) & words
+    ]
+    if counting:
+        select = 'COUNT(*)'
+    elif columns:
+        select = ', '.join(f"{name}.{column}" if joins else column for column in columns)
+    else:
+        select = '*'
+
+    sql = f"SELECT {select} FROM {name}"
+    for hinted, condition in joins:
+        sql += f" JOIN {hinted} ON {condition}"
+    if filters:
+        sql += " WHERE " + " AND ".join(filters)
+    if not counting:
+        sql += " LIMIT 100"
+
+    explanation = f"Offline stand-in: {'counts rows of' if counting else 'selects ' + (', '.join(columns) or 'all columns') + ' from'} {name}"
+    if filters:
+        explanation += f" where {' and '.join(filters)}"
+    return {'sql_query': sql, 'explanation': explanation + '.'}
+
+
+def canned_response(prompt, model):
+    """Deterministic answer to a prompt in the format the calling service expects"""
+    if SQL_PROMPT_MARKER in prompt:
+        content = json.dumps(canned_sql(prompt), indent=2)
+        if 'r1' in model.lower() or 'deepseek' in model.lower():
+            # Exercise the reasoning-block handling of reasoning models
+            content = f"<think>\nOffline stand-in reasoning for {model}.\n</think>\n\n{content}"
+        return content
+    description = DESCRIPTION_PROMPT.search(prompt)
+    if description:
+        kind, name = description.groups()
+        readable = name.replace('_', ' ')
+        return f"The {name} {kind} holds {readable} data. This description was produced by the offline stand-in provider."
+    return "Offline stand-in response."
+
+
+class Recordings:
+    """Recorded responses by prompt hash, loaded from a JSON lines file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.responses = {}
+        if not path or not Path(path).exists():
+            return
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.responses[entry['prompt_sha256']] = entry
+        logger.info(f"Loaded {len(self.responses)} recorded LLM responses from {path}")
+
+
+_record_lock = threading.Lock()
+
+
+def record_response(prompt, model, content, usage):
+    """Append a real provider response to LLM_RECORD_RESPONSES_TO for later offline replay"""
+    path = getattr(settings, 'LLM_RECORD_RESPONSES_TO', '')
+    if not path:
+        return
+    entry = {
+        'prompt_sha256': prompt_hash(prompt),
+        'model': model,
+        'content': content,
+        'prompt_tokens': usage.prompt_tokens if usage else None,
+        'completion_tokens': usage.completion_tokens if usage else None,
+    }
+    with _record_lock, open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + '\n')
+
+
+class OfflineStream:
+    """Chunks of an offline completion, paced like a provider stream; closing it stops the stream"""
+
+    def __init__(self, chunks, first_delay, delay):
+        self._chunks = chunks
+        self._first_delay = first_delay
+        self._delay = delay
+        self._closed = threading.Event()
+
+    def __iter__(self):
+        for position, chunk in enumerate(self._chunks):
+            if self._closed.wait(self._first_delay if position == 0 else self._delay):
+                return
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._closed.set()
+
+
+class OfflineChat:
+    """chat namespace of the offline client"""
+
+    def __init__(self, client):
+        self.completions = OfflineCompletions(client)
+
+
+class OfflineCompletions:
+    """chat.completions of the offline client (see OfflineLLMClient)"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, *, model, messages, max_tokens=None, temperature=None, stream=False, stream_options=None, **kwargs):
+        return self._client.complete(model, messages, max_tokens, stream, stream_options)
+
+
+class OfflineLLMClient:
+    """
+    Stand-in for an OpenAI-compatible client that never touches the network.
+
+    A prompt gets its recorded response when LLM_OFFLINE_RECORDINGS has one,
+    otherwise a canned, schema-aware answer. Latency follows a log-normal
+    distribution around LLM_OFFLINE_LATENCY_MEDIAN_MS; rate limits (429) and
+    server errors are injected at the configured rates, and token counts are
+    derived from text length (or taken from the recording). Randomness is
+    seeded by LLM_OFFLINE_SEED, the prompt and how often it was asked, so a
+    run replays identically.
+    """
+
+    def __init__(self):
+        self.chat = OfflineChat(self)
+        self._recordings = None
+        self._asked = {}
+        self._lock = threading.Lock()
+
+    @property
+    def recordings(self):
+        """Recordings of LLM_OFFLINE_RECORDINGS, reloaded when the setting changes"""
+        path = getattr(settings, 'LLM_OFFLINE_RECORDINGS', '')
+        if self._recordings is None or self._recordings.path != path:
+            self._recordings = Recordings(path)
+        return self._recordings
+
+    def _rng(self, digest):
+        """Random source for the next request with this prompt"""
+        with self._lock:
+            count = self._asked.get(digest, 0)
+            self._asked[digest] = count + 1
+        return random.Random(f"{getattr(settings, 'LLM_OFFLINE_SEED', 0)}:{digest}:{count}")
+
+    def _error(self, status_code, message, headers=None):
+        """The SDK exception a provider response with this status would raise"""
+        request = httpx.Request('POST', 'http://offline.invalid/v1/chat/completions')
+        response = httpx.Response(status_code, headers=headers or {}, request=request)
+        error_class = openai.RateLimitError if status_code == 429 else openai.InternalServerError
+        return error_class(message, response=response, body=None)
+
+    def complete(self, model, messages, max_tokens, stream, stream_options):
+        """A ChatCompletion, or an OfflineStream of ChatCompletionChunks, for the messages"""
+        prompt = '\n'.join(message['content'] for message in messages)
+        digest = prompt_hash(prompt)
+        rng = self._rng(digest)
+
+        roll = rng.random()
+        rate_limit_rate = getattr(settings, 'LLM_OFFLINE_RATE_LIMIT_RATE', 0.0)
+        if roll < rate_limit_rate:
+            raise self._error(429, 'Offline stand-in rate limit', {'retry-after': '1'})
+        if roll < rate_limit_rate + getattr(settings, 'LLM_OFFLINE_ERROR_RATE', 0.0):
+            raise self._error(503, 'Offline stand-in server error')
+
+        recorded = self.recordings.responses.get(digest)
+        content = recorded['content'] if recorded else canned_response(prompt, model)
+        chars_per_token = getattr(settings, 'LLM_OFFLINE_CHARS_PER_TOKEN', 4)
+        if max_tokens:
+            content = content[:max_tokens * chars_per_token]
+        prompt_tokens = (recorded or {}).get('prompt_tokens') or math.ceil(len(prompt) / chars_per_token)
+        completion_tokens = (recorded or {}).get('completion_tokens') or math.ceil(len(content) / chars_per_token)
+        usage = CompletionUsage(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens
+        )
+
+        median = getattr(settings, 'LLM_OFFLINE_LATENCY_MEDIAN_MS', 800) / 1000
+        latency = rng.lognormvariate(math.log(median), getattr(settings, 'LLM_OFFLINE_LATENCY_SIGMA', 0.5)) if median > 0 else 0.0
+        first_token = latency * getattr(settings, 'LLM_OFFLINE_TTFT_FRACTION', 0.3)
+        completion_id = f"offline-{digest[:12]}"
+        created = int(time.time())
+
+        if not stream:
+            time.sleep(latency)
+            return ChatCompletion(
+                id=completion_id, object='chat.completion', created=created, model=model, usage=usage,
+                choices=[Choice(
+                    index=0, finish_reason='stop',
+                    message=ChatCompletionMessage(role='assistant', content=content)
+                )]
+            )
+
+        pieces = [content[i:i + chars_per_token] for i in range(0, len(content), chars_per_token)] or ['']
+        chunks = [
+            ChatCompletionChunk(
+                id=completion_id, object='chat.completion.chunk', created=created, model=model,
+                choices=[ChunkChoice(index=0, delta=ChoiceDelta(content=piece), finish_reason=None)]
+            )
+            for piece in pieces
+        ]
+        if (stream_options or {}).get('include_usage'):
+            chunks.append(ChatCompletionChunk(
+                id=completion_id, object='chat.completion.chunk', created=created, model=model,
+                choices=[], usage=usage
+            ))
+        return OfflineStream(chunks, first_token, (latency - first_token) / len(pieces))
+
+    def close(self):
+        pass
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_offline_client():
+    """Return the process-wide offline client"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OfflineLLMClient()
+    return _client
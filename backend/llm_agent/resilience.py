@@ -0,0 +1,290 @@
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import openai
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Published request limits (requests per minute) of the default tiers
+DEFAULT_REQUESTS_PER_MINUTE = {
+    'openai': 500,
+    'groq': 30,
+    'offline': 600000,
+}
+
+
+class ProviderUnavailable(Exception):
+    """The provider's circuit is open after repeated failures"""
+    error_type = 'provider_unavailable'
+
+
+class RateLimitExceeded(Exception):
+    """No request slot for the provider became free within the queue timeout"""
+    error_type = 'rate_limited'
+
+
+class TokenBucket:
+    """
+    Pace requests to a rate, allowing short bursts up to capacity.
+
+    Callers wait for a token instead of failing, so bursts queue up; a
+    rate-limit response from the provider pauses the bucket for everyone.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.waiting = 0
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout):
+        """Take a token, waiting up to timeout seconds; returns False when none became free"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now >= self.paused_until and self.tokens >= 1:
+                        self.tokens -= 1
+                        return True
+                    delay = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+                    if now + delay > deadline:
+                        return False
+                    self._condition.wait(delay)
+            finally:
+                self.waiting -= 1
+
+    def pause(self, seconds):
+        """Hold every request back for the given number of seconds"""
+        with self._condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def state(self):
+        """Tokens available, requests waiting and remaining pause"""
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                'tokens': round(self.tokens, 2),
+                'capacity': self.capacity,
+                'rate_per_second': round(self.rate, 3),
+                'waiting': self.waiting,
+                'paused_for': round(max(0.0, self.paused_until - now), 2)
+            }
+
+
+class CircuitBreaker:
+    """
+    Stop calling a failing provider for a while.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast; after reset_timeout one trial call is let through (half open)
+    and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go through now"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            now = time.monotonic()
+            if self.state == 'open' and now - self._opened_at < self.reset_timeout:
+                return False
+            # One trial at a time; a trial that never reported back is replaced after reset_timeout
+            if self.state == 'half_open' and now - self._trial_at < self.reset_timeout:
+                return False
+            self.state = 'half_open'
+            self._trial_at = now
+            return True
+
+    def record_success(self):
+        """The provider answered; close the circuit"""
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        """The provider failed; open the circuit at the threshold or after a failed trial"""
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+    def snapshot(self):
+        """State, consecutive failures and seconds until the next trial"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'retry_in': round(max(0.0, self._opened_at + self.reset_timeout - time.monotonic()), 2)
+                if self.state == 'open' else 0.0
+            }
+
+
+class ProviderGuard:
+    """Pacing, circuit breaker and retry counters for one LLM provider in this process"""
+
+    def __init__(self, provider):
+        requests_per_minute = getattr(settings, 'LLM_REQUESTS_PER_MINUTE', {}).get(
+            provider, DEFAULT_REQUESTS_PER_MINUTE.get(provider, 60)
+        )
+        self.provider = provider
+        self.bucket = TokenBucket(
+            rate=requests_per_minute / 60.0,
+            capacity=getattr(settings, 'LLM_RATE_LIMIT_BURST', 5)
+        )
+        self.breaker = CircuitBreaker(
+            failure_threshold=getattr(settings, 'LLM_CIRCUIT_FAILURE_THRESHOLD', 5),
+            reset_timeout=getattr(settings, 'LLM_CIRCUIT_RESET_TIMEOUT', 30)
+        )
+        self.retries = 0
+        self.rate_limited = 0
+        self.rejected = 0
+
+    def state(self):
+        """Limiter, circuit and counters"""
+        return {
+            'limiter': self.bucket.state(),
+            'circuit': self.breaker.snapshot(),
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+            'rejected': self.rejected
+        }
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_provider_guard(provider):
+    """Return the process-wide guard of a provider, creating it on first use"""
+    guard = _guards.get(provider)
+    if guard is None:
+        with _guards_lock:
+            guard = _guards.setdefault(provider, ProviderGuard(provider))
+    return guard
+
+
+def provider_states():
+    """Limiter, circuit and retry state of every provider used so far"""
+    return {provider: guard.state() for provider, guard in list(_guards.items())}
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait (Retry-After / retry-after-ms), or None"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for a 0-based retry attempt"""
+    base = getattr(settings, 'LLM_RETRY_BASE_DELAY', 0.5)
+    cap = getattr(settings, 'LLM_RETRY_MAX_DELAY', 20)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def call_provider(provider, request):
+    """
+    Make a provider request paced by its rate limit, retried and behind its circuit breaker.
+
+    The request waits for a slot of the provider's token bucket (up to
+    LLM_QUEUE_TIMEOUT seconds). Rate limits (429), server errors and
+    connection failures are retried up to LLM_MAX_RETRIES times with
+    jittered exponential backoff, waiting at least as long as Retry-After
+    asks; a 429 pauses the whole bucket. Server and connection failures
+    count towards opening the circuit, other errors are raised at once.
+
+    Args:
+        provider (str): 'openai' or 'groq'
+        request (callable): Makes the request; called once per attempt
+
+    Returns:
+        The request's return value
+
+    Raises:
+        RateLimitExceeded: No request slot became free in time
+        ProviderUnavailable: The provider's circuit is open
+        openai.APIError: The last error once retries are exhausted, or a non-retryable error
+    """
+    guard = get_provider_guard(provider)
+    queue_timeout = getattr(settings, 'LLM_QUEUE_TIMEOUT', 30)
+    max_retries = getattr(settings, 'LLM_MAX_RETRIES', 3)
+
+    for attempt in range(max_retries + 1):
+        if not guard.bucket.acquire(queue_timeout):
+            guard.rejected += 1
+            raise RateLimitExceeded(f"Too many requests to {provider}; no slot became free within {queue_timeout}s.")
+        if not guard.breaker.allow():
+            guard.rejected += 1
+            raise ProviderUnavailable(f"{provider} is failing; requests are paused for a few seconds.")
+
+        try:
+            result = request()
+        except openai.RateLimitError as e:
+            # The provider is up, just busy: hold everyone back rather than count a failure
+            guard.breaker.record_success()
+            guard.rate_limited += 1
+            delay = max(backoff_delay(attempt), retry_after(e) or 0)
+            if attempt == max_retries or delay > queue_timeout:
+                raise
+            guard.bucket.pause(delay)
+        except (openai.InternalServerError, openai.APIConnectionError) as e:
+            guard.breaker.record_failure()
+            if attempt == max_retries:
+                raise
+            delay = max(backoff_delay(attempt), retry_after(e) or 0)
+            if delay > queue_timeout:
+                raise
+            time.sleep(delay)
+        except openai.APIStatusError:
+            # Client errors (bad request, auth) will not improve on retry
+            guard.breaker.record_success()
+            raise
+        else:
+            guard.breaker.record_success()
+            return result
+
+        guard.retries += 1
+        logger.warning(f"Retrying {provider} request (attempt {attempt + 2} of {max_retries + 1})")
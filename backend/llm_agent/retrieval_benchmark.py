@@ -0,0 +1,301 @@
+import json
+import math
+import time
+from pathlib import Path
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test.utils import override_settings
+from databases.cache import get_metadata_cache
+from databases.hybrid_search import hybrid_search
+from databases.keyword_index import search_keywords
+from databases.models import ClientDatabase, TableMetadata, ColumnMetadata, RelationshipMetadata
+from databases.services import MetadataExtractor, MetadataVectorizer
+from databases.trigram_index import search_fuzzy
+from .schema_linking import retrieve_relevant_tables, prune_schema
+
+BENCHMARK_DIR = Path(__file__).resolve().parent / 'benchmarks'
+DATASET_PATH = BENCHMARK_DIR / 'retrieval.json'
+BASELINE_PATH = BENCHMARK_DIR / 'retrieval_baseline.json'
+
+# Hits requested from each search strategy
+SEARCH_LIMIT = 20
+RECALL_AT = (5, 10)
+
+# Distractor tables are named from these words, so they compete with real tables on common terms
+DISTRACTOR_PREFIXES = ['stg', 'tmp', 'archive', 'legacy', 'etl', 'report', 'audit', 'backup']
+DISTRACTOR_SUBJECTS = [
+    'events', 'sessions', 'metrics', 'logs', 'imports', 'exports', 'jobs', 'snapshots',
+    'queue', 'records', 'batches', 'accounts', 'items', 'notes', 'uploads', 'tasks',
+]
+DISTRACTOR_COLUMNS = [
+    ('id', 'integer'), ('name', 'character varying'), ('status', 'character varying'),
+    ('amount', 'numeric'), ('payload', 'jsonb'), ('created_at', 'timestamp without time zone'),
+    ('updated_at', 'timestamp without time zone'),
+]
+
+
+def load_dataset(path=DATASET_PATH):
+    """Fixture schemas with their labelled (question, gold tables, gold columns, gold SQL) entries"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_baseline(path=BASELINE_PATH):
+    """Tracked numbers: per strategy, minimum quality metrics and maximum latencies"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def distractor_tables(count):
+    """Deterministic distractor table definitions in the dataset's format"""
+    tables = []
+    for i in range(count):
+        prefix = DISTRACTOR_PREFIXES[i % len(DISTRACTOR_PREFIXES)]
+        subject = DISTRACTOR_SUBJECTS[(i // len(DISTRACTOR_PREFIXES)) % len(DISTRACTOR_SUBJECTS)]
+        tables.append({
+            'name': f"{prefix}_{subject}_{i}",
+            'columns': [
+                {'name': name, 'type': data_type, 'primary_key': name == 'id'}
+                for name, data_type in DISTRACTOR_COLUMNS
+            ]
+        })
+    return tables
+
+
+def install_schema(schema, owner):
+    """
+    Store a fixture schema as extracted metadata of a new ClientDatabase.
+
+    Descriptions are the placeholders extraction writes when the source
+    database has no comments, so the benchmark sees what production sees.
+
+    Returns:
+        ClientDatabase: Database holding the schema's tables, columns, values and foreign keys
+    """
+    extractor = MetadataExtractor()
+    database = ClientDatabase.objects.create(
+        name=f"benchmark_{schema['name']}", owner=owner, host='localhost',
+        database_name=schema['name'], username='benchmark', password='benchmark'
+    )
+    definitions = schema['tables'] + distractor_tables(schema.get('distractor_tables', 0))
+
+    tables = [
+        TableMetadata(database=database, schema_name='public', table_name=table['name'], table_type='BASE TABLE')
+        for table in definitions
+    ]
+    for table in tables:
+        table.description = extractor.generate_table_description(table)
+    TableMetadata.objects.bulk_create(tables)
+    tables = {table.table_name: table for table in TableMetadata.objects.filter(database=database)}
+
+    columns = []
+    for definition in definitions:
+        for column in definition['columns']:
+            metadata = ColumnMetadata(
+                table=tables[definition['name']],
+                column_name=column['name'],
+                data_type=column['type'],
+                is_nullable=not column.get('primary_key', False),
+                is_primary_key=column.get('primary_key', False),
+                is_foreign_key='references' in column,
+                categorical_values=column.get('values')
+            )
+            metadata.description = extractor.generate_column_description(metadata, with_samples=False)
+            columns.append(metadata)
+    ColumnMetadata.objects.bulk_create(columns)
+    columns = {
+        (column.table.table_name, column.column_name): column
+        for column in ColumnMetadata.objects.filter(table__database=database).select_related('table')
+    }
+
+    RelationshipMetadata.objects.bulk_create([
+        RelationshipMetadata(
+            from_column=columns[(definition['name'], column['name'])],
+            to_column=columns[tuple(column['references'].split('.'))],
+            relationship_type='many-to-one'
+        )
+        for definition in definitions
+        for column in definition['columns']
+        if 'references' in column
+    ])
+
+    database.bump_metadata_version()
+    return database
+
+
+def _from_hits(hits):
+    """Ranked table names and retrieved 'table.column' names from search results"""
+    tables = []
+    columns = set()
+    for hit in hits:
+        table = hit['name'] if hit['type'] == 'table' else hit['table_name']
+        if table not in tables:
+            tables.append(table)
+        if hit['type'] == 'column':
+            columns.add(f"{table}.{hit['name']}")
+    return tables, columns
+
+
+def _schema_linking(database, question):
+    ranked, matched_columns = retrieve_relevant_tables(question, database)
+    names = dict(TableMetadata.objects.filter(id__in=ranked).values_list('id', 'table_name'))
+    return (
+        [names[table_id] for table_id in ranked],
+        {f"{names[table_id]}.{column}" for table_id, columns in matched_columns.items() for column in columns}
+    )
+
+
+def _context(database, question):
+    schema = prune_schema(question, database)
+    return (
+        [table['table_name'] for table in schema],
+        {f"{table['table_name']}.{column['name']}" for table in schema for column in table['columns']}
+    )
+
+
+# Each strategy maps (database, question) to (ranked table names, retrieved 'table.column' names)
+STRATEGIES = {
+    'keyword': lambda database, question: _from_hits(search_keywords(database, question, limit=SEARCH_LIMIT)),
+    'fuzzy': lambda database, question: _from_hits(search_fuzzy(database, question, limit=SEARCH_LIMIT)),
+    'semantic': lambda database, question: _from_hits(
+        MetadataVectorizer().search_metadata(database, question, limit=SEARCH_LIMIT)
+    ),
+    'hybrid': lambda database, question: _from_hits(hybrid_search(database, question, limit=SEARCH_LIMIT)[0]),
+    'schema_linking': _schema_linking,
+    'context': _context,
+}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def evaluate(strategy, cases):
+    """
+    Score one strategy over labelled cases.
+
+    Each case is answered once, after a warm-up query has built the indexes,
+    so latencies are those of a new question against loaded indexes.
+    Indexes are rebuilt for each strategy, which keeps one strategy's cached
+    results from making another look faster.
+
+    Args:
+        strategy (callable): (database, question) -> (ranked table names, retrieved column names)
+        cases (list): (database, labelled question dict) pairs
+
+    Returns:
+        dict: recall@k for tables, column_recall, mrr, p50_ms and p99_ms
+    """
+    cache = get_metadata_cache()
+    # Start from loaded indexes but no cached results or query embeddings from other strategies
+    cache.invalidate(None)
+    for database in {database.id: database for database, _ in cases}.values():
+        cache.invalidate(database.id)
+        strategy(database, 'warm up')
+
+    recalls = {k: [] for k in RECALL_AT}
+    column_recalls = []
+    reciprocal_ranks = []
+    latencies = []
+    for database, case in cases:
+        started = time.perf_counter()
+        tables, columns = strategy(database, case['question'])
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        gold_tables = set(case['tables'])
+        for k in RECALL_AT:
+            recalls[k].append(len(gold_tables & set(tables[:k])) / len(gold_tables))
+        column_recalls.append(len(set(case['columns']) & columns) / len(case['columns']))
+        rank = next((position for position, table in enumerate(tables, start=1) if table in gold_tables), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+    metrics = {f"recall@{k}": sum(values) / len(values) for k, values in recalls.items()}
+    metrics['column_recall'] = sum(column_recalls) / len(column_recalls)
+    metrics['mrr'] = sum(reciprocal_ranks) / len(reciprocal_ranks)
+    metrics['p50_ms'] = percentile(latencies, 0.5)
+    metrics['p99_ms'] = percentile(latencies, 0.99)
+    return metrics
+
+
+def run_benchmark(owner, dataset=None, strategies=None):
+    """
+    Install the fixture schemas and score every strategy on the labelled questions.
+
+    Callers own the transaction: the installed metadata is meant to be rolled back.
+
+    Args:
+        owner (User): Owner of the fixture databases
+        dataset (dict, optional): Parsed dataset, the bundled one by default
+        strategies (list, optional): Strategy names, all by default
+
+    Returns:
+        dict: Strategy name -> metrics
+    """
+    dataset = dataset or load_dataset()
+    cases = []
+    databases = []
+    try:
+        for schema in dataset['schemas']:
+            database = install_schema(schema, owner)
+            databases.append(database)
+            cases.extend((database, case) for case in schema['questions'])
+        return {name: evaluate(STRATEGIES[name], cases) for name in strategies or STRATEGIES}
+    finally:
+        # The rows are rolled back and their IDs may be reused; don't let cached indexes outlive them
+        for database in databases:
+            get_metadata_cache().invalidate(database.id)
+
+
+def regressions(report, baseline, latency=True):
+    """
+    Tracked numbers that fell below (quality) or rose above (latency) the baseline.
+
+    Args:
+        report (dict): run_benchmark() output
+        baseline (dict): Per strategy, 'min' quality metrics and 'max' latencies
+        latency (bool): Also check the 'max' latency budgets, which depend on the machine
+
+    Returns:
+        list: Human-readable descriptions, empty when nothing regressed
+    """
+    failures = []
+    tolerance = baseline.get('tolerance', 0.0)
+    for name, limits in baseline['strategies'].items():
+        metrics = report.get(name)
+        if metrics is None:
+            continue
+        for metric, floor in limits.get('min', {}).items():
+            if metrics[metric] < floor - tolerance:
+                failures.append(f"{name} {metric} {metrics[metric]:.3f} < baseline {floor:.3f}")
+        for metric, ceiling in (limits.get('max', {}) if latency else {}).items():
+            if metrics[metric] > ceiling:
+                failures.append(f"{name} {metric} {metrics[metric]:.1f} > budget {ceiling:.1f}")
+    return failures
+
+
+def format_report(report):
+    """Render benchmark metrics as a fixed-width table"""
+    columns = [f"recall@{k}" for k in RECALL_AT] + ['column_recall', 'mrr', 'p50_ms', 'p99_ms']
+    lines = [f"{'strategy':<16}" + ''.join(f"{column:>15}" for column in columns)]
+    for name, metrics in report.items():
+        lines.append(f"{name:<16}" + ''.join(
+            f"{metrics[column]:>15.1f}" if column.endswith('_ms') else f"{metrics[column]:>15.3f}"
+            for column in columns
+        ))
+    return '\n'.join(lines)
+
+
+def run_and_rollback(strategies=None):
+    """
+    Run the benchmark against throwaway metadata, returning the report.
+
+    Everything is written inside a transaction that is always rolled back,
+    and embedding snapshots are not published.
+    """
+    with override_settings(EMBEDDING_STORE_DIR=''), transaction.atomic():
+        owner = User.objects.create_user(username='retrieval-benchmark')
+        report = run_benchmark(owner, strategies=strategies)
+        transaction.set_rollback(True)
+    return report
@@ -0,0 +1,227 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.conf import settings
+from .resilience import get_provider_guard
+
+logger = logging.getLogger(__name__)
+
+# Attempts run here so a hedge can start while the first attempt is still waiting
+_executor = ThreadPoolExecutor(
+    max_workers=2 * getattr(settings, 'LLM_HTTP_MAX_CONNECTIONS', 20),
+    thread_name_prefix='llm-route'
+)
+
+
+class RequestCancelled(Exception):
+    """An attempt lost the race before its request was sent"""
+
+
+class RouteStats:
+    """Rolling latency and outcome window of one (provider, model) route"""
+
+    def __init__(self, window):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds, ok):
+        self._samples.append((seconds, ok))
+
+    def snapshot(self):
+        """Sample count, error rate and p50/p95 latency (seconds) of successful calls"""
+        samples = list(self._samples)
+        latencies = sorted(seconds for seconds, ok in samples if ok)
+        errors = sum(1 for _, ok in samples if not ok)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        return {
+            'samples': len(samples),
+            'error_rate': errors / len(samples) if samples else 0.0,
+            'p50': percentile(0.5),
+            'p95': percentile(getattr(settings, 'LLM_HEDGE_PERCENTILE', 0.95)),
+        }
+
+
+class Attempt:
+    """One request to one route, cancellable from another thread"""
+
+    def __init__(self, route):
+        self.route = route
+        self.cancelled = threading.Event()
+        self._closers = []
+        self._lock = threading.Lock()
+
+    def on_cancel(self, close):
+        """Register a callable that aborts the request (e.g. closes its response stream)"""
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._closers.append(close)
+                return
+        close()
+
+    def cancel(self):
+        """Mark the attempt as lost and abort its request"""
+        with self._lock:
+            self.cancelled.set()
+            closers, self._closers = self._closers, []
+        for close in closers:
+            try:
+                close()
+            except Exception:
+                pass
+
+
+class LLMRouter:
+    """
+    Send each request to the fastest healthy (provider, model) route, hedging slow calls.
+
+    Routes are ranked by rolling p50 latency; a route whose provider circuit
+    is open or whose recent error rate exceeds LLM_ROUTER_MAX_ERROR_RATE
+    goes last. Routes with fewer than LLM_ROUTER_MIN_SAMPLES calls are tried
+    first, in the caller's order, so every route gets measured. When the
+    first attempt outlasts its route's p95 latency, a duplicate is sent to
+    the same route (or, with LLM_HEDGE_TO_FALLBACK, to the next healthy
+    route); the first to succeed wins and the other is cancelled. When every
+    attempt fails, the next healthy route is tried once. Callers learn which
+    route answered, so a fallback model's answer can be labelled as such.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _route_stats(self, route):
+        key = (route[0], route[-1])
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = RouteStats(getattr(settings, 'LLM_ROUTER_WINDOW', 100))
+            return stats
+
+    def record(self, route, seconds, ok):
+        """Record the latency and outcome of a completed (not cancelled) call on a route"""
+        self._route_stats(route).record(seconds, ok)
+
+    def healthy(self, route):
+        """Whether the route's provider circuit is not open and its recent error rate is acceptable"""
+        if get_provider_guard(route[0]).breaker.snapshot()['state'] == 'open':
+            return False
+        snapshot = self._route_stats(route).snapshot()
+        return not (
+            snapshot['samples'] >= getattr(settings, 'LLM_ROUTER_MIN_SAMPLES', 5)
+            and snapshot['error_rate'] > getattr(settings, 'LLM_ROUTER_MAX_ERROR_RATE', 0.5)
+        )
+
+    def rank(self, routes):
+        """
+        Order routes best first.
+
+        Args:
+            routes (list): (provider, api_key, model) tuples in order of preference
+
+        Returns:
+            list: The same routes, fastest healthy first
+        """
+        min_samples = getattr(settings, 'LLM_ROUTER_MIN_SAMPLES', 5)
+
+        def sort_key(item):
+            position, route = item
+            snapshot = self._route_stats(route).snapshot()
+            if snapshot['samples'] < min_samples or snapshot['p50'] is None:
+                return not self.healthy(route), 0, position
+            return not self.healthy(route), 1, snapshot['p50']
+
+        return [route for _, route in sorted(enumerate(routes), key=sort_key)]
+
+    def hedge_delay(self, route):
+        """Seconds to wait for a route before hedging: its p95 latency once measured"""
+        snapshot = self._route_stats(route).snapshot()
+        if snapshot['samples'] >= getattr(settings, 'LLM_ROUTER_MIN_SAMPLES', 5) and snapshot['p95'] is not None:
+            return snapshot['p95']
+        return getattr(settings, 'LLM_HEDGE_DEFAULT_DELAY', 10)
+
+    def _run(self, attempt, request):
+        """Run request(attempt) and record its outcome unless it was cancelled"""
+        started = time.perf_counter()
+        try:
+            result = request(attempt)
+        except Exception:
+            if not attempt.cancelled.is_set():
+                self.record(attempt.route, time.perf_counter() - started, False)
+            raise
+        if not attempt.cancelled.is_set():
+            self.record(attempt.route, time.perf_counter() - started, True)
+        return result
+
+    def call(self, routes, request):
+        """
+        Make a request on the best route, hedging when it is slow and failing over when it fails.
+
+        Args:
+            routes (list): (provider, api_key, model) tuples in order of preference
+            request (callable): request(attempt) -> result; raises on failure and should
+                register a way to abort itself with attempt.on_cancel
+
+        Returns:
+            tuple: (route, result) of the attempt that succeeded first
+
+        Raises:
+            Exception: The first attempt's error when every attempt failed
+        """
+        ranked = self.rank(routes)
+        first = Attempt(ranked[0])
+        pending = {_executor.submit(self._run, first, request): first}
+
+        fallback_route = next((route for route in ranked[1:] if self.healthy(route)), None)
+        hedge_route = None
+        if getattr(settings, 'LLM_HEDGING_ENABLED', True):
+            # A duplicate on the same model by default, so hedging never changes who answers
+            hedge_route = fallback_route if getattr(settings, 'LLM_HEDGE_TO_FALLBACK', False) else ranked[0]
+        timeout = self.hedge_delay(ranked[0]) if hedge_route else None
+
+        errors = []
+        while pending:
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # The first attempt is past its p95: race a duplicate
+                logger.info(f"Hedging slow {ranked[0][0]} request to {hedge_route[0]} ({hedge_route[-1]})")
+                attempt = Attempt(hedge_route)
+                pending[_executor.submit(self._run, attempt, request)] = attempt
+                if hedge_route is fallback_route:
+                    fallback_route = None
+                hedge_route, timeout = None, None
+                continue
+            for future in done:
+                attempt = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    for loser in pending.values():
+                        loser.cancel()
+                    return attempt.route, future.result()
+                errors.append(error)
+            if not pending and fallback_route:
+                # Every attempt failed: fail over to the next route now
+                logger.info(f"Failing over from {ranked[0][0]} to {fallback_route[0]} ({fallback_route[-1]})")
+                attempt = Attempt(fallback_route)
+                pending[_executor.submit(self._run, attempt, request)] = attempt
+                fallback_route, hedge_route, timeout = None, None, None
+        raise errors[0]
+
+    def stats(self):
+        """Rolling latency and error rate of every route used so far"""
+        with self._lock:
+            items = list(self._stats.items())
+        return {f"{provider}/{model}": stats.snapshot() for (provider, model), stats in items}
+
+
+_router = LLMRouter()
+
+
+def get_llm_router():
+    """Return the process-wide LLM router"""
+    return _router
@@ -0,0 +1,229 @@
+import json
+import logging
+import re
+from django.conf import settings
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Long PostgreSQL type names and the short spellings the models read just as well
+TYPE_ABBREVIATIONS = [
+    ('timestamp without time zone', 'timestamp'),
+    ('timestamp with time zone', 'timestamptz'),
+    ('time without time zone', 'time'),
+    ('time with time zone', 'timetz'),
+    ('character varying', 'varchar'),
+    ('double precision', 'float8'),
+    ('character', 'char'),
+    ('integer', 'int'),
+    ('boolean', 'bool'),
+]
+
+# Descriptions metadata extraction writes when the source database has no comments
+TABLE_PLACEHOLDER = re.compile(r'^Table \S+ containing data related to .*\.$')
+COLUMN_PLACEHOLDER = re.compile(r'^Column \S+ of type .*?\.(?: Sample values include: (?P<samples>.*?)\.?)?$')
+
+PLAIN_IDENTIFIER = re.compile(r'^[a-z_][a-z0-9_$]*$')
+IDENTIFIER = r'(?:"(?:[^"]|"")*"|[^\s.,()"]+)'
+CREATE_TABLE = re.compile(rf'^CREATE TABLE ({IDENTIFIER})\.({IDENTIFIER}) \(', re.MULTILINE)
+COLUMN_LINE = re.compile(rf'^  ({IDENTIFIER}) ')
+# Rough tokens: short letter runs, up to three digits, or a pair of symbols
+TOKEN_PIECE = re.compile(r'[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]{1,2}')
+
+_encoding = None
+
+
+def _tiktoken_encoding():
+    """The tiktoken encoding of SCHEMA_TOKENIZER_ENCODING, or None without tiktoken"""
+    global _encoding
+    name = getattr(settings, 'SCHEMA_TOKENIZER_ENCODING', 'o200k_base')
+    if tiktoken is None or not name:
+        return None
+    if _encoding is None or _encoding.name != name:
+        try:
+            _encoding = tiktoken.get_encoding(name)
+        except Exception as e:
+            logger.warning(f"Tokenizer {name} unavailable, estimating tokens instead: {str(e)}")
+            return None
+    return _encoding
+
+
+def tokenizer_name():
+    """Name of the tokenizer count_tokens uses"""
+    encoding = _tiktoken_encoding()
+    return encoding.name if encoding else 'heuristic'
+
+
+def count_tokens(text):
+    """
+    Count the tokens of a prompt fragment.
+
+    Uses the tiktoken encoding named by SCHEMA_TOKENIZER_ENCODING when the
+    optional tiktoken package is installed. Otherwise words, numbers and
+    punctuation are counted the way BPE tokenizers typically split them,
+    which tracks real counts far better than characters divided by four on
+    punctuation-heavy text such as JSON.
+    """
+    encoding = _tiktoken_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(TOKEN_PIECE.findall(text))
+
+
+def quote_identifier(name):
+    """An identifier as it must be written in SQL"""
+    if PLAIN_IDENTIFIER.match(name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _unquote(identifier):
+    if identifier.startswith('"'):
+        return identifier[1:-1].replace('""', '"')
+    return identifier
+
+
+def abbreviate_type(data_type):
+    """Short spelling of a column type, keeping any length or precision"""
+    lowered = data_type.lower()
+    for long_name, short_name in TYPE_ABBREVIATIONS:
+        if lowered.startswith(long_name) and not lowered[len(long_name):len(long_name) + 1].isalpha():
+            return short_name + data_type[len(long_name):]
+    return data_type
+
+
+def shorten_description(text, max_chars=None):
+    """First sentence of a description, cut at a word boundary to SCHEMA_DESCRIPTION_MAX_CHARS"""
+    max_chars = max_chars or getattr(settings, 'SCHEMA_DESCRIPTION_MAX_CHARS', 80)
+    text = ' '.join(text.split())
+    sentence = re.split(r'(?<=[.!?])\s', text, maxsplit=1)[0].rstrip('.')
+    if len(sentence) <= max_chars:
+        return sentence
+    return sentence[:max_chars].rsplit(' ', 1)[0].rstrip(',;:') + '...'
+
+
+def table_comment(table_info):
+    """The description of a table worth sending, or an empty string for a placeholder"""
+    description = table_info.get('description') or ''
+    if not description or TABLE_PLACEHOLDER.match(description):
+        return ''
+    return shorten_description(description)
+
+
+def column_comment(column):
+    """
+    The description of a column worth sending.
+
+    Placeholders only repeat the name, type and key flags already on the line,
+    so just their sample values are kept.
+    """
+    description = column.get('description') or ''
+    placeholder = COLUMN_PLACEHOLDER.match(description)
+    if placeholder:
+        samples = placeholder.group('samples')
+        return f"e.g. {samples}" if samples else ''
+    return shorten_description(description) if description else ''
+
+
+def table_header(table_info):
+    """First line of a table: its name, description and size"""
+    notes = [note for note in (
+        table_comment(table_info),
+        f"~{table_info['row_count']} rows" if table_info.get('row_count') is not None else ''
+    ) if note]
+    name = f"{quote_identifier(table_info['schema_name'])}.{quote_identifier(table_info['table_name'])}"
+    return f"CREATE TABLE {name} (" + (f" -- {'; '.join(notes)}" if notes else '')
+
+
+def column_line(column, last=False):
+    """One column as a DDL line with inline PK/FK markers"""
+    line = f"  {quote_identifier(column['name'])} {abbreviate_type(column['type'])}"
+    if column['is_primary_key']:
+        line += ' PK'
+    elif not column['nullable']:
+        line += ' NOT NULL'
+    if column['is_foreign_key']:
+        line += f" FK->{column['references']}" if column.get('references') else ' FK'
+    if not last:
+        line += ','
+    comment = column_comment(column)
+    return line + (f" -- {comment}" if comment else '')
+
+
+def table_footer(table_info):
+    """Last line of a table: access paths, composite keys and columns left out"""
+    notes = []
+    if table_info.get('indexes'):
+        notes.append(f"indexes: {', '.join(table_info['indexes'])}")
+    if table_info.get('partition_key'):
+        notes.append(f"partitioned by {table_info['partition_key']}")
+    if table_info.get('constraints'):
+        notes.append(', '.join(table_info['constraints']))
+    if table_info.get('omitted_columns'):
+        notes.append(f"+{table_info['omitted_columns']} more columns")
+    return ');' + (f" -- {'; '.join(notes)}" if notes else '')
+
+
+def encode_table(table_info):
+    """A table of build_schema_representation as compact DDL"""
+    columns = table_info['columns']
+    lines = [table_header(table_info)]
+    lines += [column_line(column, last=position == len(columns) - 1) for position, column in enumerate(columns)]
+    lines.append(table_footer(table_info))
+    return '\n'.join(lines)
+
+
+def encode_schema(schema, schema_format=None):
+    """
+    Serialize a schema representation for a prompt.
+
+    Args:
+        schema (list): Tables in the format of build_schema_representation
+        schema_format (str, optional): 'compact' (DDL-like lines) or 'json';
+            defaults to SCHEMA_PROMPT_FORMAT
+
+    Returns:
+        str: The schema text
+    """
+    schema_format = schema_format or getattr(settings, 'SCHEMA_PROMPT_FORMAT', 'compact')
+    if schema_format == 'json':
+        return json.dumps(schema, indent=2)
+    return '\n\n'.join(encode_table(table_info) for table_info in schema)
+
+
+def decode_schema(text):
+    """
+    Table and column names of a schema serialized by encode_schema, in either format.
+
+    Returns:
+        list: [{'schema_name', 'table_name', 'columns': [{'name'}]}]
+    """
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    tables = []
+    for line in text.splitlines():
+        header = CREATE_TABLE.match(line)
+        if header:
+            tables.append({'schema_name': _unquote(header[1]), 'table_name': _unquote(header[2]), 'columns': []})
+            continue
+        column = COLUMN_LINE.match(line)
+        if column and tables:
+            tables[-1]['columns'].append({'name': _unquote(column[1])})
+    return tables
+
+
+def compare_encodings(schema):
+    """Tokens of a schema as indented JSON and as compact DDL"""
+    json_tokens = count_tokens(encode_schema(schema, 'json'))
+    compact_tokens = count_tokens(encode_schema(schema, 'compact'))
+    return {
+        'tables': len(schema),
+        'columns': sum(len(table_info['columns']) for table_info in schema),
+        'json_tokens': json_tokens,
+        'compact_tokens': compact_tokens,
+        'savings': 1 - compact_tokens / json_tokens if json_tokens else 0.0,
+    }
@@ -0,0 +1,185 @@
+import logging
+from django.conf import settings
+from databases.hybrid_search import hybrid_search
+from databases.join_graph import get_join_graph
+from databases.models import TableMetadata
+from databases.value_index import find_value_hints
+from .schema_encoding import count_tokens, tokenizer_name, table_header, table_footer, column_line
+
+logger = logging.getLogger(__name__)
+
+# Tables described per round trip while filling the token budget
+SCHEMA_BATCH_SIZE = 50
+
+
+def retrieve_relevant_tables(question, database_obj, top_k=None):
+    """
+    Rank the tables relevant to a question.
+
+    Tables with a column holding a value the question mentions come first,
+    then tables ranked by their best hybrid (keyword, embedding and fuzzy name, rank-fused)
+    match, a column match counting for its table.
+
+    Args:
+        question (str): Natural language question
+        database_obj (ClientDatabase): Database to search
+        top_k (int, optional): Fused matches considered
+
+    Returns:
+        tuple: (table IDs best first, {table ID: set of matched column names})
+    """
+    top_k = top_k or getattr(settings, 'SCHEMA_LINKING_TOP_K', 10)
+    # Columns holding a quoted value are the most direct evidence
+    hits = [
+        {'type': 'column', 'table_id': hint['table_id'], 'name': hint['column']}
+        for hint in find_value_hints(database_obj, question, limit=top_k)
+    ]
+    fused, timings = hybrid_search(database_obj, question, limit=top_k)
+    hits += fused
+    logger.info(
+        f"Schema retrieval for database {database_obj.id}: "
+        + ", ".join(f"{stage} {elapsed:.1f}ms" for stage, elapsed in timings.items())
+    )
+
+    ranked = []
+    matched_columns = {}
+    for hit in hits:
+        table_id = hit['id'] if hit['type'] == 'table' else hit['table_id']
+        if table_id not in matched_columns:
+            ranked.append(table_id)
+            matched_columns[table_id] = set()
+        if hit['type'] == 'column':
+            matched_columns[table_id].add(hit['name'])
+    return ranked, matched_columns
+
+
+def foreign_key_closure(database_obj, table_ids):
+    """
+    Extend tables with the tables that join them and every table they reach through foreign keys.
+
+    Args:
+        database_obj (ClientDatabase): Database the tables belong to
+        table_ids (list): Seed table IDs, in priority order
+
+    Returns:
+        list: Seed tables, then the intermediate tables of the join tree connecting
+            them, then referenced tables in breadth-first order
+    """
+    graph = get_join_graph(database_obj)
+    ordered = list(table_ids)
+    seen = set(ordered)
+    for table_id in graph.join_tree(ordered)['tables']:
+        if table_id not in seen:
+            seen.add(table_id)
+            ordered.append(table_id)
+    for table_id in ordered:
+        for referenced in sorted(graph.referenced_tables(table_id)):
+            if referenced not in seen:
+                seen.add(referenced)
+                ordered.append(referenced)
+    return ordered
+
+
+def _fit_table(table_info, keep, budget):
+    """
+    The table with as many whole columns as fit in a token budget, or None when its key columns do not.
+
+    Primary key, foreign key and matched columns are required; the rest are
+    added in their table order while they fit. Columns keep their table order
+    and the count left out is recorded as 'omitted_columns'.
+
+    Returns:
+        tuple: (table description or None, tokens it costs)
+    """
+    columns = table_info['columns']
+    required = [
+        position for position, column in enumerate(columns)
+        if column['is_primary_key'] or column['is_foreign_key'] or column['name'] in keep
+    ]
+    cost = count_tokens(table_header(table_info)) + count_tokens(table_footer(dict(table_info, omitted_columns=1)))
+    line_costs = [count_tokens(column_line(column)) + 1 for column in columns]
+    cost += sum(line_costs[position] for position in required) + 1
+    if cost > budget:
+        return None, 0
+
+    chosen = set(required)
+    for position in range(len(columns)):
+        if position not in chosen and cost + line_costs[position] <= budget:
+            chosen.add(position)
+            cost += line_costs[position]
+
+    fitted = dict(table_info)
+    fitted['columns'] = [column for position, column in enumerate(columns) if position in chosen]
+    if len(chosen) < len(columns):
+        fitted['omitted_columns'] = len(columns) - len(chosen)
+    return fitted, cost
+
+
+def _cheapest_table_cost():
+    """Tokens the smallest possible table costs in _fit_table, a lower bound for any real table"""
+    table_info = {'schema_name': 's', 'table_name': 't'}
+    return count_tokens(table_header(table_info)) + count_tokens(table_footer(dict(table_info, omitted_columns=1))) + 1
+
+
+def prune_schema(question, database_obj, token_budget=None, top_k=None):
+    """
+    Select the part of a database schema relevant to a question, under a token budget.
+
+    Retrieved tables come first, then the tables needed to join them, then the
+    tables they reference through foreign keys. Tokens are counted on the
+    compact schema encoding. Each table gets its key and matched columns plus
+    as many of its other columns as fit; whole columns and tables are left
+    out, never parts of them. When nothing matches the question, all tables
+    are candidates in name order.
+
+    Args:
+        question (str): Natural language question
+        database_obj (ClientDatabase): Database the question is about
+        token_budget (int, optional): Tokens allowed for the encoded schema
+        top_k (int, optional): Fused matches considered
+
+    Returns:
+        list: Schema representation in the format of build_schema_representation
+    """
+    from .services import build_schema_representation
+
+    token_budget = token_budget or getattr(settings, 'SCHEMA_PROMPT_TOKEN_BUDGET', 3000)
+    ranked, matched_columns = retrieve_relevant_tables(question, database_obj, top_k=top_k)
+
+    if ranked:
+        table_ids = foreign_key_closure(database_obj, ranked)
+    else:
+        table_ids = list(
+            TableMetadata.objects.filter(database=database_obj)
+            .order_by('schema_name', 'table_name')
+            .values_list('id', flat=True)
+        )
+
+    names = {
+        table_id: (schema_name, table_name)
+        for table_id, schema_name, table_name in TableMetadata.objects.filter(id__in=table_ids)
+        .values_list('id', 'schema_name', 'table_name')
+    }
+    keep_columns = {names[table_id]: columns for table_id, columns in matched_columns.items() if table_id in names}
+
+    schema = []
+    used = 0
+    cheapest = _cheapest_table_cost()
+    # Describe candidates a batch at a time so a huge schema is never built in full. A batch where
+    # nothing fits does not end the search: smaller tables further down the list may still fit
+    for start in range(0, len(table_ids), SCHEMA_BATCH_SIZE):
+        if token_budget - used < cheapest:
+            break
+        batch = table_ids[start:start + SCHEMA_BATCH_SIZE]
+        for table_info in build_schema_representation(database_obj.id, table_ids=batch):
+            key = (table_info['schema_name'], table_info['table_name'])
+            fitted, cost = _fit_table(table_info, keep_columns.get(key, set()), token_budget - used)
+            if fitted is not None:
+                schema.append(fitted)
+                used += cost
+
+    logger.info(
+        f"Schema linking for database {database_obj.id} kept {len(schema)} of {len(table_ids)} candidate tables "
+        f"({used} {tokenizer_name()} tokens, {len(ranked)} retrieved)"
+    )
+    return schema
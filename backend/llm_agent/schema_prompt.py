@@ -0,0 +1,115 @@
+import hashlib
+import logging
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from databases.cache import get_metadata_cache
+from databases.models import TableMetadata
+from .models import SchemaPrompt
+from .schema_encoding import count_tokens, encode_schema, encode_table
+from .schema_linking import SCHEMA_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def format_schema_section(schema_text):
+    """The schema section that opens every SQL generation prompt"""
+    return f"""
+Given the following database schema:
+```
+{schema_text}
+```
+
+Where the question allows, prefer filters and joins on indexed columns and on partition keys (both listed with each table), and avoid wrapping those columns in functions.
+
+"""
+
+
+def build_schema_section(database_obj, schema_format):
+    """
+    The schema section describing a whole database, or an empty string when it is too large to send every time.
+
+    Tables are in (schema, table) order and columns in extraction order, so
+    the same metadata always gives the same text.
+
+    Returns:
+        str: Schema section, empty when over SCHEMA_PREFIX_MAX_TOKENS or SCHEMA_PROMPT_TOKEN_BUDGET,
+             or when there is no metadata
+    """
+    from .services import build_schema_representation
+
+    # The whole schema must fit the budget a pruned schema is cut to
+    budget = getattr(settings, 'SCHEMA_PROMPT_TOKEN_BUDGET', 3000)
+    max_tokens = min(getattr(settings, 'SCHEMA_PREFIX_MAX_TOKENS', budget), budget)
+    table_ids = list(
+        TableMetadata.objects.filter(database=database_obj)
+        .order_by('schema_name', 'table_name')
+        .values_list('id', flat=True)
+    )
+    schema = []
+    used = 0
+    for start in range(0, len(table_ids), SCHEMA_BATCH_SIZE):
+        for table_info in build_schema_representation(database_obj.id, table_ids=table_ids[start:start + SCHEMA_BATCH_SIZE]):
+            used += count_tokens(encode_table(table_info)) + 1
+            if used > max_tokens:
+                return ''
+            schema.append(table_info)
+    if not schema:
+        return ''
+    section = format_schema_section(encode_schema(schema, schema_format))
+    return section if count_tokens(section) <= max_tokens else ''
+
+
+def _load_or_build(database_obj, schema_format):
+    """Text of the stored schema prompt of the database's current version, rebuilt and stored when stale"""
+    version = database_obj.metadata_version
+    stored = SchemaPrompt.objects.filter(database=database_obj).first()
+    if stored is not None and stored.metadata_version == version and stored.schema_format == schema_format:
+        return stored.text
+
+    text = build_schema_section(database_obj, schema_format)
+    values = {
+        'metadata_version': version,
+        'schema_format': schema_format,
+        'text': text,
+        'tokens': count_tokens(text) if text else 0,
+        'sha256': hashlib.sha256(text.encode('utf-8')).hexdigest() if text else '',
+        'updated_at': timezone.now(),
+    }
+    if stored is None:
+        try:
+            SchemaPrompt.objects.create(database=database_obj, **values)
+        except IntegrityError:
+            pass  # Another worker stored it first
+    else:
+        # Never overwrite a prompt another worker built for a newer version
+        SchemaPrompt.objects.filter(id=stored.id, metadata_version__lte=version).update(**values)
+    logger.info(
+        f"Schema prompt for database {database_obj.id} v{version}: "
+        + (f"{values['tokens']} tokens, sent as a stable prefix" if text else "too large, pruned per question")
+    )
+    return text
+
+
+def get_schema_prompt(database_obj):
+    """
+    Return the schema section of a database's prompts for its current metadata version.
+
+    The section is built once per version and format, stored in SchemaPrompt
+    for every worker and kept in the metadata cache, so each prompt for the
+    database starts with byte-identical text and providers can reuse their
+    prompt cache. It is empty when the schema is too large to send in full;
+    prompts are then pruned per question.
+
+    Args:
+        database_obj (ClientDatabase): Database the prompts are about
+
+    Returns:
+        str: Schema section for database_obj.metadata_version, possibly empty
+    """
+    schema_format = getattr(settings, 'SCHEMA_PROMPT_FORMAT', 'compact')
+    return get_metadata_cache().get_or_build(
+        database_obj.id,
+        ('schema_prompt', database_obj.metadata_version, schema_format),
+        lambda: _load_or_build(database_obj, schema_format)
+    )
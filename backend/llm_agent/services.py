@@ -1,21 +1,159 @@
-from openai import OpenAI
+import openai
 import os
+import time
 import json
 import logging
-import requests
 from django.conf import settings
+from django.db.models import Prefetch
 from databases.models import TableMetadata, ColumnMetadata
+from databases.join_graph import get_join_graph, format_joins
+from databases.value_index import find_value_hints, format_value_hints
 from dotenv import load_dotenv
 from django.contrib.auth.models import User
 from user.models import UserTokenUsage
+from .answer_cache import get_answer_cache, answer_cache_enabled
+from .clients import get_llm_client
+from .examples import find_similar_examples
+from .offline import record_response
+from .resilience import call_provider, RateLimitExceeded, ProviderUnavailable
+from .router import get_llm_router, RequestCancelled
+from .schema_encoding import encode_schema
+from .schema_linking import prune_schema, retrieve_relevant_tables
+from .schema_prompt import format_schema_section, get_schema_prompt
+from .single_flight import NoSharedResult, get_llm_single_flight, llm_call_key
+from .sql_checks import check_index_usage
+from .streaming import ThinkBlockFilter, JsonFieldStream
 
 # load environment variables from .env file
 load_dotenv()
 
+# Prompt tokens are recorded at a tenth of their count
+INPUT_FACTOR = 10
+
+PROVIDER_NAMES = {"openai": "OpenAI", "groq": "Groq", "offline": "Offline stand-in"}
+
+# Models served by Groq; anything else falls back to llama-3.1-8b-instant there
+GROQ_MODELS = ["llama-3.1-8b-instant", "llama-3.1-70b-instant", "mixtral-8x7b-32768", "gemma-7b-it"]
+
+
+def select_llm_provider(model):
+    """
+    Pick the provider and the model actually used for a requested model.
+    
+    OpenAI models go to OpenAI when a key is configured; everything else,
+    including OpenAI models without a key, goes to Groq.
+    
+    Returns:
+        tuple: (provider, api_key, model), or (None, None, error dict) when no usable key is configured
+    """
+    openai_api_key = os.getenv("OPENAI_API_KEY") or getattr(settings, "OPENAI_API_KEY", None)
+    groq_api_key = os.getenv("GROQ_API_KEY")
+    
+    if model.startswith(("gpt", "o1", "o3")):
+        if openai_api_key:
+            return "openai", openai_api_key, model
+        logging.warning("OpenAI model requested but no API key found. Switching to Groq with llama-3.1-8b-instant.")
+        model = "llama-3.1-8b-instant"
+    
+    if not groq_api_key:
+        logging.error("Groq API key not found")
+        return None, None, {
+            "success": False, 
+            "error": "Groq API key not found. Please set GROQ_API_KEY in your .env file.",
+            "error_type": "api_key_error"
+        }
+    
+    # Ensure we're using a model that Groq supports
+    if model not in GROQ_MODELS:
+        logging.warning(f"Model {model} may not be supported by Groq. Using llama-3.1-8b-instant instead.")
+        model = "llama-3.1-8b-instant"
+    return "groq", groq_api_key, model
+
+
+def llm_routes(model):
+    """
+    Provider and model options that can serve a requested model.
+    
+    The static choice of select_llm_provider comes first, followed by the
+    fallback model (LLM_FALLBACK_MODELS) of every other provider with a key,
+    for the router to choose from by latency and health.
+    
+    Returns:
+        tuple: (list of (provider, api_key, model), error dict or None when there are no options)
+    """
+    if getattr(settings, "LLM_OFFLINE", False):
+        # Load and regression testing without network access (see offline.py)
+        return [("offline", None, model)], None
+    
+    provider, api_key, chosen = select_llm_provider(model)
+    routes = [(provider, api_key, chosen)] if provider else []
+    if getattr(settings, "LLM_ROUTING_ENABLED", True):
+        api_keys = {
+            "openai": os.getenv("OPENAI_API_KEY") or getattr(settings, "OPENAI_API_KEY", None),
+            "groq": os.getenv("GROQ_API_KEY"),
+        }
+        for other, fallback_model in getattr(settings, "LLM_FALLBACK_MODELS", {}).items():
+            if other != provider and api_keys.get(other):
+                routes.append((other, api_keys[other], fallback_model))
+    return routes, None if routes else chosen
+
+
+def _open_completion_stream(route, prompt, temperature, max_tokens, cancelled=None):
+    """
+    Open a streaming completion on a route, paced, retried and behind the provider's circuit breaker.
+    
+    A set cancelled event stops the request from being sent once its turn in the rate limiter comes.
+    """
+    provider, api_key, model = route
+    
+    def request():
+        if cancelled is not None and cancelled.is_set():
+            raise RequestCancelled(f"{provider} request cancelled before it was sent")
+        return get_llm_client(provider, api_key).chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            # The final chunk carries the token usage and no choices
+            stream_options={"include_usage": True},
+            timeout=30 if provider == "groq" else openai.NOT_GIVEN  # Groq requests must not hang
+        )
+    
+    # Only opening the stream is retried; a stream that fails midway is reported as is
+    return call_provider(provider, request)
+
+
+def record_llm_usage(user, usage, model, prompt):
+    """Record a completion's token usage for a user and return it as a token_usage dict"""
+    if user and usage:
+        UserTokenUsage.record_token_usage(
+            user=user,
+            prompt_tokens=usage.prompt_tokens/INPUT_FACTOR,
+            completion_tokens=usage.completion_tokens,
+            model=model,
+            query_text=prompt[:500]  # Store first 500 chars of the prompt
+        )
+        logging.info(f"Recorded token usage for {user.username}: {usage.prompt_tokens} prompt, {usage.completion_tokens} completion")
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return {
+        "prompt_tokens": usage.prompt_tokens if usage else 0,
+        # Prompt tokens the provider served from its prompt cache (the shared schema prefix)
+        "cached_prompt_tokens": (details.cached_tokens or 0) if details else 0,
+        "completion_tokens": usage.completion_tokens if usage else 0,
+        "total_tokens": usage.total_tokens if usage else 0,
+        "model": model
+    }
+
+
 def llm_api(prompt, model="gpt-4o-mini", temperature=0.7, max_tokens=1000, user=None):
     """
     A unified function to interact with either OpenAI or Groq API based on the model name.
     
+    Identical requests (same model, parameters and prompt) that arrive while
+    one is in flight wait for it instead of calling the provider again; the
+    tokens are recorded once, for the user whose request made the call.
+    
     Args:
         prompt (str): The prompt to send to the API
         model (str): The model to use, default is gpt-4o-mini
@@ -24,147 +162,71 @@ def llm_api(prompt, model="gpt-4o-mini", temperature=0.7, max_tokens=1000, user=
         user (User, optional): Django user to track token usage, default is None
         
     Returns:
-        dict: The response with success status and content/error
+        dict: The response with success status and content/error; 'coalesced' is True
+        when the response was shared from another in-flight request
     """
+    result, shared = get_llm_single_flight().do(
+        llm_call_key(prompt, model, temperature, max_tokens),
+        lambda: _call_llm_api(prompt, model, temperature, max_tokens, user)
+    )
+    if shared:
+        return dict(result, coalesced=True)
+    return result
+
+def _call_llm_api(prompt, model, temperature, max_tokens, user):
+    """Make one completion request on the best route, hedged when slow (see llm_api)"""
     logging.info(f"LLM API request with model: {model}")
-    input_factor = 10
 
     try:
-        # Check for OpenAI API key
-        openai_api_key = os.getenv("OPENAI_API_KEY") or getattr(settings, "OPENAI_API_KEY", None)
-        groq_api_key = os.getenv("GROQ_API_KEY")
+        routes, error = llm_routes(model)
+        if error:
+            return error
         
-        # Determine which API to use based on available keys and model
-        use_openai = model.startswith(("gpt", "o1", "o3")) and openai_api_key
+        def complete(attempt):
+            # Streamed internally so that a losing hedge can be cancelled by closing its response
+            stream = _open_completion_stream(attempt.route, prompt, temperature, max_tokens, attempt.cancelled)
+            attempt.on_cancel(stream.close)
+            content = []
+            usage = None
+            with stream:
+                for chunk in stream:
+                    if attempt.cancelled.is_set():
+                        return None
+                    if chunk.usage:
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        content.append(chunk.choices[0].delta.content)
+            return "".join(content), usage
         
-        # If OpenAI model requested but no key, switch to Groq
-        if model.startswith(("gpt", "o1", "o3")) and not openai_api_key:
-            logging.warning("OpenAI model requested but no API key found. Switching to Groq with llama-3.1-8b-instant.")
-            model = "llama-3.1-8b-instant"
-            use_openai = False
+        route, (content, usage) = get_llm_router().call(routes, complete)
+        provider, _, model = route
+        logging.info(f"Answered by {PROVIDER_NAMES[provider]} API with model {model}")
+        if provider != "offline":
+            record_response(prompt, model, content, usage)
         
-        logging.info(f"Using {'OpenAI' if use_openai else 'Groq'} API with model {model}")
-        
-        if use_openai:
-            # Initialize the OpenAI client
-            client = OpenAI(api_key=openai_api_key)
-            
-            # Call the OpenAI API
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=temperature,
-                max_tokens=max_tokens
-            )
-            
-            # Extract the content from the response
-            content = response.choices[0].message.content
-
-            print(f"OpenAI usage data: {response.usage}")
-            
-            # Record token usage if user is provided
-            if user and response.usage:
-                UserTokenUsage.record_token_usage(
-                    user=user,
-                    prompt_tokens=response.usage.prompt_tokens/input_factor,
-                    completion_tokens=response.usage.completion_tokens,
-                    model=model,
-                    query_text=prompt[:500]  # Store first 500 chars of the prompt
-                )
-                logging.info(f"Recorded token usage for {user.username}: {response.usage.prompt_tokens} prompt, {response.usage.completion_tokens} completion")
-            
-            return {
-                "success": True,
-                "content": content,
-                "token_usage": {
-                    "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
-                    "completion_tokens": response.usage.completion_tokens if response.usage else 0,
-                    "total_tokens": response.usage.total_tokens if response.usage else 0,
-                    "model": model
-                }
-            }
-        else:
-            # Use Groq API
-            if not groq_api_key:
-                logging.error("Groq API key not found")
-                return {
-                    "success": False, 
-                    "error": "Groq API key not found. Please set GROQ_API_KEY in your .env file.",
-                    "error_type": "api_key_error"
-                }
-            
-            # Set up the Groq request
-            headers = {
-                "Authorization": f"Bearer {groq_api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            # Ensure we're using a model that Groq supports
-            groq_models = ["llama-3.1-8b-instant", "llama-3.1-70b-instant", "mixtral-8x7b-32768", "gemma-7b-it"]
-            if model not in groq_models:
-                logging.warning(f"Model {model} may not be supported by Groq. Using llama-3.1-8b-instant instead.")
-                model = "llama-3.1-8b-instant"
-            
-            data = {
-                "model": model,
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": max_tokens,
-                "temperature": temperature
-            }
-            
-            # Call the Groq API
-            logging.info(f"Sending request to Groq API with model {model}")
-            try:
-                response = requests.post(
-                    "https://api.groq.com/openai/v1/chat/completions", 
-                    headers=headers, 
-                    json=data,
-                    timeout=30  # Add timeout to prevent hanging requests
-                )
-                response.raise_for_status()
-                result = response.json()
-                
-                # Extract the content from the response
-                content = result["choices"][0]["message"]["content"]
-
-                # split by </think>
-                content = content.split("</think>")[-1].strip()
-                
-                # Record token usage if user is provided and usage info is available
-                if user and "usage" in result:
-                    usage = result["usage"]
-                    UserTokenUsage.record_token_usage(
-                        user=user,
-                        prompt_tokens=usage.get("prompt_tokens", 0)/input_factor,
-                        completion_tokens=usage.get("completion_tokens", 0),
-                        model=model,
-                        query_text=prompt[:500]  # Store first 500 chars of the prompt
-                    )
-                    logging.info(f"Recorded token usage for {user.username}: {usage.get("prompt_tokens", 0)} prompt, {usage.get("completion_tokens", 0)} completion")
-                
-                # Extract token usage for return value
-                token_usage = {
-                    "prompt_tokens": result.get("usage", {}).get("prompt_tokens", 0),
-                    "completion_tokens": result.get("usage", {}).get("completion_tokens", 0),
-                    "total_tokens": result.get("usage", {}).get("total_tokens", 0),
-                    "model": model
-                }
-                
-                return {
-                    "success": True,
-                    "content": content,
-                    "token_usage": token_usage
-                }
-            except requests.exceptions.RequestException as e:
-                logging.error(f"Error calling Groq API: {str(e)}")
-                return {
-                    "success": False, 
-                    "error": f"Error calling Groq API: {str(e)}",
-                    "error_type": "api_connection_error"
-                }
-            
+        return {
+            "success": True,
+            # Reasoning models answer after a <think> block
+            "content": content.split("</think>")[-1].strip(),
+            # The router may have answered with another provider's fallback model
+            "model": model,
+            "fallback": route is not routes[0],
+            "token_usage": record_llm_usage(user, usage, model, prompt)
+        }
+    except openai.APIError as e:
+        logging.error(f"Error calling LLM API: {str(e)}")
+        return {
+            "success": False, 
+            "error": f"Error calling LLM API: {str(e)}",
+            "error_type": "rate_limited" if isinstance(e, openai.RateLimitError) else "api_connection_error"
+        }
+    except (RateLimitExceeded, ProviderUnavailable) as e:
+        logging.warning(f"LLM request not sent: {str(e)}")
+        return {
+            "success": False, 
+            "error": str(e),
+            "error_type": e.error_type
+        }
     except Exception as e:
         logging.exception(f"Unexpected error in llm_api: {str(e)}")
         return {
@@ -173,6 +235,123 @@ def llm_api(prompt, model="gpt-4o-mini", temperature=0.7, max_tokens=1000, user=
             "error_type": "general_llm_error"
         }
 
+def llm_api_stream(prompt, model="gpt-4o-mini", temperature=0.7, max_tokens=1000, user=None):
+    """
+    Streaming counterpart of llm_api.
+    
+    A reasoning model's leading <think> block is separated from the answer as
+    it arrives, so callers can forward answer tokens without waiting for the
+    reasoning to finish.
+    
+    Args:
+        prompt (str): The prompt to send to the API
+        model (str): The model to use, default is gpt-4o-mini
+        temperature (float): Controls randomness (0-1), default is 0.7
+        max_tokens (int): Maximum number of tokens to generate, default is 1000
+        user (User, optional): Django user to track token usage, default is None
+        
+    Yields:
+        tuple: ('model', {'model', 'fallback'}) naming the model that answers, ('reasoning', text)
+        and ('content', text) deltas, then ('usage', token_usage dict); or a single ('error', error dict)
+    """
+    # Coalesced with identical streaming and non-streaming requests in flight;
+    # a waiter receives the leader's whole answer as a single delta
+    key = llm_call_key(prompt, model, temperature, max_tokens)
+    flight = get_llm_single_flight()
+    call, leader = flight.join(key)
+    if not leader:
+        try:
+            result = flight.wait(call)
+        except NoSharedResult as e:
+            logging.warning(f"Streaming an identical request again: {str(e)}")
+            yield from _stream_llm_api(prompt, model, temperature, max_tokens, user)
+            return
+        if not result.get("success"):
+            yield "error", result
+            return
+        yield "model", {"model": result["model"], "fallback": result["fallback"]}
+        yield "content", result["content"]
+        yield "usage", result["token_usage"]
+        return
+    
+    content = []
+    answered_by = {}
+    result = None
+    try:
+        for kind, data in _stream_llm_api(prompt, model, temperature, max_tokens, user):
+            if kind == "content":
+                content.append(data)
+            elif kind == "model":
+                answered_by = data
+            elif kind == "usage":
+                result = {"success": True, "content": "".join(content).strip(), "token_usage": data, **answered_by}
+            elif kind == "error":
+                result = data
+            yield kind, data
+    finally:
+        # A client that disconnects mid-stream leaves no answer to share; waiters then stream their own
+        flight.finish(key, call, result=result, interrupted=result is None)
+
+def _stream_llm_api(prompt, model, temperature, max_tokens, user):
+    """Stream one completion from the best route that opens (see llm_api_stream)"""
+    logging.info(f"Streaming LLM API request with model: {model}")
+    
+    routes, error = llm_routes(model)
+    if error:
+        yield "error", error
+        return
+    
+    # Tokens reach the client as they arrive, so there is no hedging; a route that
+    # fails to open falls through to the next one before anything was sent
+    router = get_llm_router()
+    stream = None
+    for route in router.rank(routes):
+        started = time.perf_counter()
+        try:
+            stream = _open_completion_stream(route, prompt, temperature, max_tokens)
+            break
+        except (openai.APIError, RateLimitExceeded, ProviderUnavailable) as e:
+            router.record(route, time.perf_counter() - started, False)
+            error = e
+            logging.warning(f"Could not open {PROVIDER_NAMES[route[0]]} stream: {str(e)}")
+    if stream is None:
+        if isinstance(error, openai.APIError):
+            error_type = "rate_limited" if isinstance(error, openai.RateLimitError) else "api_connection_error"
+        else:
+            error_type = error.error_type
+        yield "error", {"success": False, "error": f"Error calling LLM API: {str(error)}", "error_type": error_type}
+        return
+    
+    provider, _, model = route
+    # The router may have picked another provider's fallback model
+    yield "model", {"model": model, "fallback": route is not routes[0]}
+    think_filter = ThinkBlockFilter()
+    raw_content = []
+    usage = None
+    try:
+        with stream:
+            for chunk in stream:
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    raw_content.append(chunk.choices[0].delta.content)
+                    yield from think_filter.feed(chunk.choices[0].delta.content)
+        yield from think_filter.flush()
+    except openai.APIError as e:
+        router.record(route, time.perf_counter() - started, False)
+        logging.error(f"Error streaming from {PROVIDER_NAMES[provider]} API: {str(e)}")
+        yield "error", {
+            "success": False, 
+            "error": f"Error calling {PROVIDER_NAMES[provider]} API: {str(e)}",
+            "error_type": "api_connection_error"
+        }
+        return
+    router.record(route, time.perf_counter() - started, True)
+    if provider != "offline":
+        record_response(prompt, model, "".join(raw_content), usage)
+    
+    yield "usage", record_llm_usage(user, usage, model, prompt)
+
 def get_metadata_description(metadata_type, name, sample_data=None, user=None):
     """
     Generate natural language descriptions for database metadata.
@@ -269,6 +448,153 @@ def get_metadata_description(metadata_type, name, sample_data=None, user=None):
         return result.get("content", "")
     return "Failed to generate description due to API error."
 
+# Model that writes SQL; R1-style models reason in a <think> block before answering
+SQL_GENERATION_MODEL = "DeepSeek-R1-Distill-Llama-70B"
+
+
+def build_sql_prompt(natural_language_query, database):
+    """
+    Build the SQL generation prompt for a question, or answer it without the LLM.
+    
+    Args:
+        natural_language_query (str): The natural language question
+        database (ClientDatabase): Database the question is about
+        
+    Returns:
+        tuple: (prompt, None), or (None, response dict) for a cached answer or an error
+    """
+    # Repeated and near-identical questions are answered without an LLM round-trip
+    if answer_cache_enabled(database):
+        cached = get_answer_cache().lookup(database, natural_language_query)
+        if cached is not None:
+            return None, cached
+    
+    database_id = database.id
+    
+    # The whole schema, identical for every question on this metadata version, when it is small enough;
+    # otherwise only the tables relevant to the question, within the prompt token budget
+    join_graph = get_join_graph(database)
+    schema_section = get_schema_prompt(database)
+    if schema_section:
+        table_ids, _ = retrieve_relevant_tables(natural_language_query, database)
+    else:
+        schema = prune_schema(natural_language_query, database)
+        schema_section = format_schema_section(encode_schema(schema)) if schema else ''
+        table_ids = [join_graph.table_id(table['schema_name'], table['table_name']) for table in schema]
+    
+    if not schema_section:
+        # If metadata hasn't been extracted, inform the user
+        return None, {
+            "success": False,
+            "error": "No schema information available for this database. Please extract metadata first by clicking 'Extract Schema' on the database details page.",
+            "error_type": "metadata_not_extracted"
+        }
+    
+    # Fetch similar examples using RAG to enhance in-context learning
+    rag_examples = get_rag_examples(natural_language_query, database_id)
+    
+    # Stored column values the question mentions, so literals need no guessing
+    value_hints = format_value_hints(find_value_hints(database, natural_language_query))
+    
+    # Only the foreign keys that connect the question's tables, along shortest join paths
+    joins = format_joins(join_graph.join_tree(table_ids)['joins'])
+    
+    # The schema comes first so prompts for a database share their longest possible prefix;
+    # the question-specific parts follow
+    prompt = schema_section
+    
+    if joins:
+        prompt += f"""When the query needs several of these tables, join them along these foreign keys:
+{joins}
+
+"""
+    
+    if value_hints:
+        prompt += f"""The question mentions values stored in these columns; filter on them with the exact literal shown:
+{value_hints}
+
+"""
+    
+    # Only include the RAG examples section if there are actually examples
+    if rag_examples:
+        prompt += f"""Here are some examples of natural language questions converted to SQL queries:
+{rag_examples}
+
+"""
+
+    prompt += f"""Convert this natural language question to a valid SQL query:
+"{natural_language_query}"
+
+Return your answer as a JSON object with the following format:
+{{
+    "sql_query": "The SQL query",
+    "explanation": "Brief explanation of what the query does"
+}}
+You must return only the json and nothing else.
+"""
+    return prompt, None
+
+
+def parse_sql_response(content, natural_language_query, database_obj):
+    """
+    Parse the LLM's answer into SQL and an explanation, check it and cache it.
+    
+    Args:
+        content (str): Model output without any reasoning block
+        natural_language_query (str): The question the output answers
+        database_obj (ClientDatabase): Database the question is about
+        
+    Returns:
+        dict: Generated SQL query, explanation and performance warnings, or an error
+    """
+    try:
+        if "```json" in content:
+            json_content = content.split("```json")[1].split("```")[0].strip()
+        elif "{" in content and "}" in content:
+            json_content = "{" + content.split("{", 1)[1].split("}", 1)[0] + "}"
+        else:
+            json_content = content.strip()
+            json_content = json_content.split("SELECT")[-1].strip()
+            json_content = "SELECT " + json_content if json_content else ""
+            json_content = json_content.split("\n\n")[0].strip().split("```")[0].strip()
+            explanation = content.split("explanation:")[-1].strip().split("Explanation:")[-1].strip()
+            json_content = f"""{{"sql_query": "{json_content}", "explanation": "{explanation if explanation else "No explanation available"}"}}"""
+            
+        response_data = json.loads(json_content)
+        
+        # Flag predicates that will not be able to use an index on large tables
+        performance_warnings = check_index_usage(response_data.get("sql_query"), database_obj.id)
+        
+        result = {
+            "success": True, 
+            "sql_query": response_data.get("sql_query"), 
+            "explanation": response_data.get("explanation"),
+            "performance_warnings": performance_warnings
+        }
+        if answer_cache_enabled(database_obj) and result["sql_query"]:
+            get_answer_cache().store(database_obj, natural_language_query, result)
+        return result
+    except json.JSONDecodeError:
+        # If we couldn't parse the output as JSON, return a generation error
+        return {
+            "success": False, 
+            "error": "Failed to parse the generated SQL. The LLM output was in an unexpected format.",
+            "error_type": "generation_error"
+        }
+
+
+def classify_error(e):
+    """Error type for an unexpected exception during SQL generation"""
+    error_message = str(e).lower()
+    if "connection" in error_message:
+        return "connection_error"
+    elif "timeout" in error_message:
+        return "timeout_error"
+    elif "memory" in error_message:
+        return "memory_error"
+    return "general_error"
+
+
 def nl_to_sql(natural_language_query, database_id, user=None):
     """
     Convert natural language query to SQL based on the provided database ID.
@@ -280,7 +606,8 @@ def nl_to_sql(natural_language_query, database_id, user=None):
         user (User, optional): Django user to track token usage, default is None
         
     Returns:
-        dict: Generated SQL query and explanation
+        dict: Generated SQL query and explanation, with the 'model' that answered and
+        whether it was a 'fallback' model chosen by the router
     """
     try:
         # Get the database to ensure it exists
@@ -293,55 +620,13 @@ def nl_to_sql(natural_language_query, database_id, user=None):
                 "error": f"Database with ID {database_id} does not exist.",
                 "error_type": "database_not_found"
             }
-            
-        # Build schema representation from database
-        schema = build_schema_representation(database_id)
-        
-        if not schema:
-            # If metadata hasn't been extracted, inform the user
-            return {
-                "success": False,
-                "error": "No schema information available for this database. Please extract metadata first by clicking 'Extract Schema' on the database details page.",
-                "error_type": "metadata_not_extracted"
-            }
-        
-        # Fetch similar examples using RAG to enhance in-context learning
-        rag_examples = "" #get_rag_examples(natural_language_query)
-
-        print(f"RAG examples: {rag_examples}")
-        
-        # Create a schema summary for the prompt
-        schema_summary = json.dumps(schema, indent=2)
         
-        # Build the prompt with in-context learning examples
-        prompt = f"""
-Given the following database schema:
-```
-{schema_summary}
-```
-
-"""
-        prompt = prompt[:10000]  # Limit to 10000 characters for the prompt
+        prompt, response = build_sql_prompt(natural_language_query, database)
+        if response is not None:
+            return response
         
-        # Only include the RAG examples section if there are actually examples
-        if rag_examples:
-            prompt += f"""Here are some examples of natural language questions converted to SQL queries:
-{rag_examples}
-
-"""
-
-        prompt += f"""Convert this natural language question to a valid SQL query:
-"{natural_language_query}"
-
-Return your answer as a JSON object with the following format:
-{{
-    "sql_query": "The SQL query",
-    "explanation": "Brief explanation of what the query does"
-}}
-You must return only the json and nothing else.
-"""
         # Pass the user to the LLM API call for token tracking
-        result = llm_api(prompt, user=user, model="DeepSeek-R1-Distill-Llama-70B")
+        result = llm_api(prompt, user=user, model=SQL_GENERATION_MODEL)
         
         if not result.get("success"):
             return {
@@ -350,88 +635,142 @@ You must return only the json and nothing else.
                 "error_type": result.get("error_type", "llm_api_error")
             }
         
-        content = result.get("content", "")
-        try:
-            if "```json" in content:
-                json_content = content.split("```json")[1].split("```")[0].strip()
-            elif "{" in content and "}" in content:
-                json_content = "{" + content.split("{", 1)[1].split("}", 1)[0] + "}"
-            else:
-                json_content = content.strip()
-                json_content = json_content.split("SELECT")[-1].strip()
-                json_content = "SELECT " + json_content if json_content else ""
-                json_content = json_content.split("\n\n")[0].strip().split("```")[0].strip()
-                explanation = content.split("explanation:")[-1].strip().split("Explanation:")[-1].strip()
-                json_content = f"""{{"sql_query": "{json_content}", "explanation": "{explanation if explanation else "No explanation available"}"}}"""
-                
-            response_data = json.loads(json_content)
-            return {
-                "success": True, 
-                "sql_query": response_data.get("sql_query"), 
-                "explanation": response_data.get("explanation")
-            }
-        except json.JSONDecodeError:
-            # If we couldn't parse the output as JSON, return a generation error
-            return {
-                "success": False, 
-                "error": "Failed to parse the generated SQL. The LLM output was in an unexpected format.",
-                "error_type": "generation_error"
-            }
+        response = parse_sql_response(result.get("content", ""), natural_language_query, database)
+        if response.get("success"):
+            response.update(model=result["model"], fallback=result["fallback"])
+        return response
     
     except Exception as e:
         logging.exception(f"Error in nl_to_sql: {str(e)}")
-        error_message = str(e)
-        error_type = "general_error"
-        
-        # Try to classify the error
-        if "connection" in error_message.lower():
-            error_type = "connection_error"
-        elif "timeout" in error_message.lower():
-            error_type = "timeout_error"
-        elif "memory" in error_message.lower():
-            error_type = "memory_error"
-        
         return {
             "success": False, 
-            "error": error_message,
-            "error_type": error_type
+            "error": str(e),
+            "error_type": classify_error(e)
         }
 
-def build_schema_representation(database_id):
+
+def nl_to_sql_stream(natural_language_query, database_id, user=None):
+    """
+    Streaming counterpart of nl_to_sql.
+    
+    SQL and explanation text is forwarded as the model writes it; its
+    reasoning block is only announced, never forwarded. The final 'done'
+    event carries the same result nl_to_sql would return, parsed from the
+    complete output.
+    
+    Args:
+        natural_language_query (str): The natural language question
+        database_id (int): Database ID to get schema information
+        user (User, optional): Django user to track token usage, default is None
+        
+    Yields:
+        tuple: (event, data) pairs: 'status' ({'stage'}), 'sql' and 'explanation' ({'delta'}),
+        then 'done' (result dict) or 'error' ({'error', 'error_type'})
+    """
+    from databases.models import ClientDatabase
+    try:
+        try:
+            database = ClientDatabase.objects.get(id=database_id)
+        except ClientDatabase.DoesNotExist:
+            yield "error", {
+                "error": f"Database with ID {database_id} does not exist.",
+                "error_type": "database_not_found"
+            }
+            return
+        
+        yield "status", {"stage": "retrieving"}
+        prompt, response = build_sql_prompt(natural_language_query, database)
+        if response is not None:
+            if response.get("success"):
+                yield "done", response
+            else:
+                yield "error", {"error": response.get("error"), "error_type": response.get("error_type")}
+            return
+        
+        yield "status", {"stage": "generating"}
+        # Answer fields decoded from the partial JSON and the events they stream as
+        events = {"sql_query": "sql", "explanation": "explanation"}
+        fields = JsonFieldStream(events)
+        content = []
+        answered_by = {}
+        reasoning = False
+        for kind, data in llm_api_stream(prompt, user=user, model=SQL_GENERATION_MODEL):
+            if kind == "error":
+                yield "error", {"error": data.get("error"), "error_type": data.get("error_type", "llm_api_error")}
+                return
+            if kind == "model":
+                answered_by = data
+            elif kind == "reasoning" and not reasoning:
+                reasoning = True
+                yield "status", {"stage": "reasoning"}
+            elif kind == "content":
+                content.append(data)
+                for field, delta in fields.feed(data):
+                    yield events[field], {"delta": delta}
+        
+        result = parse_sql_response("".join(content).strip(), natural_language_query, database)
+        if result.get("success"):
+            yield "done", dict(result, **answered_by)
+        else:
+            yield "error", {"error": result.get("error"), "error_type": result.get("error_type")}
+    
+    except Exception as e:
+        logging.exception(f"Error in nl_to_sql_stream: {str(e)}")
+        yield "error", {"error": str(e), "error_type": classify_error(e)}
+
+def build_schema_representation(database_id, table_ids=None):
     """
     Build a representation of the database schema for the LLM based on extracted metadata.
     
     Args:
         database_id (int): The database ID
+        table_ids (list, optional): Only describe these tables, in this order
         
     Returns:
         list: Schema representation for the LLM
     """
     try:
-        tables = TableMetadata.objects.filter(database_id=database_id)
+        tables = (
+            TableMetadata.objects.filter(database_id=database_id)
+            .prefetch_related(
+                # Columns in extraction order so the same metadata always reads the same
+                Prefetch('columns', queryset=ColumnMetadata.objects.order_by('id')),
+                'columns__outgoing_relationships__to_column__table', 'indexes', 'constraints__referenced_table'
+            )
+            .select_related('partitioning')
+        )
+        if table_ids is not None:
+            positions = {table_id: position for position, table_id in enumerate(table_ids)}
+            tables = sorted(tables.filter(id__in=table_ids), key=lambda table: positions[table.id])
         schema = []
         
         for table in tables:
             try:
-                columns = ColumnMetadata.objects.filter(table=table)
                 column_info = []
                 
-                for column in columns:
-                    column_info.append({
+                for column in table.columns.all():
+                    entry = {
                         'name': column.column_name,
                         'type': column.data_type,
                         'nullable': column.is_nullable,
                         'is_primary_key': column.is_primary_key,
                         'is_foreign_key': column.is_foreign_key,
                         'description': column.description if column.description else ""
-                    })
+                    }
+                    relationship = next(iter(column.outgoing_relationships.all()), None)
+                    if relationship is not None:
+                        target = relationship.to_column
+                        entry['references'] = f"{target.table.schema_name}.{target.table.table_name}.{target.column_name}"
+                    column_info.append(entry)
                     
-                schema.append({
+                table_info = {
                     'table_name': table.table_name,
                     'schema_name': table.schema_name,
                     'description': table.description if table.description else "",
                     'columns': column_info
-                })
+                }
+                table_info.update(summarize_access_paths(table))
+                schema.append(table_info)
             except Exception as e:
                 logging.error(f"Error processing table {table.table_name}: {str(e)}")
                 continue
@@ -445,56 +784,82 @@ def build_schema_representation(database_id):
         logging.error(f"Error building schema representation: {str(e)}")
         return []
 
-def get_rag_examples(query, top_k=5):
+def summarize_access_paths(table):
+    """
+    Summarize a table's indexes, partition key and composite constraints compactly.
+    
+    Args:
+        table (TableMetadata): Table with indexes, constraints and partitioning prefetched
+        
+    Returns:
+        dict: Only the non-empty keys among row_count, indexes, partition_key and constraints
+    """
+    summary = {}
+    
+    if table.row_count is not None:
+        summary['row_count'] = table.row_count
+    
+    # Primary key indexes are already marked on the columns themselves
+    indexes = []
+    for index in table.indexes.all():
+        if index.is_primary:
+            continue
+        entry = f"{'unique ' if index.is_unique else ''}{index.index_method}({', '.join(index.columns)})"
+        if index.predicate:
+            entry += f" where {index.predicate}"
+        indexes.append(entry)
+    if indexes:
+        summary['indexes'] = indexes
+    
+    partitioning = getattr(table, 'partitioning', None)
+    if partitioning is not None:
+        summary['partition_key'] = partitioning.key_definition
+    
+    # Single-column keys are already covered by the column flags
+    constraints = []
+    for constraint in table.constraints.all():
+        if len(constraint.columns) < 2:
+            continue
+        if constraint.constraint_type == 'unique':
+            constraints.append(f"unique({', '.join(constraint.columns)})")
+        elif constraint.constraint_type == 'primary_key':
+            constraints.append(f"pk({', '.join(constraint.columns)})")
+        elif constraint.constraint_type == 'foreign_key' and constraint.referenced_table:
+            referenced = constraint.referenced_table
+            constraints.append(
+                f"fk({', '.join(constraint.columns)}) -> "
+                f"{referenced.schema_name}.{referenced.table_name}({', '.join(constraint.referenced_columns)})"
+            )
+    if constraints:
+        summary['constraints'] = constraints
+    
+    return summary
+
+def get_rag_examples(query, database_id, top_k=None):
     """
-    Fetch relevant question-answer pairs from the RAG server to use as examples
+    Fetch stored question-SQL pairs similar to the query to use as examples
     for in-context learning.
     
     Args:
         query (str): The natural language query to find similar examples for
-        top_k (int): Number of examples to retrieve
+        database_id (int): Database the examples must belong to
+        top_k (int, optional): Number of examples to retrieve
         
     Returns:
         str: Formatted string of example question-answer pairs
     """
     try:
-        logging.info(f"Fetching RAG examples for query: {query}")
-        
-        # Make a request to the local RAG server
-        rag_url = "http://localhost:8080/query"
-        payload = {
-            "text": query,
-            "top_k": top_k
-        }
-        
-        response = requests.post(rag_url, json=payload, timeout=10)
+        examples = find_similar_examples(query, database_id, top_k=top_k)
         
-        if response.status_code != 200:
-            logging.error(f"RAG server returned status code {response.status_code}")
-            return ""
-            
-        result = response.json()
-        documents = result.get("documents", [])
-        
-        if not documents:
-            logging.warning("No examples found in RAG response")
+        if not examples:
             return ""
             
         # Format the examples for in-context learning
         examples_text = ""
-        for i, doc in enumerate(documents):
-            try:
-                content = doc.get("content", {})
-                question = content.get("question", "")
-                answer = content.get("answer", "")
-                
-                if question and answer:
-                    examples_text += f"Example {i+1}:\n"
-                    examples_text += f"Question: \"{question}\"\n"
-                    examples_text += f"SQL: {answer}\n\n"
-            except Exception as e:
-                logging.error(f"Error processing RAG document: {str(e)}")
-                continue
+        for i, example in enumerate(examples):
+            examples_text += f"Example {i+1}:\n"
+            examples_text += f"Question: \"{example['question']}\"\n"
+            examples_text += f"SQL: {example['sql']}\n\n"
         
         return examples_text
     
@@ -0,0 +1,6 @@
+from .schema_prompt import get_schema_prompt
+
+
+def refresh_schema_prompt(sender, database, **kwargs):
+    """Store the schema prompt of a database's new metadata version so the first question does not build it"""
+    get_schema_prompt(database)
@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class NoSharedResult(Exception):
+    """The call a waiter joined was interrupted or outlasted the wait; the waiter should make its own"""
+
+
+class _Call:
+    """One upstream call and the threads waiting for it"""
+    __slots__ = ('done', 'result', 'error', 'interrupted', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.interrupted = False
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls: one runs, the others wait for its result.
+
+    Only calls that overlap in time are merged; nothing is kept once the
+    running call returns. Coalescing is per process, so each worker makes
+    at most one upstream call per key at a time. Waiters give up after
+    wait_timeout seconds, or as soon as the running call is interrupted,
+    and make the call themselves.
+    """
+
+    def __init__(self, wait_timeout=None):
+        self.wait_timeout = wait_timeout or getattr(settings, 'LLM_COALESCE_WAIT_TIMEOUT', 120)
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.deduplicated = 0
+
+    def join(self, key):
+        """
+        Become the caller making the call for key, or a waiter on the one in flight.
+
+        A leader must always call finish(); a waiter calls wait().
+
+        Returns:
+            tuple: (call, leader)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                return call, True
+            call.waiters += 1
+            self.deduplicated += 1
+            return call, False
+
+    def wait(self, call):
+        """
+        Block until the leader finishes, returning its result or raising its error.
+
+        Raises:
+            NoSharedResult: The leader did not finish within wait_timeout or was interrupted
+        """
+        if not call.done.wait(self.wait_timeout):
+            raise NoSharedResult(f"The identical call in flight did not finish within {self.wait_timeout}s")
+        if call.interrupted:
+            raise NoSharedResult("The identical call in flight was interrupted")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def finish(self, key, call, result=None, error=None, interrupted=False):
+        """Publish the leader's outcome to the waiters and stop coalescing on key"""
+        call.result = result
+        call.error = error
+        call.interrupted = interrupted
+        with self._lock:
+            del self._calls[key]
+        call.done.set()
+        if call.waiters:
+            logger.info(f"Shared one upstream call with {call.waiters} identical concurrent requests")
+
+    def do(self, key, fn):
+        """
+        Run fn() unless a call with the same key is in flight, then share that call's outcome.
+
+        Args:
+            key (hashable): Identity of the call
+            fn (callable): The call to make when none is in flight
+
+        Returns:
+            tuple: (result, shared), shared being True when another caller's result was reused
+        """
+        call, leader = self.join(key)
+        if not leader:
+            try:
+                return self.wait(call), True
+            except NoSharedResult as e:
+                logger.warning(f"Making an identical call again: {str(e)}")
+                return fn(), False
+
+        result = error = None
+        interrupted = True
+        try:
+            result = fn()
+            interrupted = False
+        except Exception as e:
+            error = e
+            interrupted = False
+            raise
+        finally:
+            # Also on SystemExit, KeyboardInterrupt or a worker timeout, so the key is never left in flight
+            self.finish(key, call, result=result, error=error, interrupted=interrupted)
+        return result, False
+
+    def stats(self):
+        """Upstream calls made, calls answered by another in-flight call, and calls in flight"""
+        with self._lock:
+            requests = self.calls + self.deduplicated
+            return {
+                'calls': self.calls,
+                'deduplicated': self.deduplicated,
+                'in_flight': len(self._calls),
+                'deduplication_rate': self.deduplicated / requests if requests else 0.0
+            }
+
+
+_llm_calls = SingleFlight()
+
+
+def get_llm_single_flight():
+    """Return the process-wide single flight group for LLM completions"""
+    return _llm_calls
+
+
+def llm_call_key(prompt, model, temperature, max_tokens):
+    """Key of a completion request: everything that determines the answer, with the prompt hashed"""
+    return model, temperature, max_tokens, hashlib.sha256(prompt.encode('utf-8')).hexdigest()
@@ -0,0 +1,290 @@
+import logging
+import re
+import sqlparse
+from sqlparse import sql as sql_tokens
+from sqlparse import tokens as T
+from django.conf import settings
+from databases.models import TableMetadata
+
+# Keywords that end an ON clause (anything but boolean connectives)
+BOOLEAN_KEYWORDS = {'AND', 'OR', 'NOT'}
+
+# Parts of an expression that do not change which index key it matches
+CAST = re.compile(r'::[a-z_][a-z0-9_ ]*(?:\[\])?')
+QUALIFIER = re.compile(r'\b[a-z_][a-z0-9_$]*\.(?=[a-z_])')
+# Parentheses around a lone identifier, as in pg_get_indexdef's lower((email)::text)
+PARENTHESIZED_NAME = re.compile(r'(?<![a-z0-9_$])\(([a-z_][a-z0-9_$]*)\)')
+
+
+def _is_column_ref(token):
+    """Return True if an Identifier looks like a (possibly qualified) column reference"""
+    if not isinstance(token, sql_tokens.Identifier):
+        return False
+    return all(
+        child.ttype in (T.Name, T.Punctuation) or child.ttype in T.Literal.String.Symbol
+        for child in token.tokens
+    )
+
+
+def _has_subquery(token):
+    """Return True if a Parenthesis group wraps a SELECT"""
+    return isinstance(token, sql_tokens.Parenthesis) and any(
+        child.ttype is T.DML for child in token.tokens
+    )
+
+
+def normalize_expression(text):
+    """Compare form of an SQL expression: lowercase, without quotes, whitespace, casts, qualifiers or redundant parentheses"""
+    text = text.lower().replace('"', '')
+    text = CAST.sub('', text)
+    text = QUALIFIER.sub('', text)
+    text = PARENTHESIZED_NAME.sub(r'\1', text)
+    return re.sub(r'\s+', '', text)
+
+
+def _collect_refs(token, refs, scopes, wrapper=None):
+    """
+    Collect column references under a token, queueing subqueries as their own scopes.
+
+    References are (qualifier, column, wrapper) tuples, wrapper being the text
+    of the outermost function call around the column, or None for a bare column.
+    """
+    if _has_subquery(token):
+        scopes.append(token)
+        return
+    if _is_column_ref(token):
+        refs.append((token.get_parent_name(), token.get_real_name(), wrapper))
+        return
+    if isinstance(token, sql_tokens.Function):
+        # Skip the function name itself, keep its arguments
+        wrapper = wrapper or str(token)
+        for parameter in token.get_parameters():
+            _collect_refs(parameter, refs, scopes, wrapper)
+        return
+    if token.is_group:
+        for child in token.tokens:
+            _collect_refs(child, refs, scopes, wrapper)
+
+
+def _add_table_ref(token, tables, scopes):
+    """Record a FROM/JOIN target as alias -> (schema, table)"""
+    if isinstance(token, sql_tokens.IdentifierList):
+        for identifier in token.get_identifiers():
+            _add_table_ref(identifier, tables, scopes)
+        return
+    if not isinstance(token, sql_tokens.Identifier):
+        return
+    first = token.token_first(skip_cm=True)
+    if _has_subquery(first):
+        scopes.append(first)
+        return
+    name = token.get_real_name()
+    if not name:
+        return
+    ref = (token.get_parent_name(), name)
+    tables[(token.get_alias() or name).lower()] = ref
+    tables.setdefault(name.lower(), ref)
+
+
+def _analyze_scope(statement):
+    """
+    Walk one SELECT scope and return referenced tables plus filter and join columns.
+
+    Returns:
+        tuple: (tables, filters, joins, subqueries) where tables maps alias to (schema, table)
+    """
+    tables = {}
+    filters = []
+    joins = []
+    subqueries = []
+    expecting_table = False
+    in_join_condition = False
+
+    for token in statement.tokens:
+        if token.is_whitespace or token.ttype in T.Comment:
+            continue
+
+        if token.is_keyword:
+            keyword = token.normalized
+            if keyword == 'FROM' or keyword.endswith('JOIN'):
+                expecting_table = True
+                in_join_condition = False
+            elif keyword == 'ON':
+                in_join_condition = True
+                expecting_table = False
+            elif keyword not in BOOLEAN_KEYWORDS:
+                in_join_condition = False
+                expecting_table = False
+            continue
+
+        if expecting_table:
+            _add_table_ref(token, tables, subqueries)
+            expecting_table = False
+        elif isinstance(token, sql_tokens.Where):
+            _collect_refs(token, filters, subqueries)
+        elif in_join_condition:
+            _collect_refs(token, joins, subqueries)
+        elif token.is_group:
+            # Select list and other clauses may still hide subqueries
+            _collect_refs(token, [], subqueries)
+
+    return tables, filters, joins, subqueries
+
+
+def extract_predicate_columns(sql_query):
+    """
+    Extract the columns used in WHERE filters and JOIN conditions of a SQL query.
+
+    Args:
+        sql_query (str): The SQL query to analyze
+
+    Returns:
+        list: (clause, schema, table, column, wrapper) tuples, clause being 'filter' or 'join'
+              and wrapper the function call around the column (e.g. 'lower(email)') or None.
+              Unqualified columns in multi-table scopes yield one tuple per table in scope.
+    """
+    results = []
+    pending = [statement for statement in sqlparse.parse(sql_query or '')]
+
+    while pending:
+        scope = pending.pop()
+        tables, filters, joins, subqueries = _analyze_scope(scope)
+        pending.extend(subqueries)
+
+        distinct_tables = set(tables.values())
+        for clause, refs in (('filter', filters), ('join', joins)):
+            for qualifier, column, wrapper in refs:
+                if qualifier:
+                    schema, table = tables.get(qualifier.lower(), (None, qualifier))
+                elif len(distinct_tables) == 1:
+                    schema, table = next(iter(distinct_tables))
+                else:
+                    # Resolved later against the columns of every table in scope
+                    for candidate_schema, candidate_table in distinct_tables:
+                        results.append((clause, candidate_schema, candidate_table, column, wrapper))
+                    continue
+                results.append((clause, schema, table, column, wrapper))
+
+    return results
+
+
+def _usable_index_columns(table, referenced_columns):
+    """Return the columns of a table that an index, the primary key or the partition key can serve"""
+    usable = set()
+    for index in table.indexes.all():
+        # A B-tree is usable for the leading run of key columns that the query references
+        for column in index.columns:
+            if column not in referenced_columns:
+                break
+            usable.add(column)
+            if index.index_method != 'btree':
+                break
+    for column in table.columns.all():
+        if column.is_primary_key:
+            usable.add(column.column_name)
+    partitioning = getattr(table, 'partitioning', None)
+    if partitioning is not None:
+        usable.update(partitioning.key_columns)
+    return usable
+
+
+def _indexed_expressions(table):
+    """Leading index keys of a table in compare form, expression keys such as lower(email) included"""
+    return {normalize_expression(index.columns[0]) for index in table.indexes.all() if index.columns}
+
+
+def check_index_usage(sql_query, database_id):
+    """
+    Flag filters and joins on large tables that no index can serve in generated SQL.
+
+    A column wrapped in a function, such as lower(email), is only served by
+    an expression index on that same expression; an index on the bare column
+    does not help.
+
+    Args:
+        sql_query (str): The generated SQL query
+        database_id (int): The database ID the query targets
+
+    Returns:
+        list: Warning dicts with table, column, clause, expression (the wrapping call, or None), row_count and message
+    """
+    threshold = getattr(settings, 'LARGE_TABLE_ROW_THRESHOLD', 100000)
+
+    try:
+        predicates = extract_predicate_columns(sql_query)
+        if not predicates:
+            return []
+
+        table_names = {table for _, _, table, _, _ in predicates if table}
+        tables = (
+            TableMetadata.objects
+            .filter(database_id=database_id, table_name__in=table_names, row_count__gte=threshold)
+            .prefetch_related('indexes', 'columns')
+            .select_related('partitioning')
+        )
+        large_tables = {}
+        for table in tables:
+            large_tables.setdefault(table.table_name, []).append(table)
+
+        # Group referenced columns per table so composite index prefixes are honored
+        referenced = {}
+        resolved = []
+        for clause, schema, table_name, column, wrapper in predicates:
+            candidates = large_tables.get(table_name, [])
+            if schema:
+                candidates = [table for table in candidates if table.schema_name == schema]
+            elif len(candidates) > 1:
+                candidates = [table for table in candidates if table.schema_name == 'public'] or candidates[:1]
+            for table in candidates[:1]:
+                column_names = {col.column_name for col in table.columns.all()}
+                if column not in column_names:
+                    continue
+                referenced.setdefault(table.id, set())
+                if wrapper is None:
+                    # Only bare columns can match the key columns of a plain index
+                    referenced[table.id].add(column)
+                resolved.append((clause, table, column, wrapper))
+
+        warnings = []
+        seen = set()
+        usable_by_table = {}
+        for clause, table, column, wrapper in resolved:
+            if table.id not in usable_by_table:
+                usable_by_table[table.id] = (
+                    _usable_index_columns(table, referenced[table.id]), _indexed_expressions(table)
+                )
+            usable_columns, indexed_expressions = usable_by_table[table.id]
+            if wrapper is None:
+                usable = column in usable_columns
+            else:
+                usable = normalize_expression(wrapper) in indexed_expressions
+            key = (clause, table.id, column, wrapper)
+            if usable or key in seen:
+                continue
+            seen.add(key)
+
+            qualified = f"{table.schema_name}.{table.table_name}.{column}"
+            action = "Filter on" if clause == 'filter' else "Join on"
+            if wrapper is None:
+                message = f"{action} {qualified} has no supporting index on a table with ~{table.row_count} rows; expect a sequential scan."
+            elif column in _usable_index_columns(table, {column}):
+                message = (
+                    f"{action} {wrapper} wraps {qualified} in a function, so its index cannot be used on a table "
+                    f"with ~{table.row_count} rows; compare the bare column or add an index on the expression."
+                )
+            else:
+                message = f"{action} {wrapper} has no supporting index on a table with ~{table.row_count} rows; expect a sequential scan."
+            warnings.append({
+                'clause': clause,
+                'table': f"{table.schema_name}.{table.table_name}",
+                'column': column,
+                'expression': wrapper,
+                'row_count': table.row_count,
+                'message': message
+            })
+
+        return warnings
+
+    except Exception as e:
+        logging.error(f"Error checking index usage: {str(e)}")
+        return []
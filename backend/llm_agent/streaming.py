@@ -0,0 +1,184 @@
+import json
+from rest_framework.renderers import BaseRenderer
+
+THINK_OPEN = '<think>'
+THINK_CLOSE = '</think>'
+
+JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class ThinkBlockFilter:
+    """
+    Separate a reasoning model's leading <think>...</think> block from its answer as tokens arrive.
+
+    The tags may be split across chunks, so text that could still be the
+    start of a tag is held back until the next chunk decides it.
+    """
+
+    def __init__(self):
+        self._state = 'start'
+        self._pending = ''
+
+    def feed(self, text):
+        """
+        Consume a chunk of model output.
+
+        Returns:
+            list: (kind, text) pairs, kind 'reasoning' or 'content', in arrival order
+        """
+        self._pending += text
+        parts = []
+        while self._pending:
+            if self._state == 'start':
+                head = self._pending.lstrip()
+                if head.startswith(THINK_OPEN):
+                    self._pending = head[len(THINK_OPEN):]
+                    self._state = 'reasoning'
+                elif THINK_OPEN.startswith(head):
+                    break
+                else:
+                    self._state = 'content'
+            elif self._state == 'reasoning':
+                end = self._pending.find(THINK_CLOSE)
+                if end >= 0:
+                    reasoning = self._pending[:end]
+                    self._pending = self._pending[end + len(THINK_CLOSE):].lstrip()
+                    self._state = 'after_reasoning'
+                else:
+                    # Keep what could be the beginning of the closing tag
+                    keep = len(THINK_CLOSE) - 1
+                    reasoning = self._pending[:-keep] if len(self._pending) > keep else ''
+                    self._pending = self._pending[len(reasoning):]
+                if reasoning:
+                    parts.append(('reasoning', reasoning))
+                if self._state == 'reasoning':
+                    break
+            elif self._state == 'after_reasoning':
+                # Whitespace between the block and the answer is not part of the answer
+                self._pending = self._pending.lstrip()
+                if self._pending:
+                    self._state = 'content'
+            else:
+                parts.append(('content', self._pending))
+                self._pending = ''
+        return parts
+
+    def flush(self):
+        """Release held-back text at the end of the stream"""
+        pending, self._pending = self._pending, ''
+        if not pending or self._state == 'after_reasoning':
+            return []
+        return [('reasoning' if self._state == 'reasoning' else 'content', pending)]
+
+
+class JsonFieldStream:
+    """
+    Decode the string values of selected keys from a JSON object while it is still being generated.
+
+    Only top-level-looking "key": "value" pairs are tracked; text around the
+    object (code fences, prose) is skipped. The decoded deltas are meant for
+    display; the complete output is still parsed as a whole afterwards.
+    """
+
+    def __init__(self, fields):
+        self.fields = set(fields)
+        self._state = 'scan'
+        self._token = []
+        self._key = None
+        self._unicode = ''
+
+    def feed(self, text):
+        """
+        Consume a chunk of model output.
+
+        Returns:
+            list: (field, decoded text) pairs for the tracked fields
+        """
+        deltas = []
+        for char in text:
+            state = self._state
+            if state == 'scan':
+                if char == '"':
+                    self._state = 'key'
+                    self._token = []
+            elif state == 'key':
+                if char == '\\':
+                    self._state = 'key_escape'
+                elif char == '"':
+                    self._key = ''.join(self._token)
+                    self._state = 'after_key'
+                else:
+                    self._token.append(char)
+            elif state == 'key_escape':
+                self._token.append(JSON_ESCAPES.get(char, char))
+                self._state = 'key'
+            elif state == 'after_key':
+                if char == ':':
+                    self._state = 'before_value'
+                elif char == '"':
+                    # The previous string was a value, not a key; this one may be a key
+                    self._state = 'key'
+                    self._token = []
+                elif not char.isspace():
+                    self._state = 'scan'
+            elif state == 'before_value':
+                if char == '"':
+                    self._state = 'value'
+                elif not char.isspace():
+                    self._state = 'scan'
+            elif state == 'value':
+                if char == '\\':
+                    self._state = 'value_escape'
+                elif char == '"':
+                    self._state = 'scan'
+                else:
+                    self._emit(deltas, char)
+            elif state == 'value_escape':
+                if char == 'u':
+                    self._unicode = ''
+                    self._state = 'value_unicode'
+                else:
+                    self._emit(deltas, JSON_ESCAPES.get(char, char))
+                    self._state = 'value'
+            elif state == 'value_unicode':
+                self._unicode += char
+                if len(self._unicode) == 4:
+                    try:
+                        self._emit(deltas, chr(int(self._unicode, 16)))
+                    except ValueError:
+                        pass
+                    self._state = 'value'
+        # Merge consecutive characters of the same field into one delta
+        merged = []
+        for field, delta in deltas:
+            if merged and merged[-1][0] == field:
+                merged[-1] = (field, merged[-1][1] + delta)
+            else:
+                merged.append((field, delta))
+        return merged
+
+    def _emit(self, deltas, text):
+        if self._key in self.fields:
+            deltas.append((self._key, text))
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Let views that stream Server-Sent Events accept `Accept: text/event-stream`.
+
+    Streams bypass rendering; a regular response rendered for such a client
+    (e.g. a validation or authentication error) is sent as one 'error' event.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return sse_event('error', data).encode(self.charset)
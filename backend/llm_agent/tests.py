@@ -1,3 +1,898 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from unittest import mock
+import httpx
+import openai
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from databases.cache import get_metadata_cache
+from databases.models import ClientDatabase, IndexMetadata, TableMetadata
+from session.models import Query, Session
+from databases.hybrid_search import hybrid_search
+from .answer_cache import AnswerCache, normalize_question
+from .clients import close_llm_clients, get_llm_client
+from .examples import find_similar_examples, import_examples, record_query_example
+from .resilience import CircuitBreaker, ProviderUnavailable, TokenBucket, backoff_delay, call_provider, get_provider_guard, retry_after
+from .models import SchemaPrompt, SQLExample
+from .offline import prompt_hash
+from .router import LLMRouter
+from .single_flight import SingleFlight
+from .streaming import JsonFieldStream, ThinkBlockFilter
+from .sql_checks import check_index_usage, extract_predicate_columns
+from .retrieval_benchmark import (
+    load_dataset, load_baseline, run_benchmark, regressions, format_report, STRATEGIES, install_schema
+)
+from .schema_encoding import compare_encodings, count_tokens, decode_schema, encode_schema
+from .schema_linking import foreign_key_closure, prune_schema, retrieve_relevant_tables
+from .schema_prompt import get_schema_prompt
+from .services import (
+    SQL_GENERATION_MODEL, build_schema_representation, build_sql_prompt, llm_api, nl_to_sql, nl_to_sql_stream
+)
 
-# Create your tests here.
+
+@override_settings(EMBEDDING_STORE_DIR='')
+class RetrievalBenchmarkTests(TestCase):
+    """
+    Schema retrieval quality on the bundled fixture schemas, checked against the tracked baseline.
+
+    Wall-clock latency budgets are left to manage.py benchmark_retrieval --check.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.dataset = load_dataset()
+        cls.baseline = load_baseline()
+        owner = User.objects.create_user(username='benchmark')
+        cls.report = run_benchmark(owner, dataset=cls.dataset)
+
+    def test_labelled_questions_match_their_schemas(self):
+        for schema in self.dataset['schemas']:
+            columns = {
+                f"{table['name']}.{column['name']}" for table in schema['tables'] for column in table['columns']
+            }
+            tables = {table['name'] for table in schema['tables']}
+            for case in schema['questions']:
+                with self.subTest(question=case['question']):
+                    self.assertTrue(set(case['tables']) <= tables)
+                    self.assertTrue(set(case['columns']) <= columns)
+                    for table in case['tables']:
+                        self.assertRegex(case['sql'], rf"\b{re.escape(table)}\b")
+
+    def test_every_strategy_is_tracked(self):
+        self.assertEqual(set(self.report), set(STRATEGIES))
+        self.assertEqual(set(self.baseline['strategies']), set(STRATEGIES))
+
+    def test_no_quality_number_regresses(self):
+        failures = regressions(self.report, self.baseline, latency=False)
+        self.assertEqual(failures, [], "\n" + format_report(self.report))
+
+    def test_latency_budgets_are_only_checked_on_request(self):
+        baseline = {'strategies': {name: {'max': {'p99_ms': 0.0}} for name in STRATEGIES}}
+
+        self.assertEqual(regressions(self.report, baseline, latency=False), [])
+        self.assertEqual(len(regressions(self.report, baseline)), len(STRATEGIES))
+
+
+@override_settings(EMBEDDING_STORE_DIR='')
+class HybridSearchTests(TestCase):
+    """Keyword, embedding and fuzzy name retrieval fused into one ranking"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='hybrid')
+        cls.database = install_schema(load_dataset()['schemas'][0], cls.owner)
+
+    def setUp(self):
+        get_metadata_cache().invalidate(self.database.id)
+
+    def test_misspelled_names_are_found_by_the_fuzzy_retriever(self):
+        results, timings = hybrid_search(self.database, 'custmers', limit=5)
+
+        self.assertEqual((results[0]['type'], results[0]['name']), ('table', 'customers'))
+        self.assertIn('fuzzy', results[0]['ranks'])
+        self.assertNotIn('keyword', results[0]['ranks'])
+        self.assertIn('fuzzy', timings)
+
+    def test_fuzzy_matches_survive_without_embeddings(self):
+        with mock.patch('databases.hybrid_search.get_vector_index', side_effect=RuntimeError("no embeddings")):
+            results, _ = hybrid_search(self.database, 'shipmnts', limit=5)
+
+        self.assertIn(('table', 'shipments'), [(result['type'], result['name']) for result in results])
+        self.assertTrue(all(set(result['ranks']) == {'fuzzy'} for result in results))
+
+
+class PredicateColumnTests(TestCase):
+    """Columns generated SQL filters and joins on, parsed without a database"""
+
+    def test_filters_and_joins_are_resolved_through_aliases(self):
+        predicates = extract_predicate_columns(
+            "SELECT c.email FROM customers c JOIN orders o ON o.customer_id = c.id "
+            "WHERE o.status = 'shipped' AND c.city = 'Austin'"
+        )
+        self.assertCountEqual(predicates, [
+            ('filter', None, 'orders', 'status', None),
+            ('filter', None, 'customers', 'city', None),
+            ('join', None, 'orders', 'customer_id', None),
+            ('join', None, 'customers', 'id', None),
+        ])
+
+    def test_subqueries_are_their_own_scopes(self):
+        predicates = extract_predicate_columns(
+            "SELECT * FROM orders WHERE customer_id IN (SELECT id FROM customers WHERE state = 'Texas')"
+        )
+        self.assertCountEqual(predicates, [
+            ('filter', None, 'orders', 'customer_id', None),
+            ('filter', None, 'customers', 'state', None),
+        ])
+
+    def test_columns_inside_function_calls_keep_the_outermost_call(self):
+        predicates = extract_predicate_columns(
+            "SELECT * FROM customers c WHERE lower(trim(c.email)) = 'a@b.c' AND c.state = 'Texas'"
+        )
+        self.assertCountEqual(predicates, [
+            ('filter', None, 'customers', 'email', 'lower(trim(c.email))'),
+            ('filter', None, 'customers', 'state', None),
+        ])
+
+
+@override_settings(EMBEDDING_STORE_DIR='', LARGE_TABLE_ROW_THRESHOLD=100000)
+class IndexUsageTests(TestCase):
+    """Warnings about filters and joins no index can serve on large tables"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='index-usage')
+        cls.database = install_schema(load_dataset()['schemas'][0], cls.owner)
+        TableMetadata.objects.filter(database=cls.database, table_name__in=['customers', 'orders']).update(row_count=500000)
+        customers = TableMetadata.objects.get(database=cls.database, table_name='customers')
+        IndexMetadata.objects.create(table=customers, index_name='customers_email_idx', columns=['email'])
+        IndexMetadata.objects.create(table=customers, index_name='customers_state_city_idx', columns=['state', 'city'])
+        IndexMetadata.objects.create(
+            table=customers, index_name='customers_last_name_lower_idx', columns=['lower((last_name)::text)']
+        )
+
+    def warned(self, sql):
+        return {(warning['column'], warning['expression']) for warning in check_index_usage(sql, self.database.id)}
+
+    def test_indexed_and_primary_key_columns_pass(self):
+        self.assertEqual(self.warned("SELECT * FROM customers WHERE email = 'a@b.c' OR id = 3"), set())
+
+    def test_unindexed_columns_of_large_tables_are_flagged(self):
+        self.assertEqual(self.warned("SELECT * FROM customers WHERE phone = '555'"), {('phone', None)})
+        # Small tables are cheap to scan whatever the predicate
+        self.assertEqual(self.warned("SELECT * FROM coupons WHERE code = 'SPRING'"), set())
+
+    def test_composite_indexes_need_their_leading_column(self):
+        self.assertEqual(self.warned("SELECT * FROM customers WHERE city = 'Austin'"), {('city', None)})
+        self.assertEqual(self.warned("SELECT * FROM customers WHERE state = 'Texas' AND city = 'Austin'"), set())
+
+    def test_function_wrapped_indexed_column_is_flagged(self):
+        warnings = check_index_usage("SELECT * FROM customers c WHERE lower(c.email) = 'a@b.c'", self.database.id)
+
+        self.assertEqual([(warning['column'], warning['expression']) for warning in warnings], [('email', 'lower(c.email)')])
+        self.assertIn('wraps public.customers.email in a function', warnings[0]['message'])
+
+    def test_wrapped_column_inside_a_composite_prefix_is_flagged(self):
+        self.assertEqual(
+            self.warned("SELECT * FROM customers WHERE upper(state) = 'TEXAS' AND city = 'Austin'"),
+            {('state', 'upper(state)'), ('city', None)}
+        )
+
+    def test_matching_expression_index_passes(self):
+        self.assertEqual(self.warned("SELECT * FROM customers WHERE LOWER(last_name) = 'smith'"), set())
+        self.assertEqual(self.warned("SELECT * FROM customers WHERE upper(last_name) = 'SMITH'"), {('last_name', 'upper(last_name)')})
+
+
+@override_settings(EMBEDDING_STORE_DIR='')
+class SQLExampleTests(TestCase):
+    """Few-shot question/SQL examples learned from sessions and imported in bulk"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='examples')
+        cls.database = ClientDatabase.objects.create(
+            name='examples', owner=cls.owner, host='localhost', database_name='examples', username='user', password='password'
+        )
+        cls.session = Session.objects.create(user=cls.owner, database_id=cls.database.id, database_name='examples')
+
+    def setUp(self):
+        get_metadata_cache().invalidate(self.database.id)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.queries = f'/api/sessions/{self.session.id}/queries/'
+
+    def similar(self, question):
+        return [(example['question'], example['sql']) for example in find_similar_examples(question, self.database.id)]
+
+    def test_successful_queries_are_learned_and_forgotten_once_marked_failed(self):
+        response = self.client.post(self.queries, {
+            'prompt': "How many customers live in Texas?", 'response': 'ok',
+            'generated_sql': "SELECT COUNT(*) FROM customers WHERE state = 'Texas'"
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self.similar("How many customers live in Texas?"),
+            [("How many customers live in Texas?", "SELECT COUNT(*) FROM customers WHERE state = 'Texas'")]
+        )
+
+        self.client.patch(f"{self.queries}{response.data['id']}/", {'generated_sql': "SELECT 2"}, format='json')
+        self.assertEqual(self.similar("How many customers live in Texas?"), [("How many customers live in Texas?", "SELECT 2")])
+
+        self.client.patch(f"{self.queries}{response.data['id']}/", {'success': False}, format='json')
+        self.assertFalse(SQLExample.objects.filter(database=self.database).exists())
+        self.assertEqual(self.similar("How many customers live in Texas?"), [])
+
+    def test_failed_queries_are_not_learned(self):
+        self.client.post(self.queries, {
+            'prompt': "How many orders?", 'response': 'error', 'success': False, 'generated_sql': "SELECT COUNT(*) FROM order"
+        }, format='json')
+        self.assertFalse(SQLExample.objects.filter(database=self.database).exists())
+
+    def test_changed_question_replaces_the_query_example(self):
+        query = Query.objects.create(session=self.session, prompt="Top customers", response='ok', generated_sql="SELECT 1")
+        record_query_example(query)
+        query.prompt = "Top 10 customers by spend"
+        record_query_example(query)
+        self.assertEqual(
+            list(SQLExample.objects.filter(database=self.database).values_list('question', flat=True)),
+            ["Top 10 customers by spend"]
+        )
+
+    def test_import_keeps_the_last_sql_of_each_question(self):
+        imported = import_examples(self.database.id, [
+            ("Count orders", "SELECT 1"), (" Count orders ", "SELECT COUNT(*) FROM orders"),
+            ("", "SELECT 3"), ("List products", None), ("List products", "SELECT * FROM products"),
+        ], batch_size=2)
+        self.assertEqual(imported, 2)
+        import_examples(self.database.id, [("List products", "SELECT name FROM products")])
+        self.assertEqual(
+            dict(SQLExample.objects.filter(database=self.database).values_list('question', 'sql')),
+            {"Count orders": "SELECT COUNT(*) FROM orders", "List products": "SELECT name FROM products"}
+        )
+        self.assertEqual(self.similar("List products")[0], ("List products", "SELECT name FROM products"))
+
+    def test_import_command_reads_files_and_sessions(self):
+        Query.objects.create(session=self.session, prompt="Revenue by month", response='ok', generated_sql="SELECT 4")
+        Query.objects.create(session=self.session, prompt="Broken", response='error', success=False, generated_sql="SELECT")
+        with tempfile.TemporaryDirectory() as directory:
+            jsonl = os.path.join(directory, 'examples.jsonl')
+            with open(jsonl, 'w') as f:
+                f.write(json.dumps({'question': "Count orders", 'sql': "SELECT COUNT(*) FROM orders"}) + "\n\n")
+            csv_path = os.path.join(directory, 'examples.csv')
+            with open(csv_path, 'w') as f:
+                f.write("question,sql\nList products,SELECT * FROM products\n")
+            out = StringIO()
+            call_command('import_sql_examples', self.database.id, file=jsonl, stdout=out)
+            call_command('import_sql_examples', self.database.id, file=csv_path, from_sessions=True, stdout=out)
+
+        self.assertIn("Imported 1 example(s) from session queries", out.getvalue())
+        self.assertEqual(
+            set(SQLExample.objects.filter(database=self.database).values_list('question', 'source')),
+            {("Count orders", 'import'), ("List products", 'import'), ("Revenue by month", 'session')}
+        )
+        with self.assertRaises(CommandError):
+            call_command('import_sql_examples', self.database.id)
+        with self.assertRaises(CommandError):
+            call_command('import_sql_examples', 0, from_sessions=True)
+
+
+@override_settings(EMBEDDING_STORE_DIR='')
+class AnswerCacheTests(TestCase):
+    """Repeats are served from the answer cache; questions needing different SQL are not"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='answer-cache')
+        cls.database = install_schema(load_dataset()['schemas'][0], cls.owner)
+
+    def setUp(self):
+        get_metadata_cache().invalidate(self.database.id)
+        self.cache = AnswerCache()
+
+    def cached(self, stored, asked):
+        self.cache.store(self.database, stored, {'success': True, 'sql_query': 'SELECT 1'})
+        return self.cache.lookup(self.database, asked)
+
+    def test_exact_normalized_and_reworded_repeats_hit(self):
+        question = "How many customers are active members?"
+        self.assertEqual(self.cached(question, question)['cache_hit']['level'], 'exact')
+        self.assertEqual(
+            self.cache.lookup(self.database, "how many customers are ACTIVE members")['cache_hit']['level'],
+            'normalized'
+        )
+        customers = "List the first name, last name, email, phone and city of customers in the loyalty program who "
+        self.assertEqual(
+            self.cached(customers + "are active members", customers + "are currently active members")['cache_hit']['level'],
+            'semantic'
+        )
+
+    def test_near_misses_that_need_different_sql_do_not_hit(self):
+        # Each pair embeds above ANSWER_CACHE_MIN_SIMILARITY with the default hashing backend
+        customers = "List the first name, last name, email, phone and city of customers in the loyalty program who "
+        products = "List product name, sku, category, supplier and list price for every product sorted by list price "
+        orders = "Show order id, order date, status, customer name and "
+        pairs = [
+            (customers + "are active members", customers + "are not active members"),
+            (customers + "are active members", customers + "aren't active members"),
+            (products + "descending", products + "ascending"),
+            (orders + "total amount for the top 5 orders placed by loyalty customers",
+             orders + "total amount for the bottom 5 orders placed by loyalty customers"),
+            (orders + "coupon code for orders placed by loyalty customers with total amount above 100",
+             orders + "coupon code for orders placed by loyalty customers with total amount below 100"),
+        ]
+        for stored, asked in pairs:
+            with self.subTest(asked=asked):
+                self.cache = AnswerCache()
+                self.assertGreaterEqual(float(self.cache._embed(stored) @ self.cache._embed(asked)), 0.95)
+                self.assertIsNone(self.cached(stored, asked))
+
+    def test_comparison_symbols_are_part_of_the_question(self):
+        self.assertNotEqual(
+            normalize_question("Orders with amount > 100"), normalize_question("Orders with amount < 100")
+        )
+        self.assertEqual(normalize_question("Orders with amount <> 100"), normalize_question("orders with amount != 100"))
+
+        orders = "Show order id, order date, status, customer name and total amount for orders with total amount "
+        for stored, asked in [("Orders with amount > 100", "Orders with amount < 100"), (orders + "> 100", orders + "< 100")]:
+            with self.subTest(asked=asked):
+                self.cache = AnswerCache()
+                self.assertGreaterEqual(float(self.cache._embed(stored) @ self.cache._embed(asked)), 0.95)
+                self.assertIsNone(self.cached(stored, asked))
+        # The same comparison written the same way still hits
+        self.assertEqual(self.cached(orders + "> 100", orders + ">  100")['cache_hit']['level'], 'normalized')
+
+
+@override_settings(EMBEDDING_STORE_DIR='')
+class SchemaEncodingTests(TestCase):
+    """Compact schema text for prompts and the token budget it is cut to"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='encoding')
+        cls.database = install_schema(load_dataset()['schemas'][0], cls.owner)
+        cls.schema = build_schema_representation(cls.database.id)
+
+    def setUp(self):
+        # Database IDs are reused across test cases; drop what an earlier one cached in this process
+        get_metadata_cache().invalidate(self.database.id)
+
+    def test_compact_encoding_is_much_smaller_than_json(self):
+        stats = compare_encodings(self.schema)
+        self.assertGreater(stats['savings'], 0.5, stats)
+
+    def test_keys_are_marked_inline_and_names_survive_a_round_trip(self):
+        text = encode_schema(self.schema, 'compact')
+        self.assertIn("customer_id int FK->public.customers.id", text)
+        self.assertRegex(text, r"(?m)^  id int PK,$")
+        decoded = decode_schema(text)
+        self.assertEqual(
+            [(table['table_name'], [column['name'] for column in table['columns']]) for table in decoded],
+            [(table['table_name'], [column['name'] for column in table['columns']]) for table in self.schema]
+        )
+
+    def test_budget_drops_whole_columns_and_tables(self):
+        question = "How many customers live in California?"
+        schema = prune_schema(question, self.database, token_budget=120)
+        self.assertTrue(schema)
+        self.assertLessEqual(count_tokens(encode_schema(schema, 'compact')), 120)
+        full = {table['table_name']: table for table in self.schema}
+        for table in schema:
+            self.assertTrue(all(column in full[table['table_name']]['columns'] for column in table['columns']))
+            self.assertEqual(
+                table.get('omitted_columns', 0), len(full[table['table_name']]['columns']) - len(table['columns'])
+            )
+            self.assertTrue(any(column['is_primary_key'] for column in table['columns']))
+        self.assertTrue(any(table.get('omitted_columns') for table in schema))
+
+    def _table_ids(self):
+        return dict(TableMetadata.objects.filter(database=self.database).values_list('table_name', 'id'))
+
+    def test_tables_that_do_not_fit_do_not_end_the_search(self):
+        ids = self._table_ids()
+        names = {table_id: name for name, table_id in ids.items()}
+        order_items = next(table for table in self.schema if table['table_name'] == 'order_items')
+        # The retrieved table needs every column, more than the budget; the lookup tables it reaches are small
+        retrieved = ([ids['order_items']], {ids['order_items']: {column['name'] for column in order_items['columns']}})
+        with mock.patch('llm_agent.schema_linking.retrieve_relevant_tables', return_value=retrieved), \
+                mock.patch('llm_agent.schema_linking.SCHEMA_BATCH_SIZE', 1):
+            schema = prune_schema("Which items were ordered?", self.database, token_budget=45)
+
+        kept = [table['table_name'] for table in schema]
+        self.assertNotIn('order_items', kept)
+        self.assertTrue(kept)
+        self.assertTrue(set(kept) <= {names[table_id] for table_id in foreign_key_closure(self.database, retrieved[0])})
+        self.assertLessEqual(count_tokens(encode_schema(schema, 'compact')), 45)
+
+    def test_foreign_key_closure_adds_join_paths_then_referenced_tables(self):
+        ids = self._table_ids()
+        names = {table_id: name for name, table_id in ids.items()}
+
+        closure = foreign_key_closure(self.database, [ids['order_items']])
+        self.assertEqual(
+            [names[table_id] for table_id in closure],
+            ['order_items', 'orders', 'products', 'customers', 'addresses', 'coupons', 'categories', 'suppliers']
+        )
+        # Two unrelated seeds are joined through the table between them
+        closure = foreign_key_closure(self.database, [ids['customers'], ids['products']])
+        self.assertEqual([names[table_id] for table_id in closure][:3], ['customers', 'products', 'reviews'])
+
+    def test_retrieved_tables_carry_their_matched_columns(self):
+        names = {table_id: name for name, table_id in self._table_ids().items()}
+
+        ranked, matched_columns = retrieve_relevant_tables("How many customers live in California?", self.database)
+
+        self.assertEqual(names[ranked[0]], 'customers')
+        self.assertEqual(set(matched_columns), set(ranked))
+        self.assertIn('state', matched_columns[ranked[0]])
+
+    @override_settings(SCHEMA_PREFIX_MAX_TOKENS=20000, SCHEMA_PROMPT_TOKEN_BUDGET=20000, ANSWER_CACHE_ENABLED=False)
+    def test_small_schemas_open_every_prompt_with_the_same_stored_text(self):
+        first, _ = build_sql_prompt("How many customers live in California?", self.database)
+        second, _ = build_sql_prompt("Which orders were cancelled last month?", self.database)
+        stored = SchemaPrompt.objects.get(database=self.database)
+        self.assertEqual(stored.metadata_version, self.database.metadata_version)
+        self.assertTrue(first.startswith(stored.text) and second.startswith(stored.text))
+
+        # Bumping the version stores the new version's prompt before any question asks for it
+        self.database.bump_metadata_version()
+        stored.refresh_from_db()
+        self.assertEqual(stored.metadata_version, self.database.metadata_version)
+        self.assertEqual(get_schema_prompt(self.database), stored.text)
+
+    @override_settings(SCHEMA_PREFIX_MAX_TOKENS=100, ANSWER_CACHE_ENABLED=False)
+    def test_large_schemas_are_pruned_per_question(self):
+        self.assertEqual(get_schema_prompt(self.database), '')
+        prompt, _ = build_sql_prompt("How many customers live in California?", self.database)
+        self.assertIn("CREATE TABLE public.customers (", prompt)
+        self.assertLess(prompt.count("CREATE TABLE "), len(self.schema))
+
+    @override_settings(SCHEMA_PREFIX_MAX_TOKENS=20000, SCHEMA_PROMPT_TOKEN_BUDGET=300, ANSWER_CACHE_ENABLED=False)
+    def test_whole_schema_prefix_never_exceeds_the_prompt_budget(self):
+        self.assertEqual(get_schema_prompt(self.database), '')
+        prompt, _ = build_sql_prompt("How many customers live in California?", self.database)
+        self.assertLess(prompt.count("CREATE TABLE "), len(self.schema))
+
+
+@override_settings(
+    EMBEDDING_STORE_DIR='', LLM_OFFLINE=True, LLM_OFFLINE_LATENCY_MEDIAN_MS=0,
+    LLM_OFFLINE_ERROR_RATE=0.0, LLM_OFFLINE_RATE_LIMIT_RATE=0.0, ANSWER_CACHE_ENABLED=False
+)
+class OfflineProviderTests(TestCase):
+    """The SQL generation pipeline end to end against the offline LLM stand-in"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='offline')
+        cls.database = install_schema(load_dataset()['schemas'][0], cls.owner)
+
+    def test_sql_is_built_from_the_prompt_schema_and_value_hints(self):
+        result = nl_to_sql("How many customers live in California?", self.database.id, user=self.owner)
+        self.assertTrue(result['success'], result)
+        self.assertRegex(result['sql_query'], r"COUNT\(\*\) FROM public\.customers\b")
+        self.assertIn("'California'", result['sql_query'])
+        self.assertEqual((result['model'], result['fallback']), (SQL_GENERATION_MODEL, False))
+
+    def test_streaming_ends_with_the_same_answer(self):
+        question = "Which orders were cancelled last month?"
+        events = list(nl_to_sql_stream(question, self.database.id, user=self.owner))
+        self.assertEqual(events[-1][0], 'done')
+        streamed_sql = ''.join(data['delta'] for event, data in events if event == 'sql')
+        self.assertEqual(streamed_sql, events[-1][1]['sql_query'])
+        self.assertEqual(events[-1][1]['model'], SQL_GENERATION_MODEL)
+        self.assertEqual(events[-1][1]['sql_query'], nl_to_sql(question, self.database.id)['sql_query'])
+
+    def test_stream_endpoint_serves_event_stream_clients(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.post(
+            '/api/llm/generate-sql/stream/',
+            {'query': "How many customers live in California?", 'database_id': self.database.id},
+            format='json', HTTP_ACCEPT='text/event-stream'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/event-stream'))
+        body = b''.join(response.streaming_content).decode()
+        self.assertRegex(body, r'(?m)^event: done\ndata: \{.*"sql_query"')
+
+        response = client.post('/api/llm/generate-sql/stream/', {}, format='json', HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.content.decode().startswith('event: error\ndata: '))
+
+    def test_recorded_responses_are_replayed(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as recordings:
+            recordings.write(json.dumps({'prompt_sha256': prompt_hash('Say hello'), 'content': 'Hello!'}) + '\n')
+        self.addCleanup(os.remove, recordings.name)
+        with override_settings(LLM_OFFLINE_RECORDINGS=recordings.name):
+            self.assertEqual(llm_api('Say hello')['content'], 'Hello!')
+
+    @override_settings(LLM_OFFLINE_ERROR_RATE=1.0, LLM_MAX_RETRIES=1, LLM_RETRY_BASE_DELAY=0)
+    def test_injected_errors_surface_after_retries(self):
+        result = llm_api('Always failing prompt')
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error_type'], 'api_connection_error')
+
+
+def provider_error(status_code, headers=None):
+    """The SDK exception a provider response with this status raises"""
+    request = httpx.Request('POST', 'http://provider.invalid/v1/chat/completions')
+    response = httpx.Response(status_code, headers=headers or {}, request=request)
+    error_class = {429: openai.RateLimitError, 400: openai.BadRequestError}.get(status_code, openai.InternalServerError)
+    return error_class(f"HTTP {status_code}", response=response, body=None)
+
+
+def flaky(*outcomes):
+    """A request raising or returning each outcome in turn, counting its calls"""
+    outcomes = list(outcomes)
+
+    def request():
+        request.calls += 1
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    request.calls = 0
+    return request
+
+
+@override_settings(
+    LLM_REQUESTS_PER_MINUTE={'test-retry-after': 60000, 'test-retries': 60000, 'test-client-error': 60000, 'test-circuit': 60000},
+    LLM_RETRY_BASE_DELAY=0.01, LLM_RETRY_MAX_DELAY=0.05, LLM_QUEUE_TIMEOUT=5
+)
+class StreamingParserTests(SimpleTestCase):
+    """Incremental parsing of model output as chunks arrive"""
+
+    def split(self, text, size):
+        return [text[start:start + size] for start in range(0, len(text), size)]
+
+    def think(self, chunks):
+        """Reasoning and content of a streamed output, joined per kind"""
+        parsed = ThinkBlockFilter()
+        parts = [part for chunk in chunks for part in parsed.feed(chunk)] + parsed.flush()
+        return {kind: ''.join(text for part_kind, text in parts if part_kind == kind) for kind in ('reasoning', 'content')}
+
+    def fields(self, chunks, fields=('sql', 'explanation')):
+        """Decoded text per tracked field of a streamed JSON object"""
+        stream = JsonFieldStream(fields)
+        decoded = {}
+        for chunk in chunks:
+            for field, delta in stream.feed(chunk):
+                decoded[field] = decoded.get(field, '') + delta
+        return decoded
+
+    def test_think_tags_split_across_chunks(self):
+        output = '  <think>Join orders to customers.</think>\n\nSELECT 1'
+        for size in range(1, len(output) + 1):
+            with self.subTest(size=size):
+                self.assertEqual(
+                    self.think(self.split(output, size)),
+                    {'reasoning': 'Join orders to customers.', 'content': 'SELECT 1'}
+                )
+
+    def test_output_without_a_think_block_is_all_content(self):
+        for output in ('SELECT 1', '<thin', '<b>bold</b> then <think>not a block</think>'):
+            for size in (1, 3, len(output)):
+                with self.subTest(output=output, size=size):
+                    self.assertEqual(self.think(self.split(output, size)), {'reasoning': '', 'content': output})
+
+    def test_unfinished_think_block_is_reasoning(self):
+        self.assertEqual(self.think(['<think>Still thinking </thi']), {'reasoning': 'Still thinking </thi', 'content': ''})
+
+    def test_escapes_split_across_chunks(self):
+        output = '{"sql": "SELECT \\"name\\" FROM t WHERE c = \'caf\\u00e9\'\\n", "explanation": "Tab\\there"}'
+        expected = {'sql': 'SELECT "name" FROM t WHERE c = \'caf\u00e9\'\n', 'explanation': 'Tab\there'}
+        self.assertEqual(json.loads(output), expected)
+        for size in range(1, len(output) + 1):
+            with self.subTest(size=size):
+                self.assertEqual(self.fields(self.split(output, size)), expected)
+
+    def test_key_like_strings_inside_values_are_not_keys(self):
+        output = (
+            '```json\n{"tables": ["sql", "orders"], "explanation": "the \\"sql\\": key holds the query", '
+            '"note": "sql", "sql": "SELECT 1"}\n```'
+        )
+        expected = {'explanation': 'the "sql": key holds the query', 'sql': 'SELECT 1'}
+        for size in (1, 2, 7, len(output)):
+            with self.subTest(size=size):
+                self.assertEqual(self.fields(self.split(output, size)), expected)
+
+
+class LLMClientTests(TestCase):
+    """Pooled provider clients"""
+
+    def setUp(self):
+        self.addCleanup(close_llm_clients)
+
+    def test_clients_are_reused_per_provider_and_key(self):
+        client = get_llm_client('groq', 'key-1')
+
+        self.assertIs(get_llm_client('groq', 'key-1'), client)
+        self.assertIsNot(get_llm_client('openai', 'key-1'), client)
+        self.assertEqual(str(client.base_url).rstrip('/'), 'https://api.groq.com/openai/v1')
+        self.assertEqual(client.max_retries, 0)
+
+    def test_rotated_key_replaces_the_old_client(self):
+        old = get_llm_client('groq', 'key-1')
+        openai_client = get_llm_client('openai', 'key-1')
+
+        rotated = get_llm_client('groq', 'key-2')
+
+        self.assertIsNot(rotated, old)
+        self.assertEqual(rotated.api_key, 'key-2')
+        # The old key's client was dropped, other providers keep theirs
+        self.assertIsNot(get_llm_client('groq', 'key-1'), old)
+        self.assertIs(get_llm_client('openai', 'key-1'), openai_client)
+
+
+class ResilienceTests(TestCase):
+    """Pacing, retries and circuit breaking of provider requests"""
+
+    def test_bucket_allows_a_burst_then_paces(self):
+        bucket = TokenBucket(rate=20, capacity=2)
+        started = time.monotonic()
+        self.assertTrue(bucket.acquire(1) and bucket.acquire(1))
+        self.assertLess(time.monotonic() - started, 0.02)
+        self.assertTrue(bucket.acquire(1))
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+        # The next token is 50ms away: a shorter wait gives up
+        self.assertFalse(bucket.acquire(0.01))
+
+    def test_paused_bucket_holds_requests_back(self):
+        bucket = TokenBucket(rate=1000, capacity=5)
+        bucket.pause(0.1)
+        started = time.monotonic()
+        self.assertTrue(bucket.acquire(1))
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_retry_after_is_honoured(self):
+        self.assertEqual(retry_after(provider_error(429, {'retry-after': '2'})), 2.0)
+        self.assertEqual(retry_after(provider_error(429, {'retry-after-ms': '150'})), 0.15)
+        request = flaky(provider_error(429, {'retry-after': '0.2'}), 'ok')
+        started = time.monotonic()
+        self.assertEqual(call_provider('test-retry-after', request), 'ok')
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+        self.assertEqual(request.calls, 2)
+        self.assertEqual(get_provider_guard('test-retry-after').rate_limited, 1)
+
+    @override_settings(LLM_MAX_RETRIES=2)
+    def test_server_errors_are_retried_up_to_the_limit(self):
+        request = flaky(*[provider_error(503)] * 3)
+        with self.assertRaises(openai.InternalServerError):
+            call_provider('test-retries', request)
+        self.assertEqual(request.calls, 3)
+        self.assertEqual(get_provider_guard('test-retries').retries, 2)
+
+    @override_settings(LLM_MAX_RETRIES=0, LLM_CIRCUIT_FAILURE_THRESHOLD=2, LLM_CIRCUIT_RESET_TIMEOUT=30)
+    def test_open_circuit_fails_fast(self):
+        for _ in range(2):
+            with self.assertRaises(openai.InternalServerError):
+                call_provider('test-circuit', flaky(provider_error(503)))
+        request = flaky('ok')
+        with self.assertRaises(ProviderUnavailable):
+            call_provider('test-circuit', request)
+        self.assertEqual(request.calls, 0)
+
+    def test_client_errors_are_not_retried(self):
+        request = flaky(provider_error(400), 'ok')
+        with self.assertRaises(openai.BadRequestError):
+            call_provider('test-client-error', request)
+        self.assertEqual(request.calls, 1)
+
+    @override_settings(LLM_RETRY_BASE_DELAY=0.5, LLM_RETRY_MAX_DELAY=3)
+    def test_backoff_grows_exponentially_up_to_the_cap(self):
+        for attempt, ceiling in [(0, 0.5), (1, 1.0), (2, 2.0), (5, 3.0)]:
+            delays = [backoff_delay(attempt) for _ in range(200)]
+            self.assertTrue(all(0 <= delay <= ceiling for delay in delays))
+            self.assertGreater(max(delays), ceiling / 2)
+
+    def test_breaker_opens_trials_and_closes(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertFalse(breaker.allow(), "only one trial at a time")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertTrue(breaker.allow())
+
+
+
+class FakeRequest:
+    """Router request whose attempts take the given seconds in turn (cut short when cancelled)"""
+
+    def __init__(self, delays, failing=()):
+        self.delays = list(delays)
+        self.failing = failing
+        self.sent = []
+        self.cancelled = []
+        self._lock = threading.Lock()
+
+    def __call__(self, attempt):
+        with self._lock:
+            number = len(self.sent)
+            self.sent.append(attempt.route[-1])
+        if attempt.cancelled.wait(self.delays[number]):
+            self.cancelled.append(number)
+            return None
+        if attempt.route[-1] in self.failing:
+            raise openai.APIConnectionError(request=httpx.Request('POST', 'http://provider.invalid'))
+        return f"answer {number} from {attempt.route[-1]}"
+
+
+@override_settings(LLM_ROUTER_MIN_SAMPLES=3, LLM_HEDGE_DEFAULT_DELAY=0.05, LLM_HEDGING_ENABLED=True)
+class RouterTests(TestCase):
+    """Latency-based route ordering, hedging and failover"""
+
+    primary = ('router-a', None, 'primary-model')
+    fallback = ('router-b', None, 'fallback-model')
+
+    def call(self, request):
+        started = time.monotonic()
+        result = LLMRouter().call([self.primary, self.fallback], request)
+        return result, time.monotonic() - started
+
+    def test_routes_are_ranked_by_latency_after_exploring(self):
+        router = LLMRouter()
+        self.assertEqual(router.rank([self.primary, self.fallback]), [self.primary, self.fallback])
+        for _ in range(3):
+            router.record(self.primary, 0.5, True)
+            router.record(self.fallback, 0.1, True)
+        self.assertEqual(router.rank([self.primary, self.fallback]), [self.fallback, self.primary])
+        # A route failing most of its calls goes last however fast it is
+        for _ in range(4):
+            router.record(self.fallback, 0.1, False)
+        self.assertEqual(router.rank([self.primary, self.fallback]), [self.primary, self.fallback])
+
+    def test_fast_calls_are_not_hedged(self):
+        request = FakeRequest([0])
+        (route, answer), _ = self.call(request)
+        self.assertEqual((route, answer), (self.primary, "answer 0 from primary-model"))
+        self.assertEqual(request.sent, ['primary-model'])
+
+    def test_slow_call_is_hedged_on_the_same_model_and_the_loser_cancelled(self):
+        request = FakeRequest([1.0, 0.0])
+        (route, answer), elapsed = self.call(request)
+        self.assertEqual((route, answer), (self.primary, "answer 1 from primary-model"))
+        self.assertEqual(request.sent, ['primary-model', 'primary-model'])
+        self.assertGreaterEqual(elapsed, 0.05)
+        self.assertLess(elapsed, 0.5)
+        time.sleep(0.05)
+        self.assertEqual(request.cancelled, [0])
+
+    @override_settings(LLM_HEDGE_TO_FALLBACK=True)
+    def test_hedging_to_the_fallback_reports_the_fallback_route(self):
+        request = FakeRequest([1.0, 0.0])
+        (route, answer), _ = self.call(request)
+        self.assertEqual((route, answer), (self.fallback, "answer 1 from fallback-model"))
+
+    def test_failed_call_fails_over_to_the_next_route(self):
+        request = FakeRequest([0, 0], failing={'primary-model'})
+        (route, _), _ = self.call(request)
+        self.assertEqual(route, self.fallback)
+        self.assertEqual(request.sent, ['primary-model', 'fallback-model'])
+
+    def test_error_is_raised_when_every_route_fails(self):
+        request = FakeRequest([0, 0, 0], failing={'primary-model', 'fallback-model'})
+        with self.assertRaises(openai.APIConnectionError):
+            self.call(request)
+        self.assertEqual(request.sent, ['primary-model', 'fallback-model'])
+
+
+class WorkerTimeout(BaseException):
+    """Raised into a request by a worker timeout, outside the Exception hierarchy"""
+
+
+class SingleFlightTests(TestCase):
+    """Coalescing of identical concurrent calls"""
+
+    callers = 8
+
+    def run_concurrently(self, flight, result=None, error=None):
+        """
+        Call flight.do() with one key from several threads at once.
+
+        The call blocks until every caller has joined it, so all of them overlap.
+
+        Returns:
+            tuple: (number of times the call ran, [(result or raised error, shared) per caller])
+        """
+        release = threading.Event()
+        runs = []
+
+        def fn():
+            runs.append(1)
+            release.wait(5)
+            # Only the first run fails; callers that make the call again get the result
+            if error is not None and len(runs) == 1:
+                raise error
+            return result
+
+        outcomes = []
+
+        def caller():
+            try:
+                outcome = flight.do('key', fn)
+            except BaseException as e:
+                outcome = (e, None)
+            outcomes.append(outcome)
+
+        joined = flight.stats()['deduplicated'] + self.callers - 1
+        threads = [threading.Thread(target=caller) for _ in range(self.callers)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while flight.stats()['deduplicated'] < joined and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return len(runs), outcomes
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        runs, outcomes = self.run_concurrently(flight, result='answer')
+        self.assertEqual(runs, 1)
+        self.assertEqual([result for result, _ in outcomes], ['answer'] * self.callers)
+        self.assertEqual(sorted(shared for _, shared in outcomes), [False] + [True] * (self.callers - 1))
+
+    def test_leader_error_reaches_every_waiter(self):
+        flight = SingleFlight()
+        error = ValueError('provider down')
+        runs, outcomes = self.run_concurrently(flight, error=error)
+        self.assertEqual(runs, 1)
+        self.assertEqual([outcome for outcome, _ in outcomes], [error] * self.callers)
+
+    def test_key_is_released_after_the_call(self):
+        flight = SingleFlight()
+        self.run_concurrently(flight, error=ValueError('provider down'))
+        self.assertEqual(flight.stats()['in_flight'], 0)
+        runs, outcomes = self.run_concurrently(flight, result='retried')
+        self.assertEqual(runs, 1)
+        self.assertEqual([result for result, _ in outcomes], ['retried'] * self.callers)
+        self.assertEqual(flight.do('key', lambda: 'later'), ('later', False))
+        self.assertEqual(flight.stats()['calls'], 3)
+
+    def test_interrupted_call_releases_the_key_and_waiters_call_again(self):
+        flight = SingleFlight()
+        interrupt = WorkerTimeout()
+        runs, outcomes = self.run_concurrently(flight, result='answer', error=interrupt)
+        results = [result for result, _ in outcomes]
+        self.assertEqual(results.count(interrupt), 1)
+        self.assertEqual(results.count('answer'), self.callers - 1)
+        self.assertEqual(runs, self.callers)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+    def test_waiters_stop_waiting_after_the_timeout(self):
+        flight = SingleFlight(wait_timeout=0.05)
+        release = threading.Event()
+        leader = threading.Thread(target=flight.do, args=('key', lambda: release.wait(5)))
+        leader.start()
+        deadline = time.monotonic() + 5
+        while flight.stats()['in_flight'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+        started = time.monotonic()
+        self.assertEqual(flight.do('key', lambda: 'own'), ('own', False))
+        self.assertLess(time.monotonic() - started, 2)
+        release.set()
+        leader.join(5)
+        self.assertEqual(flight.stats()['in_flight'], 0)
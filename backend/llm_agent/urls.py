@@ -3,5 +3,9 @@ from . import views
 
 urlpatterns = [
     path('generate-sql/', views.generate_sql_from_nl, name='generate-sql'),
+    path('generate-sql/stream/', views.generate_sql_stream, name='generate-sql-stream'),
+    path('answer-cache/stats/', views.answer_cache_stats, name='answer-cache-stats'),
+    path('single-flight/stats/', views.single_flight_stats, name='single-flight-stats'),
+    path('providers/status/', views.provider_status, name='provider-status'),
     # Removed redundant generate-description endpoint
 ]
\ No newline at end of file
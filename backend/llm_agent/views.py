@@ -1,9 +1,16 @@
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from .services import nl_to_sql, get_metadata_description
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from .answer_cache import get_answer_cache
+from .resilience import provider_states
+from .router import get_llm_router
+from .services import nl_to_sql, nl_to_sql_stream, get_metadata_description
+from .single_flight import get_llm_single_flight
+from .streaming import sse_event, EventStreamRenderer
 from databases.models import ClientDatabase, TableMetadata, ColumnMetadata
 from databases.services import DatabaseConnector
 
@@ -39,5 +46,71 @@ def generate_sql_from_nl(request):
     print(result)
     return Response({
         'sql_query': result.get('sql_query', ''),
-        'explanation': result.get('explanation', '')
+        'explanation': result.get('explanation', ''),
+        'performance_warnings': result.get('performance_warnings', []),
+        # The model that answered; fallback when the router used another provider's fallback model
+        'model': result.get('model'),
+        'fallback': result.get('fallback', False)
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, EventStreamRenderer])
+def generate_sql_stream(request):
+    """
+    Convert natural language to SQL, streaming the answer as Server-Sent Events.
+
+    Events: 'status' (retrieving, generating, reasoning), 'sql' and
+    'explanation' text deltas, then 'done' with the same fields as
+    generate-sql, or 'error'.
+    """
+    if 'query' not in request.data or 'database_id' not in request.data:
+        return Response(
+            {
+                'error': 'Both query and database_id are required',
+                'error_type': 'missing_parameters'
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    events = nl_to_sql_stream(request.data['query'], request.data['database_id'], user=request.user)
+    response = StreamingHttpResponse(
+        (sse_event(event, data) for event, data in events),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def answer_cache_stats(request):
+    """
+    Hit rate, per-level hits and evictions of this worker's nl_to_sql answer cache
+    """
+    return Response(get_answer_cache().stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def single_flight_stats(request):
+    """
+    Upstream LLM calls made by this worker and identical concurrent calls that were deduplicated
+    """
+    return Response(get_llm_single_flight().stats())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def provider_status(request):
+    """
+    Rate limiter, circuit breaker and retry state of each LLM provider in this worker,
+    and the rolling latency and error rate of each provider/model route
+    """
+    return Response({
+        'providers': provider_states(),
+        'routes': get_llm_router().stats()
     })
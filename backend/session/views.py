@@ -3,6 +3,7 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from llm_agent.examples import record_query_example
 from .models import Session, Query
 from .serializers import SessionSerializer, SessionListSerializer, QuerySerializer
 
@@ -97,6 +98,9 @@ class QueryCreateView(APIView):
                 **query_data
             )
             
+            # Successful question/SQL pairs become few-shot examples for this database
+            record_query_example(query)
+            
             serializer = QuerySerializer(query)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Session.DoesNotExist:
@@ -145,6 +149,7 @@ class QueryDetailView(APIView):
                     query.explanation = request.data['explanation']
                 
                 query.save()
+                record_query_example(query)
                 serializer = QuerySerializer(query)
                 return Response(serializer.data)
             except Query.DoesNotExist:
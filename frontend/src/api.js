@@ -91,6 +91,59 @@ api.generateSqlFromNL = (query, databaseId) =>
     database_id: databaseId,
   });
 
+// Streaming NL to SQL over Server-Sent Events. onEvent(event, data) receives
+// "status", "sql" and "explanation" events as they arrive; resolves with the
+// "done" payload, rejects with an axios-shaped error on "error".
+api.streamSqlFromNL = async (query, databaseId, onEvent = () => {}) => {
+  const token = localStorage.getItem(ACCESS_TOKEN);
+  const response = await fetch(`${api.defaults.baseURL}/api/llm/generate-sql/stream/`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Accept: "text/event-stream",
+      ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    },
+    body: JSON.stringify({ query, database_id: databaseId }),
+  });
+  if (!response.ok) {
+    // Errors come back as a single 'error' event
+    const text = await response.text().catch(() => "");
+    const dataLine = text.split("\n").find((line) => line.startsWith("data: "));
+    let data = {};
+    try {
+      data = JSON.parse(dataLine ? dataLine.slice(6) : text);
+    } catch {
+      data = {};
+    }
+    throw { response: { status: response.status, statusText: response.statusText, data } };
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) >= 0) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const payload = data ? JSON.parse(data) : {};
+      if (event === "done") return payload;
+      if (event === "error") throw { response: { status: 200, data: payload } };
+      onEvent(event, payload);
+    }
+  }
+  throw new Error("SQL generation stream ended unexpectedly");
+};
+
 // Execute SQL query
 api.executeSqlQuery = (databaseId, sqlQuery) =>
   api.post(`/api/databases/databases/${databaseId}/execute_query/`, {
@@ -740,13 +740,13 @@ const DatabaseTester = () => {
                 </Typography>
                 <Box sx={{ mb: 2 }}>
                   <Typography variant="body2" color="success.main">
-                    Added: {changesModal.changes.tables.added.length}
+                    Added: {changesModal.changes.totals?.tables.added ?? changesModal.changes.tables.added.length}
                   </Typography>
                   <Typography variant="body2" color="info.main">
-                    Updated: {changesModal.changes.tables.updated.length}
+                    Updated: {changesModal.changes.totals?.tables.updated ?? changesModal.changes.tables.updated.length}
                   </Typography>
                   <Typography variant="body2" color="error.main">
-                    Removed: {changesModal.changes.tables.removed.length}
+                    Removed: {changesModal.changes.totals?.tables.removed ?? changesModal.changes.tables.removed.length}
                   </Typography>
                 </Box>
                 
@@ -755,13 +755,13 @@ const DatabaseTester = () => {
                 </Typography>
                 <Box sx={{ mb: 2 }}>
                   <Typography variant="body2" color="success.main">
-                    Added: {changesModal.changes.columns.added.length}
+                    Added: {changesModal.changes.totals?.columns.added ?? changesModal.changes.columns.added.length}
                   </Typography>
                   <Typography variant="body2" color="info.main">
-                    Updated: {changesModal.changes.columns.updated.length}
+                    Updated: {changesModal.changes.totals?.columns.updated ?? changesModal.changes.columns.updated.length}
                   </Typography>
                   <Typography variant="body2" color="error.main">
-                    Removed: {changesModal.changes.columns.removed.length}
+                    Removed: {changesModal.changes.totals?.columns.removed ?? changesModal.changes.columns.removed.length}
                   </Typography>
                 </Box>
                 
@@ -770,13 +770,13 @@ const DatabaseTester = () => {
                 </Typography>
                 <Box>
                   <Typography variant="body2" color="success.main">
-                    Added: {changesModal.changes.relationships.added.length}
+                    Added: {changesModal.changes.totals?.relationships.added ?? changesModal.changes.relationships.added.length}
                   </Typography>
                   <Typography variant="body2" color="info.main">
-                    Updated: {changesModal.changes.relationships.updated.length}
+                    Updated: {changesModal.changes.totals?.relationships.updated ?? changesModal.changes.relationships.updated.length}
                   </Typography>
                   <Typography variant="body2" color="error.main">
-                    Removed: {changesModal.changes.relationships.removed.length}
+                    Removed: {changesModal.changes.totals?.relationships.removed ?? changesModal.changes.relationships.removed.length}
                   </Typography>
                 </Box>
               </Box>
@@ -150,12 +150,19 @@ function Home() {
             // Store the current query for later use
             const currentQuery = query;
             
-            // Generate SQL from natural language query
-            const sqlGenResponse = await api.generateSqlFromNL(currentQuery, databaseId);
+            // Generate SQL from natural language query, showing the SQL as it streams in
+            let streamedSql = "";
+            const sqlGenResult = await api.streamSqlFromNL(currentQuery, databaseId, (event, data) => {
+                if (event === "sql") {
+                    streamedSql += data.delta;
+                    setGeneratedSql(streamedSql);
+                    setShowSqlControls(true);
+                }
+            });
             
             // Access the correct field name 'sql_query' instead of 'sql'
-            let generatedSqlQuery = sqlGenResponse.data.sql_query;
-            let explanation = sqlGenResponse.data.explanation || "";
+            let generatedSqlQuery = sqlGenResult.sql_query;
+            let explanation = sqlGenResult.explanation || "";
             
             // Clean SQL query by removing markdown code blocks if present
             generatedSqlQuery = cleanSqlQuery(generatedSqlQuery);
@@ -200,6 +207,10 @@ ${explanation ? `**Explanation:**\n${explanation}` : ''}
         } catch (error) {
             console.error("Error generating SQL query:", error);
             
+            // Drop any partially streamed SQL
+            setGeneratedSql("");
+            setShowSqlControls(false);
+            
             // Create an error message that's user-friendly
             let errorMessage = "An error occurred while generating the SQL query.";
             let errorType = "SQL_GENERATION_ERROR";
@@ -242,7 +253,8 @@ ${explanation ? `**Explanation:**\n${explanation}` : ''}
     
     // Execute the generated SQL query
     const executeGeneratedSql = async () => {
-        if (!generatedSql || !currentSessionId) return;
+        // Not while the SQL is still being generated
+        if (!generatedSql || !currentSessionId || loading) return;
         
         setLoading(true);
         try {